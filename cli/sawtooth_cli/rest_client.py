@@ -26,14 +26,14 @@ class RestClient(object):
         self._base_url = base_url or 'http://localhost:8080'
 
     def list_blocks(self):
-        return self._get('/blocks')['data']
+        return self._get_data('/blocks')
 
     def get_block(self, block_id):
         safe_id = urllib.quote(block_id, safe='')
         return self._get('/blocks/' + safe_id)['data']
 
     def list_batches(self):
-        return self._get('/batches')['data']
+        return self._get_data('/batches')
 
     def get_batch(self, batch_id):
         safe_id = urllib.quote(batch_id, safe='')
@@ -41,7 +41,7 @@ class RestClient(object):
 
     def list_state(self, subtree=None, head=None):
         queries = RestClient._remove_nones(address=subtree, head=head)
-        return self._get('/state', queries)
+        return self._get_all_pages('/state', queries)
 
     def get_leaf(self, address, head=None):
         queries = RestClient._remove_nones(head=head)
@@ -84,6 +84,29 @@ class RestClient(object):
         else:
             raise CliException("({}): {}".format(code, json_result))
 
+    def _get_data(self, path, queries=None):
+        """Fetches every page of a list, following the link to each next
+        page, and returns the data of all of the pages.
+        """
+        return self._get_all_pages(path, queries)['data']
+
+    def _get_all_pages(self, path, queries=None):
+        """Fetches every page of a list, following the link to each next
+        page, and returns the first page's result with the data of all of
+        the pages.
+        """
+        result = self._get(path, queries)
+
+        next_url = result.get('paging', {}).get('next')
+        while next_url:
+            code, page = self._submit_request(next_url)
+            if code != 200:
+                raise CliException("({}): {}".format(code, page))
+            result['data'].extend(page['data'])
+            next_url = page.get('paging', {}).get('next')
+
+        return result
+
     def _submit_request(self, url_or_request):
         """Submits the given request, and handles the errors appropriately.
 
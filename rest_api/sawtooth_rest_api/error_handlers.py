@@ -61,6 +61,13 @@ class MissingHead(_ErrorTrap):
         super().__init__(trigger, error, message)
 
 
+class PagingInvalid(_ErrorTrap):
+    def __init__(self, trigger):
+        error = web.HTTPBadRequest
+        message = 'The paging start id is not in the requested list'
+        super().__init__(trigger, error, message)
+
+
 class InvalidBatch(_ErrorTrap):
     def __init__(self):
         super().__init__(
@@ -85,6 +92,14 @@ class MissingLeaf(_ErrorTrap):
             message='There is no leaf at that address')
 
 
+class StatePagingInvalid(_ErrorTrap):
+    def __init__(self):
+        super().__init__(
+            trigger=client.ClientStateListResponse.INVALID_PAGING,
+            error=web.HTTPBadRequest,
+            message='State is listed in address order, and cannot be reversed')
+
+
 class MissingBlock(_ErrorTrap):
     def __init__(self):
         super().__init__(
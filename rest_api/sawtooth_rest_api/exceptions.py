@@ -40,6 +40,19 @@ class MissingStatusId(web.HTTPBadRequest):
         super().__init__(reason=message)
 
 
+class MissingProofAddress(web.HTTPBadRequest):
+    def __init__(self):
+        message = 'At least one address must be specified to fetch a proof'
+        super().__init__(reason=message)
+
+
+class InvalidPagingQuery(web.HTTPBadRequest):
+    def __init__(self, max_page_size):
+        message = 'Paging limit must be an integer from 0 to {}'.format(
+            max_page_size)
+        super().__init__(reason=message)
+
+
 class ValidatorUnavailable(web.HTTPServiceUnavailable):
     def __init__(self):
         message = 'Could not reach validator, validator timed out'
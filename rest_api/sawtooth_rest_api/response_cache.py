@@ -0,0 +1,67 @@
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+from collections import OrderedDict
+import hashlib
+
+
+class ResponseCache(object):
+    """
+    A least-recently-used cache of the validator's responses for resources
+    which never change once they exist, such as a block or batch by id, or
+    a leaf of the state at a particular head. Each response is stored as
+    the serialized bytes sent by the validator, with an ETag made from a
+    hash of those bytes, and the cache is bounded by their total size.
+
+    Args:
+        max_size (int): the most bytes of responses to hold at once
+    """
+    def __init__(self, max_size):
+        self._max_size = max_size
+        self._size = 0
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        """
+        Returns the cached response for a key and its ETag, as a tuple, or
+        None if it is not cached
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key, content):
+        """
+        Caches a response for a key, evicting the least recently used
+        responses to make room for it, and returns its ETag
+        """
+        etag = '"{}"'.format(hashlib.sha256(content).hexdigest())
+        if len(content) > self._max_size:
+            return etag
+
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._size -= len(previous[0])
+
+        self._entries[key] = (content, etag)
+        self._size += len(content)
+        while self._size > self._max_size:
+            _, (evicted, _) = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+
+        return etag
+
+    def __len__(self):
+        return len(self._entries)
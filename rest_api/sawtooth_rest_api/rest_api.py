@@ -16,6 +16,7 @@ import argparse
 import sys
 from aiohttp import web
 from sawtooth_rest_api.routes import RouteHandler
+from sawtooth_rest_api.routes import DEFAULT_CACHE_SIZE
 
 
 def parse_args(args):
@@ -32,6 +33,9 @@ def parse_args(args):
     parser.add_argument('--timeout',
                         help='Seconds to wait for a validator response',
                         default=300)
+    parser.add_argument('--cache-size',
+                        help='Bytes of immutable validator responses to cache',
+                        default=DEFAULT_CACHE_SIZE)
 
     return parser.parse_args(args)
 
@@ -46,8 +50,8 @@ async def logging_middleware(app, handler):
     return logging_handler
 
 
-def start_rest_api(host, port, stream_url, timeout):
-    handler = RouteHandler(stream_url, timeout)
+def start_rest_api(host, port, stream_url, timeout, cache_size):
+    handler = RouteHandler(stream_url, timeout, cache_size)
 
     app = web.Application(middlewares=[logging_middleware])
     # Add routes to the web app
@@ -56,6 +60,7 @@ def start_rest_api(host, port, stream_url, timeout):
 
     app.router.add_get('/state', handler.state_list)
     app.router.add_get('/state/{address}', handler.state_get)
+    app.router.add_get('/state_proof', handler.state_proof)
 
     app.router.add_get('/blocks', handler.block_list)
     app.router.add_get('/blocks/{block_id}', handler.block_get)
@@ -63,6 +68,8 @@ def start_rest_api(host, port, stream_url, timeout):
     app.router.add_get('/batches', handler.batch_list)
     app.router.add_get('/batches/{batch_id}', handler.batch_get)
 
+    app.router.add_get('/events', handler.events)
+
     web.run_app(app, host=host, port=port)
 
 
@@ -73,7 +80,8 @@ def main():
             opts.host,
             int(opts.port),
             opts.stream_url,
-            int(opts.timeout))
+            int(opts.timeout),
+            int(opts.cache_size))
         # pylint: disable=broad-except
     except Exception as e:
         print("Error: {}".format(e), file=sys.stderr)
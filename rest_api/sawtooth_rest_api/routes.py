@@ -15,6 +15,7 @@
 import asyncio
 import json
 import base64
+import textwrap
 from aiohttp import web
 # pylint: disable=no-name-in-module,import-error
 # needed for the google.protobuf imports to pass pylint
@@ -29,6 +30,7 @@ from sawtooth_sdk.protobuf.validator_pb2 import Message
 
 import sawtooth_rest_api.exceptions as errors
 import sawtooth_rest_api.error_handlers as error_handlers
+from sawtooth_rest_api.response_cache import ResponseCache
 from sawtooth_rest_api.protobuf import client_pb2 as client
 from sawtooth_rest_api.protobuf.block_pb2 import BlockHeader
 from sawtooth_rest_api.protobuf.batch_pb2 import BatchList
@@ -36,10 +38,27 @@ from sawtooth_rest_api.protobuf.batch_pb2 import BatchHeader
 from sawtooth_rest_api.protobuf.transaction_pb2 import TransactionHeader
 
 
+# The largest page of a list which may be requested, which is also the most
+# the validator will send.
+MAX_PAGE_SIZE = 1000
+
+# The number of events which may be waiting to be sent to an event stream
+# client before it is disconnected for falling behind.
+EVENT_QUEUE_SIZE = 100
+
+# The most bytes of validator responses for immutable resources, such as
+# blocks and batches by id, which are cached by default.
+DEFAULT_CACHE_SIZE = 64 * 1024 * 1024
+
+
 class RouteHandler(object):
-    def __init__(self, stream_url, timeout=300):
+    def __init__(self, stream_url, timeout=300,
+                 cache_size=DEFAULT_CACHE_SIZE):
         self._stream = Stream(stream_url)
         self._timeout = timeout
+        self._cache = ResponseCache(cache_size)
+        self._event_queues = set()
+        self._events_task = None
 
     @asyncio.coroutine
     def batches_post(self, request):
@@ -122,19 +141,30 @@ class RouteHandler(object):
     @asyncio.coroutine
     def state_list(self, request):
         """
-        Fetch a list of data leaves from the validator's state merkle-tree
+        Fetch a page of data leaves from the validator's state merkle-tree,
+        streaming them back to the client as they are encoded
         """
+        error_traps = [error_handlers.StatePagingInvalid()]
+
         head = request.url.query.get('head', '')
         address = request.url.query.get('address', '')
+        paging = RouteHandler._get_paging_controls(request)
 
-        response = self._query_validator(
-            Message.CLIENT_STATE_LIST_REQUEST,
+        response = RouteHandler._check_response(
             client.ClientStateListResponse,
-            client.ClientStateListRequest(head_id=head, address=address))
+            self._try_validator_request(
+                Message.CLIENT_STATE_LIST_REQUEST,
+                client.ClientStateListRequest(
+                    head_id=head, address=address, paging=paging)),
+            error_traps)
 
-        return RouteHandler._wrap_response(
-            data=response.get('leaves', []),
-            metadata=RouteHandler._get_metadata(request, response))
+        metadata = RouteHandler._get_paged_metadata(request, {
+            'head_id': response.head_id,
+            'paging': RouteHandler._message_to_dict(response.paging)})
+        leaves = (RouteHandler._message_to_dict(l) for l in response.leaves)
+
+        return (yield from RouteHandler._stream_list_response(
+            request, leaves, metadata))
 
     @asyncio.coroutine
     def state_get(self, request):
@@ -147,15 +177,59 @@ class RouteHandler(object):
 
         address = request.match_info.get('address', '')
         head = request.url.query.get('head', '')
+        validator_query = client.ClientStateGetRequest(
+            head_id=head, address=address)
 
-        response = self._query_validator(
+        if not head:
+            # The leaf at the current chain head may change, so is not cached
+            response = self._query_validator(
+                Message.CLIENT_STATE_GET_REQUEST,
+                client.ClientStateGetResponse,
+                validator_query,
+                error_traps)
+            return RouteHandler._wrap_response(
+                data=response['value'],
+                metadata=RouteHandler._get_metadata(request, response))
+
+        content, etag = self._query_immutable(
+            ('state', head, address),
             Message.CLIENT_STATE_GET_REQUEST,
             client.ClientStateGetResponse,
-            client.ClientStateGetRequest(head_id=head, address=address),
+            validator_query,
             error_traps)
+        if RouteHandler._is_not_modified(request, etag):
+            return web.HTTPNotModified(headers={'ETag': etag})
 
+        response = RouteHandler._try_response_parse(
+            client.ClientStateGetResponse, content)
         return RouteHandler._wrap_response(
             data=response['value'],
+            metadata=RouteHandler._get_metadata(request, response),
+            headers={'ETag': etag})
+
+    @asyncio.coroutine
+    def state_proof(self, request):
+        """
+        Fetch a proof of the data at a set of addresses from the validator's
+        state merkle-tree, which clients can verify against the merkle root
+        """
+        try:
+            addresses = request.url.query['address'].split(',')
+        except KeyError:
+            return errors.MissingProofAddress()
+
+        head = request.url.query.get('head', '')
+
+        response = self._query_validator(
+            Message.CLIENT_STATE_PROOF_REQUEST,
+            client.ClientStateProofResponse,
+            client.ClientStateProofRequest(
+                head_id=head, addresses=addresses))
+
+        return RouteHandler._wrap_response(
+            data={
+                'merkle_root': response['merkle_root'],
+                'nodes': response['nodes']},
             metadata=RouteHandler._get_metadata(request, response))
 
     @asyncio.coroutine
@@ -163,18 +237,24 @@ class RouteHandler(object):
         """
         Fetch a particular block from the validator
         """
+        error_traps = [error_handlers.PagingInvalid(
+            client.ClientBlockListResponse.INVALID_PAGING)]
+
         head = request.url.query.get('head', '')
         block_ids = RouteHandler._get_filter_ids(request)
+        paging = RouteHandler._get_paging_controls(request)
 
         response = self._query_validator(
             Message.CLIENT_BLOCK_LIST_REQUEST,
             client.ClientBlockListResponse,
-            client.ClientBlockListRequest(head_id=head, block_ids=block_ids))
+            client.ClientBlockListRequest(
+                head_id=head, block_ids=block_ids, paging=paging),
+            error_traps)
 
         blocks = [RouteHandler._expand_block(b) for b in response['blocks']]
         return RouteHandler._wrap_response(
             data=blocks,
-            metadata=RouteHandler._get_metadata(request, response))
+            metadata=RouteHandler._get_paged_metadata(request, response))
 
     @asyncio.coroutine
     def block_get(self, request):
@@ -187,33 +267,45 @@ class RouteHandler(object):
 
         block_id = request.match_info.get('block_id', '')
 
-        response = self._query_validator(
+        content, etag = self._query_immutable(
+            ('block', block_id),
             Message.CLIENT_BLOCK_GET_REQUEST,
             client.ClientBlockGetResponse,
             client.ClientBlockGetRequest(block_id=block_id),
             error_traps)
+        if RouteHandler._is_not_modified(request, etag):
+            return web.HTTPNotModified(headers={'ETag': etag})
 
+        response = RouteHandler._try_response_parse(
+            client.ClientBlockGetResponse, content)
         return RouteHandler._wrap_response(
             data=RouteHandler._expand_block(response['block']),
-            metadata=RouteHandler._get_metadata(request, response))
+            metadata=RouteHandler._get_metadata(request, response),
+            headers={'ETag': etag})
 
     @asyncio.coroutine
     def batch_list(self, request):
         """
         Fetch a list of batches from the validator
         """
+        error_traps = [error_handlers.PagingInvalid(
+            client.ClientBatchListResponse.INVALID_PAGING)]
+
         head = request.url.query.get('head', '')
         batch_ids = RouteHandler._get_filter_ids(request)
+        paging = RouteHandler._get_paging_controls(request)
 
         response = self._query_validator(
             Message.CLIENT_BATCH_LIST_REQUEST,
             client.ClientBatchListResponse,
-            client.ClientBatchListRequest(head_id=head, batch_ids=batch_ids))
+            client.ClientBatchListRequest(
+                head_id=head, batch_ids=batch_ids, paging=paging),
+            error_traps)
 
         batches = [RouteHandler._expand_batch(b) for b in response['batches']]
         return RouteHandler._wrap_response(
             data=batches,
-            metadata=RouteHandler._get_metadata(request, response))
+            metadata=RouteHandler._get_paged_metadata(request, response))
 
     @asyncio.coroutine
     def batch_get(self, request):
@@ -226,15 +318,119 @@ class RouteHandler(object):
 
         batch_id = request.match_info.get('batch_id', '')
 
-        response = self._query_validator(
+        content, etag = self._query_immutable(
+            ('batch', batch_id),
             Message.CLIENT_BATCH_GET_REQUEST,
             client.ClientBatchGetResponse,
             client.ClientBatchGetRequest(batch_id=batch_id),
             error_traps)
+        if RouteHandler._is_not_modified(request, etag):
+            return web.HTTPNotModified(headers={'ETag': etag})
 
+        response = RouteHandler._try_response_parse(
+            client.ClientBatchGetResponse, content)
         return RouteHandler._wrap_response(
             data=RouteHandler._expand_batch(response['batch']),
-            metadata=RouteHandler._get_metadata(request, response))
+            metadata=RouteHandler._get_metadata(request, response),
+            headers={'ETag': etag})
+
+    @asyncio.coroutine
+    def events(self, request):
+        """
+        Streams the changes to the chain to the client as server-sent
+        events, until the client disconnects or falls too far behind.
+        Events may be filtered to the statuses of a set of batch ids, and
+        blocks may be omitted
+        """
+        batch_ids = frozenset(RouteHandler._get_filter_ids(request) or [])
+        omit_blocks = \
+            request.url.query.get('omit_blocks', 'false').lower() != 'false'
+
+        if self._events_task is None:
+            self._subscribe_to_events()
+            self._events_task = asyncio.ensure_future(self._receive_events())
+
+        events = asyncio.Queue(maxsize=EVENT_QUEUE_SIZE)
+        self._event_queues.add(events)
+
+        response = web.StreamResponse()
+        response.content_type = 'text/event-stream'
+        try:
+            yield from response.prepare(request)
+            while True:
+                event = yield from events.get()
+                if event is None:
+                    break
+                data = RouteHandler._filter_event(
+                    event, batch_ids, omit_blocks)
+                if data:
+                    response.write('data: {}\n\n'.format(
+                        json.dumps(data, sort_keys=True)).encode())
+                    yield from response.drain()
+        finally:
+            self._event_queues.discard(events)
+
+        return response
+
+    def _subscribe_to_events(self):
+        """
+        Subscribes the REST API to every event of the validator, which are
+        filtered for each event stream client as they are sent
+        """
+        self._query_validator(
+            Message.CLIENT_EVENTS_SUBSCRIBE_REQUEST,
+            client.ClientEventsSubscribeResponse,
+            client.ClientEventsSubscribeRequest())
+
+    @asyncio.coroutine
+    def _receive_events(self):
+        """
+        Passes each event pushed by the validator to the queue of each event
+        stream client, disconnecting the clients whose queues are full
+        """
+        while True:
+            message = yield from asyncio.wrap_future(self._stream.receive())
+            if not isinstance(message, BaseMessage):
+                # The stream has reconnected to the validator, which forgets
+                # its subscribers when they disconnect
+                try:
+                    self._subscribe_to_events()
+                except errors.ValidatorUnavailable:
+                    pass
+                continue
+            if message.message_type != Message.CLIENT_EVENTS:
+                continue
+
+            event = client.ClientEvent()
+            event.ParseFromString(message.content)
+            for events in list(self._event_queues):
+                try:
+                    events.put_nowait(event)
+                except asyncio.QueueFull:
+                    self._event_queues.discard(events)
+                    while not events.empty():
+                        events.get_nowait()
+                    events.put_nowait(None)
+
+    @staticmethod
+    def _filter_event(event, batch_ids, omit_blocks):
+        """
+        Converts an event to a dict, with only the statuses of a set of
+        batch ids, if any, and without blocks if they are omitted. Returns
+        None if nothing is left
+        """
+        data = RouteHandler._message_to_dict(event)
+        if omit_blocks:
+            del data['blocks']
+            del data['removed_block_ids']
+        if batch_ids:
+            data['batch_statuses'] = {
+                k: v for k, v in data['batch_statuses'].items()
+                if k in batch_ids}
+
+        if any(data.values()):
+            return data
+        return None
 
     def _query_validator(self, req_type, resp_proto, content, traps=None):
         """
@@ -243,6 +439,23 @@ class RouteHandler(object):
         response = self._try_validator_request(req_type, content)
         return RouteHandler._try_response_parse(resp_proto, response, traps)
 
+    def _query_immutable(self, cache_key, req_type, resp_proto, content,
+                         traps=None):
+        """
+        Fetches the validator's response for a resource which never changes
+        from the cache, or sends the request to the validator and caches
+        its response if it is found. Returns the serialized response, which
+        is yet to be parsed, and its ETag
+        """
+        cached = self._cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        response = self._try_validator_request(req_type, content)
+        # Raises any error status as an HTTP error, so errors are not cached
+        RouteHandler._check_response(resp_proto, response, traps)
+        return response, self._cache.put(cache_key, response)
+
     def _try_validator_request(self, message_type, content):
         """
         Sends a protobuf message to the validator
@@ -267,6 +480,15 @@ class RouteHandler(object):
 
     @staticmethod
     def _try_response_parse(proto, response, traps=None):
+        """
+        Parses a protobuf response from the validator into a dict
+        Raises common validator error statuses as HTTP errors
+        """
+        return RouteHandler._message_to_dict(
+            RouteHandler._check_response(proto, response, traps))
+
+    @staticmethod
+    def _check_response(proto, response, traps=None):
         """
         Parses a protobuf response from the validator
         Raises common validator error statuses as HTTP errors
@@ -292,14 +514,33 @@ class RouteHandler(object):
         for trap in traps:
             trap.check(parsed.status)
 
+        return parsed
+
+    @staticmethod
+    def _message_to_dict(message):
         return MessageToDict(
-            parsed,
+            message,
             including_default_value_fields=True,
             preserving_proto_field_name=True,
         )
 
     @staticmethod
-    def _wrap_response(data=None, metadata=None, status=200):
+    def _is_not_modified(request, etag):
+        """
+        Checks whether the client already has the response with an ETag,
+        from the `If-None-Match` header of its request
+        """
+        matches = request.headers.get('If-None-Match', '')
+        for match in matches.split(','):
+            match = match.strip()
+            if match.startswith('W/'):
+                match = match[2:]
+            if match in (etag, '*'):
+                return True
+        return False
+
+    @staticmethod
+    def _wrap_response(data=None, metadata=None, status=200, headers=None):
         """
         Creates a JSON response envelope and sends it back to the client
         """
@@ -310,6 +551,7 @@ class RouteHandler(object):
 
         return web.Response(
             status=status,
+            headers=headers,
             content_type='application/json',
             text=json.dumps(
                 envelope,
@@ -317,6 +559,47 @@ class RouteHandler(object):
                 separators=(',', ': '),
                 sort_keys=True))
 
+    @staticmethod
+    @asyncio.coroutine
+    def _stream_list_response(request, data, metadata=None):
+        """
+        Streams a JSON envelope with a list of data back to the client,
+        encoding and sending one item of the list at a time, so the whole
+        body is never held in memory. The body is formatted exactly as
+        `_wrap_response` would format it.
+        """
+        response = web.StreamResponse()
+        response.content_type = 'application/json'
+        yield from response.prepare(request)
+
+        # The envelope's keys are sorted, so 'data' is always written first
+        response.write(b'{\n  "data": [')
+        separator = '\n'
+        for item in data:
+            text = json.dumps(
+                item,
+                indent=2,
+                separators=(',', ': '),
+                sort_keys=True)
+            response.write(
+                (separator + textwrap.indent(text, '    ')).encode())
+            separator = ',\n'
+            yield from response.drain()
+
+        closing = '\n  ]' if separator != '\n' else ']'
+        if metadata:
+            closing += ',' + json.dumps(
+                metadata,
+                indent=2,
+                separators=(',', ': '),
+                sort_keys=True)[1:]
+        else:
+            closing += '\n}'
+        response.write(closing.encode())
+
+        yield from response.write_eof()
+        return response
+
     @staticmethod
     def _get_metadata(request, response):
         head = response.get('head_id', None)
@@ -336,6 +619,56 @@ class RouteHandler(object):
 
         return {'head': head, 'link': link}
 
+    @staticmethod
+    def _get_paged_metadata(request, response):
+        """
+        Adds a description of the page of a list response to its metadata,
+        with a link to the next page, if there is one
+        """
+        metadata = RouteHandler._get_metadata(request, response)
+        paging = response.get('paging', {})
+
+        metadata['paging'] = {
+            'start': paging.get('start_id', ''),
+            'limit': paging.get('limit', 0)}
+
+        next_id = paging.get('next_id')
+        if next_id:
+            query = [(k, v) for k, v in request.url.query.items()
+                     if k not in ('head', 'start')]
+            if 'head' in metadata:
+                query.insert(0, ('head', metadata['head']))
+            query.append(('start', next_id))
+
+            metadata['paging']['next_id'] = next_id
+            metadata['paging']['next'] = '{}://{}{}?{}'.format(
+                request.scheme,
+                request.host,
+                request.path,
+                '&'.join('{}={}'.format(k, v) for k, v in query))
+
+        return metadata
+
+    @staticmethod
+    def _get_paging_controls(request):
+        """
+        Parses the `start`, `limit` and `reverse` query parameters into the
+        paging controls of a validator list query
+        """
+        query = request.url.query
+
+        try:
+            limit = int(query.get('limit', 0))
+        except ValueError:
+            raise errors.InvalidPagingQuery(MAX_PAGE_SIZE)
+        if limit < 0 or limit > MAX_PAGE_SIZE:
+            raise errors.InvalidPagingQuery(MAX_PAGE_SIZE)
+
+        return client.PagingControls(
+            start_id=query.get('start', ''),
+            limit=limit,
+            reverse=query.get('reverse', 'false').lower() != 'false')
+
     def _set_wait(self, request, validator_query):
         """
         Parses the `wait` query parameter, and sets the corresponding
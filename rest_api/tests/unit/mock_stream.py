@@ -13,6 +13,8 @@
 # limitations under the License.
 # ------------------------------------------------------------------------------
 
+from concurrent.futures import Future
+
 from sawtooth_sdk.protobuf.validator_pb2 import Message
 from sawtooth_rest_api.protobuf import client_pb2 as client
 from sawtooth_rest_api.protobuf.block_pb2 import Block
@@ -40,17 +42,35 @@ class MockStream(object):
     intercept attempts to send requests, and send back custom responses.
     """
     def __init__(self):
+        self.sent_types = []
         self._handlers = {}
         self._add_handler(Message.CLIENT_BATCH_SUBMIT_REQUEST, _SubmitHandler)
         self._add_handler(Message.CLIENT_BATCH_STATUS_REQUEST, _StatusHandler)
         self._add_handler(Message.CLIENT_STATE_LIST_REQUEST, _StateListHandler)
         self._add_handler(Message.CLIENT_STATE_GET_REQUEST, _StateGetHandler)
+        self._add_handler(
+            Message.CLIENT_STATE_PROOF_REQUEST, _StateProofHandler)
         self._add_handler(Message.CLIENT_BLOCK_LIST_REQUEST, _BlockListHandler)
         self._add_handler(Message.CLIENT_BLOCK_GET_REQUEST, _BlockGetHandler)
         self._add_handler(Message.CLIENT_BATCH_LIST_REQUEST, _BatchListHandler)
         self._add_handler(Message.CLIENT_BATCH_GET_REQUEST, _BatchGetHandler)
+        self._add_handler(
+            Message.CLIENT_EVENTS_SUBSCRIBE_REQUEST, _EventsSubscribeHandler)
+        self._events = _make_mock_events()
+
+    def receive(self):
+        """Returns each mock event pushed by the validator in turn, and
+        then a future which is never done.
+        """
+        received = Future()
+        if self._events:
+            received.set_result(Message(
+                message_type=Message.CLIENT_EVENTS,
+                content=self._events.pop(0).SerializeToString()))
+        return received
 
     def send(self, message_type, content):
+        self.sent_types.append(message_type)
         if not self._handlers[message_type]:
             raise NotImplementedError(
                 'No handler for type {}'.format(message_type))
@@ -219,6 +239,27 @@ class _MockHandler(object):
         request.ParseFromString(content)
         return request
 
+    @staticmethod
+    def _page(resources, paging):
+        """Returns a page of resources, and a description of it, for the
+        paging controls of a request, or None if the start id is invalid.
+        """
+        limit = paging.limit or 100
+        if paging.reverse:
+            resources = list(reversed(resources))
+
+        ids = [r.header_signature for r in resources]
+        if paging.start_id and paging.start_id not in ids:
+            return None
+        start = ids.index(paging.start_id) if paging.start_id else 0
+
+        page = resources[start:start + limit]
+        next_id = ids[start + limit] if start + limit < len(ids) else ''
+        return page, client.PagingResponse(
+            start_id=page[0].header_signature if page else '',
+            limit=limit,
+            next_id=next_id)
+
 
 class _SubmitHandler(_MockHandler):
     def __init__(self):
@@ -298,15 +339,30 @@ class _StateListHandler(_MockHandler):
         head_id, leaves = state.get_leaves(request.address, request.head_id)
         if leaves == None:
             return self._response_proto(status=self._response_proto.NO_ROOT)
+        if request.paging.reverse:
+            return self._response_proto(
+                status=self._response_proto.INVALID_PAGING)
+
+        # Leaves are paged in address order, from the start address
+        limit = request.paging.limit or 100
+        leaves = sorted(leaves, key=lambda l: l.address)
+        leaves = [l for l in leaves if l.address >= request.paging.start_id]
+        paging = client.PagingResponse(
+            start_id=leaves[0].address if leaves else '',
+            limit=limit,
+            next_id=leaves[limit].address if len(leaves) > limit else '')
+
         if leaves == []:
             return self._response_proto(
                 status=self._response_proto.NO_RESOURCE,
-                head_id=head_id)
+                head_id=head_id,
+                paging=paging)
 
         return self._response_proto(
             status=self._response_proto.OK,
             head_id=head_id,
-            leaves=leaves)
+            leaves=leaves[:limit],
+            paging=paging)
 
 
 class _StateGetHandler(_MockHandler):
@@ -334,6 +390,33 @@ class _StateGetHandler(_MockHandler):
             value=value)
 
 
+class _StateProofHandler(_MockHandler):
+    def __init__(self):
+        super().__init__(
+            client.ClientStateProofRequest,
+            client.ClientStateProofResponse,
+            Message.CLIENT_STATE_PROOF_RESPONSE)
+
+    def handle(self, content):
+        """Sends back a mock proof with one node for each address, and an
+        extra node for the root, which is shared by all of the addresses.
+        """
+        request = self._parse_request(content)
+        state = _MockState()
+
+        head_id, leaves = state.get_leaves(head=request.head_id)
+        if leaves is None:
+            return self._response_proto(status=self._response_proto.NO_ROOT)
+
+        nodes = [b'root'] + [a.encode() for a in request.addresses]
+
+        return self._response_proto(
+            status=self._response_proto.OK,
+            head_id=head_id,
+            merkle_root='merkle_root',
+            nodes=nodes)
+
+
 class _BlockListHandler(_MockHandler):
     def __init__(self):
         super().__init__(
@@ -357,11 +440,17 @@ class _BlockListHandler(_MockHandler):
             if not blocks:
                 self._response_proto(status=self._response_proto.NO_RESOURCE)
 
+        paged = self._page(blocks, request.paging)
+        if paged is None:
+            return self._response_proto(
+                status=self._response_proto.INVALID_PAGING)
+        blocks, paging = paged
 
         return self._response_proto(
             status=self._response_proto.OK,
             head_id=head_id,
-            blocks=blocks)
+            blocks=blocks,
+            paging=paging)
 
 
 class _BlockGetHandler(_MockHandler):
@@ -413,10 +502,17 @@ class _BatchListHandler(_MockHandler):
             if not batches:
                 self._response_proto(status=self._response_proto.NO_RESOURCE)
 
+        paged = self._page(batches, request.paging)
+        if paged is None:
+            return self._response_proto(
+                status=self._response_proto.INVALID_PAGING)
+        batches, paging = paged
+
         return self._response_proto(
             status=self._response_proto.OK,
             head_id=head_id,
-            batches=batches)
+            batches=batches,
+            paging=paging)
 
 
 class _BatchGetHandler(_MockHandler):
@@ -443,3 +539,32 @@ class _BatchGetHandler(_MockHandler):
         return self._response_proto(
             status=self._response_proto.OK,
             batch=block.batches[0])
+
+
+class _EventsSubscribeHandler(_MockHandler):
+    def __init__(self):
+        super().__init__(
+            client.ClientEventsSubscribeRequest,
+            client.ClientEventsSubscribeResponse,
+            Message.CLIENT_EVENTS_SUBSCRIBE_RESPONSE)
+
+    def handle(self, content):
+        return self._response_proto(status=self._response_proto.OK)
+
+
+def _make_mock_events():
+    """Returns the events of two blocks, '3' and '4', being committed after
+    the blocks of the mock block store, each with a batch of the same id.
+    """
+    events = []
+    for block_num in (3, 4):
+        block_id = str(block_num)
+        events.append(client.ClientEvent(
+            blocks=[client.ClientBlockCommit(
+                block_id=block_id,
+                block_num=block_num,
+                previous_block_id=str(block_num - 1),
+                batch_ids=[block_id])],
+            batch_statuses={
+                block_id: client.ClientBatchStatusResponse.COMMITTED}))
+    return events
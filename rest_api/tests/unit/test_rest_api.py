@@ -14,6 +14,7 @@
 # ------------------------------------------------------------------------------
 
 from base64 import b64decode
+import json
 from aiohttp import web
 from aiohttp.test_utils import AioHTTPTestCase, unittest_run_loop
 from sawtooth_rest_api.protobuf import batch_pb2
@@ -25,7 +26,7 @@ class ApiTest(AioHTTPTestCase):
     async def get_application(self, loop):
         # Create handler and replace stream with mock
         handlers = RouteHandler('tcp://0.0.0.0:40404', 5)
-        handlers._stream = MockStream()
+        handlers._stream = self.stream = MockStream()
 
         # Add handlers
         app = web.Application(loop=loop)
@@ -33,10 +34,12 @@ class ApiTest(AioHTTPTestCase):
         app.router.add_get('/batch_status', handlers.status_list)
         app.router.add_get('/state', handlers.state_list)
         app.router.add_get('/state/{address}', handlers.state_get)
+        app.router.add_get('/state_proof', handlers.state_proof)
         app.router.add_get('/blocks', handlers.block_list)
         app.router.add_get('/blocks/{block_id}', handlers.block_get)
         app.router.add_get('/batches', handlers.batch_list)
         app.router.add_get('/batches/{batch_id}', handlers.batch_get)
+        app.router.add_get('/events', handlers.events)
         return app
 
     @unittest_run_loop
@@ -367,6 +370,58 @@ class ApiTest(AioHTTPTestCase):
         self.assert_has_valid_link(response, '/state?head=0&address=b')
         self.assert_has_valid_data_list(response, 0)
 
+    @unittest_run_loop
+    async def test_state_list_paginated(self):
+        """Verifies a GET /state with a limit returns a page of leaves in
+        address order, with paging metadata linking to the next page.
+
+        Expects to find:
+            - a response status of 200
+            - a data property with the leaves 'a' and 'b'
+            - a paging property with a start of 'a', a limit of 2, a next_id
+              of 'c', and a next link that ends in
+              '/state?head=2&limit=2&start=c'
+        """
+        response = await self.get_json_assert_200('/state?limit=2')
+
+        self.assert_has_valid_data_list(response, 2)
+        self.assertEqual(['a', 'b'], [l['address'] for l in response['data']])
+
+        paging = response['paging']
+        self.assertEqual('a', paging['start'])
+        self.assertEqual(2, paging['limit'])
+        self.assertEqual('c', paging['next_id'])
+        self.assertTrue(
+            paging['next'].endswith('/state?head=2&limit=2&start=c'))
+
+    @unittest_run_loop
+    async def test_state_list_last_page(self):
+        """Verifies a GET /state from a start address returns the last page,
+        with no link to a next page.
+
+        Expects to find:
+            - a response status of 200
+            - a data property with the leaves 'b' and 'c'
+            - a paging property without a next link
+        """
+        response = await self.get_json_assert_200('/state?start=b')
+
+        self.assertEqual(['b', 'c'], [l['address'] for l in response['data']])
+        self.assertNotIn('next', response['paging'])
+
+    @unittest_run_loop
+    async def test_state_list_bad_paging(self):
+        """Verifies GET /state breaks properly with invalid paging.
+
+        Expects to find:
+            - a response status of 400 for a reversed list
+            - a response status of 400 for a limit which is not a number,
+              or is over the maximum page size
+        """
+        await self.assert_400('/state?reverse')
+        await self.assert_400('/state?limit=many')
+        await self.assert_400('/state?limit=1001')
+
     @unittest_run_loop
     async def test_state_get(self):
         """Verifies a GET /state/{address} without parameters works properly.
@@ -435,6 +490,23 @@ class ApiTest(AioHTTPTestCase):
         """
         await self.assert_404('/state/c?head=bad')
 
+    @unittest_run_loop
+    async def test_state_get_cached_only_with_head(self):
+        """Verifies GET /state/{address} is cached with a head parameter,
+        but not at the current chain head, which may change.
+
+        Expects to find:
+            - one request sent to the validator for two GETs with a head
+            - a request sent to the validator for each GET without a head
+        """
+        await self.get_json_assert_200('/state/b?head=1')
+        await self.get_json_assert_200('/state/b?head=1')
+        self.assertEqual(1, len(self.stream.sent_types))
+
+        await self.get_json_assert_200('/state/b')
+        await self.get_json_assert_200('/state/b')
+        self.assertEqual(3, len(self.stream.sent_types))
+
     @unittest_run_loop
     async def test_state_get_with_early_head(self):
         """Verifies GET /state/{address} breaks with head earlier than address.
@@ -449,6 +521,63 @@ class ApiTest(AioHTTPTestCase):
         """
         await self.assert_404('/state/c?head=0')
 
+    @unittest_run_loop
+    async def test_state_proof(self):
+        """Verifies a GET /state_proof with many addresses works properly.
+
+        Expects to find:
+            - a response status of 200
+            - a head property of '2'
+            - a link property that ends in '/state_proof?head=2&address=a,b'
+            - a data property with a merkle_root of 'merkle_root'
+            - nodes that b64decode to b'root', b'a', and b'b'
+        """
+        response = await self.get_json_assert_200('/state_proof?address=a,b')
+
+        self.assert_has_valid_head(response, '2')
+        self.assert_has_valid_link(
+            response, '/state_proof?head=2&address=a,b')
+        self.assertIn('data', response)
+
+        data = response['data']
+        self.assertEqual('merkle_root', data['merkle_root'])
+        self.assertEqual(
+            [b'root', b'a', b'b'],
+            [b64decode(n) for n in data['nodes']])
+
+    @unittest_run_loop
+    async def test_state_proof_with_head(self):
+        """Verifies a GET /state_proof works properly with head parameter.
+
+        Expects to find:
+            - a response status of 200
+            - a head property of '1'
+            - a link property that ends in '/state_proof?head=1&address=a'
+        """
+        response = await self.get_json_assert_200(
+            '/state_proof?head=1&address=a')
+
+        self.assert_has_valid_head(response, '1')
+        self.assert_has_valid_link(response, '/state_proof?head=1&address=a')
+
+    @unittest_run_loop
+    async def test_state_proof_with_bad_head(self):
+        """Verifies a GET /state_proof breaks properly with a bad head.
+
+        Expects to find:
+            - a response status of 404
+        """
+        await self.assert_404('/state_proof?head=bad&address=a')
+
+    @unittest_run_loop
+    async def test_state_proof_with_no_address(self):
+        """Verifies a GET /state_proof with no address breaks properly.
+
+        Expects to find:
+            - a response status of 400
+        """
+        await self.assert_400('/state_proof')
+
     @unittest_run_loop
     async def test_block_list(self):
         """Verifies a GET /blocks without parameters works properly.
@@ -643,6 +772,62 @@ class ApiTest(AioHTTPTestCase):
         self.assert_has_valid_link(response, '/blocks?head=0&id=1,2')
         self.assert_has_valid_data_list(response, 0)
 
+    @unittest_run_loop
+    async def test_block_list_paginated(self):
+        """Verifies a GET /blocks with a limit returns a page of blocks, with
+        paging metadata linking to the next page.
+
+        Expects to find:
+            - a response status of 200
+            - a data property with 2 blocks, '2' and '1'
+            - a paging property with a start of '2', a limit of 2, a next_id
+              of '0', and a next link that ends in
+              '/blocks?head=2&limit=2&start=0'
+        """
+        response = await self.get_json_assert_200('/blocks?limit=2')
+
+        self.assert_has_valid_data_list(response, 2)
+        self.assertEqual(
+            ['2', '1'], [b['header_signature'] for b in response['data']])
+
+        paging = response['paging']
+        self.assertEqual('2', paging['start'])
+        self.assertEqual(2, paging['limit'])
+        self.assertEqual('0', paging['next_id'])
+        self.assertTrue(
+            paging['next'].endswith('/blocks?head=2&limit=2&start=0'))
+
+    @unittest_run_loop
+    async def test_block_list_last_page(self):
+        """Verifies a GET /blocks from a start id in reverse returns the last
+        page, with no link to a next page.
+
+        Expects to find:
+            - a response status of 200
+            - a data property with the blocks '1' and '2'
+            - a paging property without a next link
+        """
+        response = await self.get_json_assert_200(
+            '/blocks?start=1&reverse')
+
+        self.assertEqual(
+            ['1', '2'], [b['header_signature'] for b in response['data']])
+        self.assertNotIn('next', response['paging'])
+
+    @unittest_run_loop
+    async def test_block_list_bad_paging(self):
+        """Verifies GET /blocks breaks properly with invalid paging.
+
+        Expects to find:
+            - a response status of 400 for a start id not in the list
+            - a response status of 400 for a limit which is not a number,
+              is negative, or is over the maximum page size
+        """
+        await self.assert_400('/blocks?start=missing')
+        await self.assert_400('/blocks?limit=many')
+        await self.assert_400('/blocks?limit=-1')
+        await self.assert_400('/blocks?limit=1001')
+
     @unittest_run_loop
     async def test_block_get(self):
         """Verifies a GET /blocks/{block_id} works properly.
@@ -696,6 +881,39 @@ class ApiTest(AioHTTPTestCase):
         """
         await self.assert_404('/blocks/missing')
 
+    @unittest_run_loop
+    async def test_block_get_cached(self):
+        """Verifies repeated GETs of /blocks/{block_id} are answered from
+        the cache, and that a matching If-None-Match is not modified.
+
+        Expects to find:
+            - one request sent to the validator for two GETs of one block
+            - the same ETag header on each response
+            - a response status of 304 when the ETag is sent back
+        """
+        first = await self.get_and_assert_status('/blocks/1', 200)
+        second = await self.get_and_assert_status('/blocks/1', 200)
+        self.assertEqual(1, len(self.stream.sent_types))
+        self.assertIn('ETag', first.headers)
+        self.assertEqual(first.headers['ETag'], second.headers['ETag'])
+        self.assertEqual(await first.json(), await second.json())
+
+        response = await self.client.get(
+            '/blocks/1', headers={'If-None-Match': first.headers['ETag']})
+        self.assertEqual(304, response.status)
+        self.assertEqual(1, len(self.stream.sent_types))
+
+    @unittest_run_loop
+    async def test_block_get_error_not_cached(self):
+        """Verifies a GET /blocks/{block_id} which breaks is not cached.
+
+        Expects to find:
+            - a request sent to the validator for each GET of a missing block
+        """
+        await self.assert_404('/blocks/missing')
+        await self.assert_404('/blocks/missing')
+        self.assertEqual(2, len(self.stream.sent_types))
+
     @unittest_run_loop
     async def test_batch_list(self):
         """Verifies a GET /batches without parameters works properly.
@@ -882,6 +1100,24 @@ class ApiTest(AioHTTPTestCase):
         self.assert_has_valid_link(response, '/batches?head=0&id=1,2')
         self.assert_has_valid_data_list(response, 0)
 
+    @unittest_run_loop
+    async def test_batch_list_paginated(self):
+        """Verifies a GET /batches with a start and limit returns a page of
+        batches, with paging metadata linking to the next page.
+
+        Expects to find:
+            - a response status of 200
+            - a data property with the batch '1'
+            - a paging property with a next link that ends in
+              '/batches?head=2&limit=1&start=0'
+        """
+        response = await self.get_json_assert_200('/batches?start=1&limit=1')
+
+        self.assertEqual(
+            ['1'], [b['header_signature'] for b in response['data']])
+        self.assertTrue(response['paging']['next'].endswith(
+            '/batches?head=2&limit=1&start=0'))
+
     @unittest_run_loop
     async def test_batch_get(self):
         """Verifies a GET /batches/{batch_id} works properly.
@@ -930,6 +1166,29 @@ class ApiTest(AioHTTPTestCase):
         """
         await self.assert_404('/batches/missing')
 
+    @unittest_run_loop
+    async def test_events(self):
+        """Verifies a GET /events streams the events pushed by the
+        validator, filtered by batch id and without blocks.
+
+        The mock validator pushes the commits of two blocks, '3' and '4',
+        each with a batch of the same id.
+
+        Expects to find:
+            - a response status of 200
+            - a content type of 'text/event-stream'
+            - a first event with only the COMMITTED status of batch '4'
+        """
+        response = await self.client.get('/events?id=4&omit_blocks')
+        self.assertEqual(200, response.status)
+        self.assertEqual('text/event-stream', response.content_type)
+
+        line = await response.content.readline()
+        self.assertTrue(line.startswith(b'data: '))
+        self.assertEqual(
+            {'batch_statuses': {'4': 'COMMITTED'}},
+            json.loads(line[len(b'data: '):].decode()))
+        response.close()
 
     async def post_batch_ids(self, *batch_ids, wait=False):
         batches = [batch_pb2.Batch(
@@ -16,5 +16,6 @@
 
 __all__ = [
     'future',
+    'state_proof',
     'stream'
 ]
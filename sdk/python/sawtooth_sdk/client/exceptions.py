@@ -24,3 +24,7 @@ class ValidatorConnectionError(Exception):
 class WorkloadConfigurationError(Exception):
     def __init__(self):
         super().__init__("A workload object is not set.")
+
+
+class InvalidProofError(Exception):
+    pass
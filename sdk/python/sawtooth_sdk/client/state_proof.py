@@ -0,0 +1,89 @@
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+import hashlib
+
+import cbor
+
+from sawtooth_sdk.client.exceptions import InvalidProofError
+
+# The number of address characters consumed by each level of the merkle tree.
+TOKEN_SIZE = 2
+
+
+def verify_state_proof(merkle_root, nodes, addresses):
+    """Checks a proof of the entries at a set of addresses, as returned by a
+    validator's state proof request, against a trusted merkle root.
+
+    Every node is located by the hash of its encoding, so a node which has
+    been altered is never reached from the root, and each node is only
+    hashed and decoded once however many of the addresses' paths share it.
+
+    Args:
+        merkle_root (str): the trusted merkle root of the state.
+        nodes (list of bytes): the encoded merkle tree nodes of the proof.
+        addresses (list of str): the addresses whose entries are proven.
+
+    Returns:
+        dict of str: bytes: the data at each address, or None for each
+            address which the proof shows has no entry.
+
+    Raises:
+        InvalidProofError: if the proof is missing a node on the path to an
+            address, or a node is malformed.
+    """
+    by_hash = {
+        hashlib.sha512(packed).hexdigest()[:64]: packed for packed in nodes}
+    decoded = {}
+
+    def get_node(key_hash):
+        if key_hash not in decoded:
+            try:
+                node = cbor.loads(by_hash[key_hash])
+            except KeyError:
+                raise InvalidProofError(
+                    "Proof is missing node {}".format(key_hash))
+            except Exception:  # pylint: disable=broad-except
+                raise InvalidProofError(
+                    "Node {} is not CBOR encoded".format(key_hash))
+
+            if not isinstance(node, dict) or \
+                    not isinstance(node.get('c'), dict):
+                raise InvalidProofError(
+                    "Node {} is malformed".format(key_hash))
+
+            decoded[key_hash] = node
+        return decoded[key_hash]
+
+    results = {}
+    for address in addresses:
+        node = get_node(merkle_root)
+        for i in range(0, len(address), TOKEN_SIZE):
+            child_hash = node['c'].get(address[i:i + TOKEN_SIZE])
+            if child_hash is None:
+                node = None
+                break
+            node = get_node(child_hash)
+
+        if node is None or node.get('v') is None:
+            results[address] = None
+        else:
+            try:
+                results[address] = cbor.loads(node['v'])
+            except Exception:  # pylint: disable=broad-except
+                raise InvalidProofError(
+                    "Entry at {} is not CBOR encoded".format(address))
+
+    return results
@@ -74,6 +74,7 @@ setup(name='sawtooth-sdk',
       packages=find_packages(),
       install_requires=[
           'sawtooth-signing',
+          'cbor',
           'protobuf',
           'pyzmq'
           ]
@@ -17,4 +17,7 @@ __all__ = [
     'database',
     'shelf_database',
     'lmdb_database',
-    'lmdb_nolock_database']
+    'lmdb_nolock_database',
+    'sqlite_database',
+    'memory_database',
+    'backends']
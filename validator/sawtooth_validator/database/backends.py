@@ -0,0 +1,120 @@
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+"""A registry of the storage backends which the validator may keep its
+databases in, by name.
+
+Each backend is registered with a factory, called as
+
+    factory(filename, flag, raw=False, durability=DURABILITY_WRITE,
+            **options)
+
+which returns a sawtooth_validator.database.database.Database. Options
+which a backend does not use are ignored, so the same options may be given
+to any backend.
+"""
+
+from collections import OrderedDict
+from threading import Lock
+
+from sawtooth_validator.database.database import DURABILITY_WRITE
+from sawtooth_validator.database.lmdb_nolock_database import \
+    DEFAULT_GROUP_COMMIT_INTERVAL
+from sawtooth_validator.database.lmdb_nolock_database import \
+    DEFAULT_GROUP_COMMIT_WRITES
+from sawtooth_validator.database.lmdb_nolock_database import \
+    LMDBNoLockDatabase
+from sawtooth_validator.database.memory_database import MemoryDatabase
+from sawtooth_validator.database.sqlite_database import SQLiteDatabase
+
+DEFAULT_BACKEND = 'lmdb'
+
+_BACKENDS = OrderedDict()
+_BACKENDS_LOCK = Lock()
+
+
+def register_backend(name, factory):
+    """Registers a storage backend, replacing any backend of the same name.
+
+    Args:
+        name (str): the name the backend is selected by.
+        factory (function): opens a database in the backend, as described
+            in this module's documentation.
+    """
+    with _BACKENDS_LOCK:
+        _BACKENDS[name] = factory
+
+
+def backend_names():
+    """Returns the names of the registered backends, in the order they were
+    registered.
+    """
+    with _BACKENDS_LOCK:
+        return list(_BACKENDS)
+
+
+def open_database(backend, filename, flag, raw=False,
+                  durability=DURABILITY_WRITE, **options):
+    """Opens a database in a registered backend.
+
+    Args:
+        backend (str): the name of the backend.
+        filename (str): the filename of the database file, for backends
+            which keep their data in a file.
+        flag (str): a flag indicating the mode for opening the database.
+            Refer to the documentation for anydbm.open().
+        raw (bool): True if values are bytes to be stored without encoding.
+        durability (str): one of the durability modes in
+            sawtooth_validator.database.database.
+        options: further backend specific options.
+
+    Returns:
+        Database: the opened database.
+
+    Raises:
+        ValueError: if no backend of the given name is registered.
+    """
+    with _BACKENDS_LOCK:
+        try:
+            factory = _BACKENDS[backend]
+        except KeyError:
+            raise ValueError(
+                "Unknown database backend: {}".format(backend))
+
+    return factory(filename, flag, raw=raw, durability=durability, **options)
+
+
+def _open_lmdb(filename, flag, raw=False, durability=DURABILITY_WRITE,
+               group_commit_interval=DEFAULT_GROUP_COMMIT_INTERVAL,
+               group_commit_writes=DEFAULT_GROUP_COMMIT_WRITES, **_):
+    return LMDBNoLockDatabase(filename, flag, raw=raw,
+                              durability=durability,
+                              group_commit_interval=group_commit_interval,
+                              group_commit_writes=group_commit_writes)
+
+
+def _open_sqlite(filename, flag, raw=False, durability=DURABILITY_WRITE,
+                 **_):
+    return SQLiteDatabase(filename, flag, raw=raw, durability=durability)
+
+
+def _open_memory(filename, flag, raw=False, max_size=None, **_):
+    # pylint: disable=unused-argument
+    return MemoryDatabase(raw=raw, max_size=max_size)
+
+
+register_backend('lmdb', _open_lmdb)
+register_backend('sqlite', _open_sqlite)
+register_backend('memory', _open_memory)
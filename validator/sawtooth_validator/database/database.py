@@ -12,9 +12,20 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 # ------------------------------------------------------------------------------
+import bisect
 from collections import OrderedDict
 from threading import RLock
 
+# Durability modes, which determine when committed writes are synced to disk:
+# after every write, by a background thread once enough writes have been
+# made or enough time has passed, or only when sync is called, such as by
+# the block store as each block is committed. Backends which cannot defer
+# syncs in a particular way may treat the group and block modes alike.
+DURABILITY_WRITE = 'write'
+DURABILITY_GROUP = 'group'
+DURABILITY_BLOCK = 'block'
+DURABILITY_MODES = (DURABILITY_WRITE, DURABILITY_GROUP, DURABILITY_BLOCK)
+
 
 class Database(object):
     """The Database interface. This class is intended to be inherited by
@@ -49,6 +60,25 @@ class Database(object):
         """
         raise NotImplementedError()
 
+    def get_batch(self, keys):
+        """Retrieves the values associated with several keys from the
+        database. Implementations may override this to read all of the keys
+        at once.
+
+        Args:
+            keys (list of str): The keys to retrieve
+
+        Returns:
+            list of (str, object): (key, value) pairs for the keys which
+                are in the database.
+        """
+        result = []
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                result.append((key, value))
+        return result
+
     def set(self, key, value):
         """Sets a value associated with a key in the database
 
@@ -71,6 +101,56 @@ class Database(object):
         """
         raise NotImplementedError()
 
+    def sub_database(self, name):
+        """Returns a database which holds raw bytes values, in a keyspace of
+        its own within this database. Each kind of record kept in one
+        database may be given a sub database, so that reads of one kind
+        need not pass over the others.
+
+        This default keeps a sub database's records in this database, under
+        keys prefixed with its name, so this database should not also be
+        used directly. Implementations with native named keyspaces may
+        override it, along with set_batches.
+
+        Args:
+            name (str): the name of the sub database.
+
+        Returns:
+            Database: the sub database.
+        """
+        return _PrefixedDatabase(self, name)
+
+    def set_batches(self, batches):
+        """Applies changes to several sub databases of this database in a
+        single write, so that either every change is made or none are.
+
+        Args:
+            batches (list of (Database, list, list)): for each sub database
+                to change, the sub database and the add_pairs and del_keys
+                to apply to it, as for set_batch.
+        """
+        add_pairs = []
+        del_keys = []
+        for sub_database, adds, dels in batches:
+            if not isinstance(sub_database, _PrefixedDatabase) or \
+                    sub_database.parent is not self:
+                raise ValueError(
+                    "{} is not a sub database of this database".format(
+                        sub_database))
+            add_pairs.extend(
+                (sub_database.prefix + key, value) for key, value in adds)
+            if dels:
+                del_keys.extend(sub_database.prefix + key for key in dels)
+        self.set_batch(add_pairs, del_keys)
+
+    def read_session(self):
+        """Returns a context in which the current thread's reads may share
+        resources, such as a transaction, rather than acquiring them for
+        each read. Implementations which have nothing to share may keep
+        this default, which does nothing.
+        """
+        return _NullContext()
+
     def close(self):
         """Closes the connection to the database
         """
@@ -81,6 +161,91 @@ class Database(object):
         """
         raise NotImplementedError()
 
+    def keys_after(self, start_key, limit):
+        """Returns, in order, up to limit of the keys in the database which
+        come after start_key, or the first keys if start_key is None. The
+        keys may be scanned in bounded steps by passing the last key of each
+        step as the start_key of the next.
+
+        This default sorts all of the keys; implementations with ordered
+        keys should override it.
+
+        Args:
+            start_key (str): the key to scan from, which is not returned.
+            limit (int): the most keys to return.
+
+        Returns:
+            list of str: the keys.
+        """
+        keys = sorted(self.keys())
+        start = 0 if start_key is None else bisect.bisect_right(
+            keys, start_key)
+        return keys[start:start + limit]
+
+
+class _PrefixedDatabase(Database):
+    """A sub database kept within its parent database, under keys prefixed
+    with its name.
+    """
+
+    def __init__(self, parent, name):
+        super(_PrefixedDatabase, self).__init__()
+        self.parent = parent
+        self.prefix = '{}:'.format(name)
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __contains__(self, key):
+        return self.prefix + key in self.parent
+
+    def get(self, key):
+        return self.parent.get(self.prefix + key)
+
+    def get_batch(self, keys):
+        return [(key[len(self.prefix):], value) for key, value in
+                self.parent.get_batch([self.prefix + key for key in keys])]
+
+    def set(self, key, value):
+        self.parent.set(self.prefix + key, value)
+
+    def set_batch(self, add_pairs, del_keys=None):
+        self.parent.set_batches([(self, add_pairs, del_keys)])
+
+    def delete(self, key):
+        self.parent.delete(self.prefix + key)
+
+    def sync(self):
+        self.parent.sync()
+
+    def read_session(self):
+        return self.parent.read_session()
+
+    def close(self):
+        # Closed with the parent
+        pass
+
+    def keys(self):
+        return [key[len(self.prefix):] for key in self.parent.keys()
+                if key.startswith(self.prefix)]
+
+    def keys_after(self, start_key, limit):
+        keys = []
+        for key in self.parent.keys_after(
+                self.prefix + (start_key or ''), limit):
+            if not key.startswith(self.prefix):
+                break
+            keys.append(key[len(self.prefix):])
+        return keys
+
+
+class _NullContext(object):
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *args):
+        return False
+
 
 class CachedDatabase(object):
     """
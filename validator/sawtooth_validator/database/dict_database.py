@@ -31,6 +31,9 @@ class DictDatabase(database.Database):
     def get(self, key):
         return self._data.get(key)
 
+    def get_batch(self, keys):
+        return [(key, self._data[key]) for key in keys if key in self._data]
+
     def __contains__(self, item):
         return item in self._data
 
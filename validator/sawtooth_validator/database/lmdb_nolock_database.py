@@ -13,11 +13,33 @@
 # limitations under the License.
 # ------------------------------------------------------------------------------
 
+from contextlib import contextmanager
+import logging
 import os
+from threading import Condition
+from threading import Lock
+from threading import Thread
+from threading import local
+
 import lmdb
 import cbor
 
 from sawtooth_validator.database import database
+from sawtooth_validator.database.database import DURABILITY_GROUP
+from sawtooth_validator.database.database import DURABILITY_MODES
+from sawtooth_validator.database.database import DURABILITY_WRITE
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_GROUP_COMMIT_INTERVAL = 0.01
+DEFAULT_GROUP_COMMIT_WRITES = 100
+
+# The size, in bytes, of the keys and values written by a bulk load between
+# commits of its write transaction.
+DEFAULT_BULK_COMMIT_SIZE = 64 * 1024 * 1024
+
+# The most sub databases which may be opened in one database.
+MAX_SUB_DATABASES = 16
 
 
 class LMDBNoLockDatabase(database.Database):
@@ -25,19 +47,50 @@ class LMDBNoLockDatabase(database.Database):
     sawtooth_validator.database.Database interface which uses LMDB for the
     underlying persistence.
 
+    Values are CBOR encoded before they are stored, unless the database is
+    opened in raw mode, in which case values must be bytes and are stored
+    and returned verbatim. Raw mode avoids a second encoding for callers,
+    such as the merkle trie, which already store encoded bytes.
+
+    Every write is committed on its own, and by default is also synced to
+    disk on its own. The durability mode may instead defer syncing, trading
+    the loss of the most recent writes in a crash for write throughput. For
+    loading large amounts of data, see bulk_load.
+
+    Sub databases are LMDB named databases in the same environment, so a
+    write may change several of them in one transaction.
+
     Attributes:
        _lmdb (lmdb.Environment): The underlying lmdb database.
     """
 
-    def __init__(self, filename, flag):
+    def __init__(self, filename, flag, raw=False,
+                 durability=DURABILITY_WRITE,
+                 group_commit_interval=DEFAULT_GROUP_COMMIT_INTERVAL,
+                 group_commit_writes=DEFAULT_GROUP_COMMIT_WRITES):
         """Constructor for the LMDBNoLockDatabase class.
 
         Args:
             filename (str): The filename of the database file.
             flag (str): a flag indicating the mode for opening the database.
                 Refer to the documentation for anydbm.open().
+            raw (bool): True if values are bytes to be stored without
+                encoding. A database must always be opened in the mode it
+                was written in; see sawtooth_validator.database.migrate to
+                convert an existing database to raw mode.
+            durability (str): one of DURABILITY_WRITE, DURABILITY_GROUP or
+                DURABILITY_BLOCK.
+            group_commit_interval (float): in group mode, the longest time
+                in seconds between a write and the sync which follows it.
+            group_commit_writes (int): in group mode, the number of writes
+                which cause a sync before the interval has passed.
         """
+        if durability not in DURABILITY_MODES:
+            raise ValueError(
+                "Unknown durability mode: {}".format(durability))
+
         super(LMDBNoLockDatabase, self).__init__()
+        self._raw = raw
 
         create = bool(flag == 'c')
 
@@ -46,20 +99,183 @@ class LMDBNoLockDatabase(database.Database):
                 os.remove(filename)
             create = True
 
+        # Commits are never synced by LMDB itself, as with map_async its
+        # syncs are only asynchronous flushes of the map. Each durability
+        # mode instead forces a synchronous flush at its own boundary.
         self._lmdb = lmdb.Environment(path=filename,
                                       map_size=1024**4,
                                       map_async=True,
                                       writemap=True,
+                                      sync=False,
                                       subdir=False,
                                       create=create,
-                                      lock=True)
+                                      lock=True,
+                                      max_dbs=MAX_SUB_DATABASES)
+        self._sub_databases = {}
+        self._sub_databases_lock = Lock()
+        self._bulk = None
+        self._sessions = local()
+
+        self._durability = durability
+        self._group_committer = None
+        if durability == DURABILITY_GROUP:
+            self._group_committer = _GroupCommitter(
+                self._lmdb, group_commit_interval, group_commit_writes)
+
+    @property
+    def raw(self):
+        return self._raw
+
+    @property
+    def durability(self):
+        return self._durability
+
+    @contextmanager
+    def bulk_load(self, commit_size=DEFAULT_BULK_COMMIT_SIZE, append=False):
+        """Returns a context in which all writes to the database share one
+        long write transaction, which is committed, without syncing, each
+        time `commit_size` bytes have been written, and committed and synced
+        once when the context exits. Reads within the context see the
+        writes made so far.
+
+        If the context exits with an exception, the writes since the last
+        periodic commit are discarded. Writes committed before then are
+        kept, but may not be synced to disk.
+
+        The database must only be used by the thread which started the bulk
+        load until it ends. A bulk load started within another is part of
+        the outer load.
+
+        Args:
+            commit_size (int): the size, in bytes, of the keys and values
+                written between commits.
+            append (bool): True if every key written is greater than all of
+                the keys already in the database, such as when loading
+                sorted keys into an empty database, which allows LMDB to
+                skip searching for each key's position.
+
+        Raises:
+            ValueError: in append mode, if a key is written which is not
+                greater than every key already in the database.
+        """
+        if self._bulk is not None:
+            yield
+            return
+
+        self._bulk = _BulkLoad(self._lmdb, commit_size, append)
+        try:
+            yield
+        except BaseException:
+            self._bulk.abort()
+            raise
+        else:
+            self._bulk.commit()
+        finally:
+            self._bulk = None
+
+        self.sync()
+
+    @contextmanager
+    def read_session(self):
+        """Returns a context in which all of the current thread's reads
+        share one read transaction, rather than each beginning its own.
+        Reads within the session see the database as it was when the
+        session began. A session started within another is part of the
+        outer session, and sessions have no effect during a bulk load.
+        """
+        if self._bulk is not None or \
+                getattr(self._sessions, 'txn', None) is not None:
+            yield
+            return
+
+        txn = self._lmdb.begin()
+        self._sessions.txn = _SharedTransaction(txn)
+        try:
+            yield
+        finally:
+            self._sessions.txn = None
+            txn.abort()
+
+    def sub_database(self, name):
+        """Returns the LMDB named database called `name`, creating it if it
+        does not exist. Its values are raw bytes, whatever the mode of this
+        database.
+
+        Args:
+            name (str): the name of the sub database.
+
+        Returns:
+            Database: the sub database.
+        """
+        with self._sub_databases_lock:
+            if name not in self._sub_databases:
+                self._sub_databases[name] = _LMDBSubDatabase(
+                    self, self._lmdb.open_db(name.encode()))
+            return self._sub_databases[name]
+
+    def set_batches(self, batches):
+        changes = []
+        for sub_database, adds, dels in batches:
+            if not isinstance(sub_database, _LMDBSubDatabase) or \
+                    sub_database.parent is not self:
+                raise ValueError(
+                    "{} is not a sub database of this database".format(
+                        sub_database))
+            changes.append((sub_database.db, adds, dels))
+        self._write(changes)
+
+    def _write(self, changes):
+        """Applies deletes and then adds to LMDB databases in a single
+        write transaction, or as part of the current bulk load.
+
+        Args:
+            changes (list of (object, list, list)): for each LMDB database,
+                the database, or None for the main database, the
+                (key, packed value) pairs to add and the keys to delete.
+        """
+        if self._bulk is not None:
+            for db, adds, dels in changes:
+                for k in dels or []:
+                    self._bulk.delete(k.encode(), db=db)
+                for k, packed in adds:
+                    self._bulk.put(k.encode(), packed, db=db)
+            return
+
+        with self._lmdb.begin(write=True, buffers=True) as txn:
+            for db, adds, dels in changes:
+                for k in dels or []:
+                    txn.delete(k.encode(), db=db)
+                for k, packed in adds:
+                    txn.put(k.encode(), packed, overwrite=True, db=db)
+        self._written()
+
+    def _begin(self):
+        """Begins a read transaction, or returns the transaction of the
+        current bulk load or read session.
+        """
+        if self._bulk is not None:
+            return self._bulk
+        session = getattr(self._sessions, 'txn', None)
+        if session is not None:
+            return session
+        return self._lmdb.begin()
+
+    def _encode(self, value):
+        if self._raw:
+            return value
+        return cbor.dumps(value)
+
+    def _decode(self, packed):
+        if self._raw:
+            return packed
+        return cbor.loads(packed)
 
     def __len__(self):
-        with self._lmdb.begin() as txn:
+        with self._begin() as txn:
             return txn.stat()['entries']
 
     def __contains__(self, key):
-        with self._lmdb.begin() as txn:
+        with self._begin() as txn:
             return bool(txn.get(key.encode()) is not None)
 
     def get(self, key):
@@ -68,18 +284,18 @@ class LMDBNoLockDatabase(database.Database):
         Args:
             key (str): The key to retrieve
         """
-        with self._lmdb.begin() as txn:
+        with self._begin() as txn:
             packed = txn.get(key.encode())
             if packed is not None:
-                return cbor.loads(packed)
+                return self._decode(packed)
 
     def get_batch(self, keys):
-        with self._lmdb.begin() as txn:
+        with self._begin() as txn:
             result = []
             for key in keys:
                 packed = txn.get(key.encode())
                 if packed is not None:
-                    result.append((key, cbor.loads(packed)))
+                    result.append((key, self._decode(packed)))
         return result
 
     def set(self, key, value):
@@ -89,20 +305,25 @@ class LMDBNoLockDatabase(database.Database):
             key (str): The key to set.
             value (str): The value to associate with the key.
         """
-        packed = cbor.dumps(value)
+        packed = self._encode(value)
+        if self._bulk is not None:
+            self._bulk.put(key.encode(), packed)
+            return
+
         with self._lmdb.begin(write=True, buffers=True) as txn:
             txn.put(key.encode(), packed, overwrite=True)
-        self.sync()
+        self._written()
 
     def set_batch(self, add_pairs, del_keys=None):
-        with self._lmdb.begin(write=True, buffers=True) as txn:
-            if del_keys is not None:
-                for k in del_keys:
-                    txn.delete(k)
-            for k, v in add_pairs:
-                packed = cbor.dumps(v)
-                txn.put(k.encode(), packed, overwrite=True)
-        self.sync()
+        self._write([(None,
+                      [(k, self._encode(v)) for k, v in add_pairs],
+                      del_keys)])
+
+    def _written(self):
+        if self._durability == DURABILITY_WRITE:
+            self.sync()
+        elif self._durability == DURABILITY_GROUP:
+            self._group_committer.written()
 
     def delete(self, key):
         """Removes a key:value from the database
@@ -110,21 +331,227 @@ class LMDBNoLockDatabase(database.Database):
         Args:
             key (str): The key to remove.
         """
+        if self._bulk is not None:
+            self._bulk.delete(key.encode())
+            return
+
         with self._lmdb.begin(write=True, buffers=True) as txn:
             txn.delete(key.encode())
+        self._written()
 
     def sync(self):
         """Ensures that pending writes are flushed to disk
         """
-        self._lmdb.sync()
+        self._lmdb.sync(True)
 
     def close(self):
-        """Closes the connection to the database
+        """Closes the connection to the database, first syncing any writes
+        which have not been synced.
         """
+        if self._group_committer is not None:
+            self._group_committer.stop()
+            self._group_committer = None
+        if self._durability != DURABILITY_WRITE:
+            self._lmdb.sync(True)
         self._lmdb.close()
 
     def keys(self):
         """Returns a list of keys in the database
         """
-        with self._lmdb.begin() as txn:
+        with self._begin() as txn:
             return [key.decode() for key, _ in txn.cursor()]
+
+    def keys_after(self, start_key, limit):
+        with self._begin() as txn:
+            return _keys_after(txn.cursor(), start_key, limit)
+
+
+class _LMDBSubDatabase(database.Database):
+    """A named database within the environment of an LMDBNoLockDatabase,
+    which holds raw values. Reads and writes share the bulk loads, read
+    sessions and durability of the parent database.
+    """
+    # pylint: disable=protected-access
+
+    def __init__(self, parent, db):
+        super(_LMDBSubDatabase, self).__init__()
+        self.parent = parent
+        self.db = db
+
+    def __len__(self):
+        with self.parent._begin() as txn:
+            return txn.stat(self.db)['entries']
+
+    def __contains__(self, key):
+        with self.parent._begin() as txn:
+            return txn.get(key.encode(), db=self.db) is not None
+
+    def get(self, key):
+        with self.parent._begin() as txn:
+            return txn.get(key.encode(), db=self.db)
+
+    def get_batch(self, keys):
+        with self.parent._begin() as txn:
+            result = []
+            for key in keys:
+                packed = txn.get(key.encode(), db=self.db)
+                if packed is not None:
+                    result.append((key, packed))
+        return result
+
+    def set(self, key, value):
+        self.set_batch([(key, value)])
+
+    def set_batch(self, add_pairs, del_keys=None):
+        self.parent._write([(self.db, add_pairs, del_keys)])
+
+    def delete(self, key):
+        self.set_batch([], [key])
+
+    def sync(self):
+        self.parent.sync()
+
+    def read_session(self):
+        return self.parent.read_session()
+
+    def close(self):
+        # Closed with the parent
+        pass
+
+    def keys(self):
+        with self.parent._begin() as txn:
+            return [key.decode() for key, _ in txn.cursor(db=self.db)]
+
+    def keys_after(self, start_key, limit):
+        with self.parent._begin() as txn:
+            return _keys_after(txn.cursor(db=self.db), start_key, limit)
+
+
+def _keys_after(cursor, start_key, limit):
+    """Returns up to limit of the keys after start_key from an LMDB cursor,
+    seeking to start_key rather than reading the keys before it.
+    """
+    if start_key is None:
+        found = cursor.first()
+    else:
+        found = cursor.set_range(start_key.encode())
+        if found and bytes(cursor.key()) == start_key.encode():
+            found = cursor.next()
+
+    keys = []
+    while found and len(keys) < limit:
+        keys.append(bytes(cursor.key()).decode())
+        found = cursor.next()
+    return keys
+
+
+class _SharedTransaction(object):
+    """A read transaction which may be used in many with statements, and
+    is not ended by any of them.
+    """
+
+    def __init__(self, txn):
+        self._txn = txn
+
+    def __enter__(self):
+        return self._txn
+
+    def __exit__(self, *args):
+        return False
+
+
+class _BulkLoad(object):
+    """The write transaction of a bulk load. It may be used in a with
+    statement like a read transaction, in which case it is neither committed
+    nor aborted when the statement ends.
+    """
+
+    def __init__(self, env, commit_size, append):
+        self._env = env
+        self._commit_size = commit_size
+        self._append = append
+        self._txn = env.begin(write=True)
+        self._pending = 0
+
+    def __enter__(self):
+        return self._txn
+
+    def __exit__(self, *args):
+        return False
+
+    def put(self, key, packed, db=None):
+        if not self._txn.put(key, packed, overwrite=True,
+                             append=self._append, db=db):
+            raise ValueError(
+                "Key {} is not greater than the keys already "
+                "loaded".format(key.decode()))
+        self._written(len(key) + len(packed))
+
+    def delete(self, key, db=None):
+        self._txn.delete(key, db=db)
+        self._written(len(key))
+
+    def _written(self, size):
+        self._pending += size
+        if self._pending >= self._commit_size:
+            self._txn.commit()
+            self._txn = self._env.begin(write=True)
+            self._pending = 0
+
+    def commit(self):
+        self._txn.commit()
+
+    def abort(self):
+        self._txn.abort()
+
+
+class _GroupCommitter(object):
+    """Syncs an environment from a background thread, once a number of
+    writes have been committed, or once an interval has passed since the
+    first write which has not been synced, so that the cost of a sync is
+    shared by many writes.
+    """
+
+    def __init__(self, env, interval, max_writes):
+        self._env = env
+        self._interval = interval
+        self._max_writes = max_writes
+
+        self._condition = Condition()
+        self._pending = 0
+        self._stopped = False
+
+        self._thread = Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def written(self):
+        with self._condition:
+            self._pending += 1
+            if self._pending == 1 or self._pending >= self._max_writes:
+                self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._stopped or self._pending > 0)
+                if self._stopped:
+                    return
+                self._condition.wait_for(
+                    lambda: self._stopped or
+                    self._pending >= self._max_writes,
+                    timeout=self._interval)
+                self._pending = 0
+
+            try:
+                self._env.sync(True)
+            # pylint: disable=broad-except
+            except Exception as exc:
+                LOGGER.exception(exc)
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join()
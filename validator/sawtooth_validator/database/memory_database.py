@@ -0,0 +1,156 @@
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+import bisect
+from threading import Lock
+
+import cbor
+
+from sawtooth_validator.database import database
+
+
+class DatabaseFullError(Exception):
+    pass
+
+
+class MemoryDatabase(database.Database):
+    """MemoryDatabase is a thread-safe implementation of the
+    sawtooth_validator.database.Database interface which holds all of its
+    data in memory, for benchmarks and ephemeral networks. Nothing is
+    persisted.
+
+    Like LMDBNoLockDatabase, values are CBOR encoded unless the database is
+    in raw mode, so that values read are never shared with the writer, and
+    so that the size of the data is known exactly. The keys are also kept
+    in order, so that they may be scanned in bounded steps with keys_after.
+    """
+
+    def __init__(self, raw=False, max_size=None):
+        """
+        Args:
+            raw (bool): True if values are bytes to be stored without
+                encoding.
+            max_size (int, optional): the maximum total size, in bytes, of
+                the keys and values held.
+        """
+        super(MemoryDatabase, self).__init__()
+        self._raw = raw
+        self._max_size = max_size
+        self._lock = Lock()
+        self._data = {}
+        self._sorted_keys = []
+        self._size = 0
+
+    @property
+    def size(self):
+        """The total size, in bytes, of the keys and values held.
+        """
+        return self._size
+
+    def _encode(self, value):
+        if self._raw:
+            return bytes(value)
+        return cbor.dumps(value)
+
+    def _decode(self, packed):
+        if self._raw:
+            return packed
+        return cbor.loads(packed)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def get(self, key):
+        with self._lock:
+            packed = self._data.get(key)
+        if packed is not None:
+            return self._decode(packed)
+
+    def get_batch(self, keys):
+        with self._lock:
+            found = [(key, self._data.get(key)) for key in keys]
+        return [(key, self._decode(packed)) for key, packed in found
+                if packed is not None]
+
+    def set(self, key, value):
+        self.set_batch([(key, value)])
+
+    def set_batch(self, add_pairs, del_keys=None):
+        """Applies the deletes and then the adds as a single change, which
+        is undone if it would leave the database over its size limit.
+
+        Raises:
+            DatabaseFullError: if the database would exceed its size limit.
+        """
+        adds = [(key, self._encode(value)) for key, value in add_pairs]
+
+        with self._lock:
+            undo = []
+            for key in del_keys or []:
+                undo.append((key, self._replace(key, None)))
+            for key, packed in adds:
+                undo.append((key, self._replace(key, packed)))
+
+            if self._max_size is not None and self._size > self._max_size:
+                size = self._size
+                for key, previous in reversed(undo):
+                    self._replace(key, previous)
+                raise DatabaseFullError(
+                    "Writing would grow the database to {} bytes, over the "
+                    "limit of {} bytes".format(size, self._max_size))
+
+    def _replace(self, key, packed):
+        """Sets or, if packed is None, removes the value at a key, and
+        returns the previous value, or None.
+        """
+        key_size = len(key.encode())
+        if packed is None:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                del self._sorted_keys[
+                    bisect.bisect_left(self._sorted_keys, key)]
+        else:
+            previous = self._data.get(key)
+            if previous is None:
+                bisect.insort(self._sorted_keys, key)
+            self._data[key] = packed
+            self._size += key_size + len(packed)
+        if previous is not None:
+            self._size -= key_size + len(previous)
+        return previous
+
+    def delete(self, key):
+        self.set_batch([], [key])
+
+    def sync(self):
+        pass
+
+    def close(self):
+        pass
+
+    def keys(self):
+        with self._lock:
+            return list(self._sorted_keys)
+
+    def keys_after(self, start_key, limit):
+        with self._lock:
+            start = 0 if start_key is None else bisect.bisect_right(
+                self._sorted_keys, start_key)
+            return self._sorted_keys[start:start + limit]
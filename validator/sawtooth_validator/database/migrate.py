@@ -0,0 +1,141 @@
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+"""Converts a merkle state database written by LMDBNoLockDatabase, in which
+every node is CBOR encoded a second time by the database, to raw mode, in
+which node bytes are stored verbatim.
+
+Usage:
+    python3 -m sawtooth_validator.database.migrate SOURCE DESTINATION
+"""
+
+import argparse
+import logging
+import sys
+
+import cbor
+import lmdb
+
+from sawtooth_validator.database.lmdb_nolock_database import \
+    LMDBNoLockDatabase
+
+
+LOGGER = logging.getLogger(__name__)
+
+# The number of entries buffered between writes to the destination.
+DEFAULT_BATCH_SIZE = 10000
+
+
+class MigrationError(Exception):
+    pass
+
+
+def migrate_to_raw(source_filename, destination_filename,
+                   batch_size=DEFAULT_BATCH_SIZE):
+    """Copies every entry of a CBOR mode database into a new raw mode
+    database. The source database is not modified.
+
+    Args:
+        source_filename (str): the CBOR mode database to read.
+        destination_filename (str): the raw mode database to create; any
+            existing file is replaced.
+        batch_size (int): the number of entries buffered per write.
+
+    Returns:
+        int: the number of entries copied.
+
+    Raises:
+        MigrationError: if a source value is not CBOR encoded bytes, such
+            as when the source database is already in raw mode.
+    """
+    source = lmdb.Environment(path=source_filename,
+                              subdir=False,
+                              create=False,
+                              readonly=True,
+                              lock=False)
+    destination = LMDBNoLockDatabase(destination_filename, 'n', raw=True)
+
+    count = 0
+    try:
+        # The source is read in key order into an empty database, so the
+        # entries can be appended.
+        with source.begin() as txn, destination.bulk_load(append=True):
+            batch = []
+            for key, packed in txn.cursor():
+                batch.append((key.decode(), _unwrap(key, packed)))
+                if len(batch) >= batch_size:
+                    destination.set_batch(batch)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                destination.set_batch(batch)
+                count += len(batch)
+    finally:
+        source.close()
+        destination.close()
+
+    return count
+
+
+def _unwrap(key, packed):
+    try:
+        value = cbor.loads(packed)
+    except Exception:  # pylint: disable=broad-except
+        value = None
+
+    if not isinstance(value, bytes):
+        raise MigrationError(
+            "Value at {} is not CBOR encoded bytes; is the source database "
+            "already in raw mode?".format(key.decode()))
+
+    return value
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+        description='Converts a merkle state database to raw mode.')
+
+    parser.add_argument('source',
+                        help='the database file to convert',
+                        type=str)
+    parser.add_argument('destination',
+                        help='the raw mode database file to create',
+                        type=str)
+    parser.add_argument('--batch-size',
+                        help='entries to buffer per write',
+                        default=DEFAULT_BATCH_SIZE,
+                        type=int)
+
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+    opts = parse_args(args)
+
+    try:
+        count = migrate_to_raw(opts.source,
+                               opts.destination,
+                               batch_size=opts.batch_size)
+    except (MigrationError, lmdb.Error) as e:
+        print("Error: {}".format(e), file=sys.stderr)
+        sys.exit(1)
+
+    print("Copied {} entries to {}".format(count, opts.destination))
+
+
+if __name__ == '__main__':
+    main()
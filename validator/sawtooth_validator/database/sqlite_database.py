@@ -0,0 +1,196 @@
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+import os
+import sqlite3
+from threading import RLock
+
+import cbor
+
+from sawtooth_validator.database import database
+from sawtooth_validator.database.database import DURABILITY_MODES
+from sawtooth_validator.database.database import DURABILITY_WRITE
+
+# The largest number of keys read by a single query; SQLite limits the
+# number of parameters a statement may have.
+_MAX_QUERY_KEYS = 500
+
+
+class SQLiteDatabase(database.Database):
+    """SQLiteDatabase is a thread-safe implementation of the
+    sawtooth_validator.database.Database interface which uses SQLite, in
+    write-ahead log mode, for the underlying persistence. It needs far less
+    address space than LMDB, which suits constrained hosts.
+
+    Values are CBOR encoded before they are stored, unless the database is
+    opened in raw mode, as for LMDBNoLockDatabase.
+
+    In the write durability mode, every commit is synced. In the group and
+    block modes, commits are only synced when the write-ahead log is
+    checkpointed, either by SQLite as the log grows, or by sync.
+
+    Attributes:
+       _conn (sqlite3.Connection): The connection to the database, shared
+           by all threads under a lock.
+    """
+
+    def __init__(self, filename, flag, raw=False,
+                 durability=DURABILITY_WRITE):
+        """Constructor for the SQLiteDatabase class.
+
+        Args:
+            filename (str): The filename of the database file.
+            flag (str): a flag indicating the mode for opening the database.
+                Refer to the documentation for anydbm.open().
+            raw (bool): True if values are bytes to be stored without
+                encoding.
+            durability (str): one of the durability modes in
+                sawtooth_validator.database.database.
+        """
+        super(SQLiteDatabase, self).__init__()
+        if durability not in DURABILITY_MODES:
+            raise ValueError(
+                "Unknown durability mode: {}".format(durability))
+
+        self._raw = raw
+        self._lock = RLock()
+
+        if flag == 'n':
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.isfile(filename + suffix):
+                    os.remove(filename + suffix)
+        elif flag != 'c' and not os.path.isfile(filename):
+            raise IOError("Database file {} does not exist".format(filename))
+
+        self._conn = sqlite3.connect(
+            filename, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'PRAGMA synchronous={}'.format(
+                'FULL' if durability == DURABILITY_WRITE else 'NORMAL'))
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS kv '
+            '(key TEXT PRIMARY KEY, value BLOB NOT NULL) WITHOUT ROWID')
+
+    def _encode(self, value):
+        if self._raw:
+            return bytes(value)
+        return cbor.dumps(value)
+
+    def _decode(self, packed):
+        if self._raw:
+            return packed
+        return cbor.loads(packed)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM kv').fetchone()[0]
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._conn.execute(
+                'SELECT 1 FROM kv WHERE key = ?', (key,)).fetchone() \
+                is not None
+
+    def get(self, key):
+        """Retrieves a value associated with a key from the database
+
+        Args:
+            key (str): The key to retrieve
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value FROM kv WHERE key = ?', (key,)).fetchone()
+        if row is not None:
+            return self._decode(row[0])
+
+    def get_batch(self, keys):
+        keys = list(keys)
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), _MAX_QUERY_KEYS):
+                chunk = keys[start:start + _MAX_QUERY_KEYS]
+                found.update(self._conn.execute(
+                    'SELECT key, value FROM kv WHERE key IN ({})'.format(
+                        ','.join('?' * len(chunk))),
+                    chunk))
+
+        return [(key, self._decode(found[key]))
+                for key in keys if key in found]
+
+    def set(self, key, value):
+        """Sets a value associated with a key in the database
+
+        Args:
+            key (str): The key to set.
+            value (str): The value to associate with the key.
+        """
+        self.set_batch([(key, value)])
+
+    def set_batch(self, add_pairs, del_keys=None):
+        adds = [(key, self._encode(value)) for key, value in add_pairs]
+
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                if del_keys is not None:
+                    self._conn.executemany(
+                        'DELETE FROM kv WHERE key = ?',
+                        ((key,) for key in del_keys))
+                self._conn.executemany(
+                    'INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)',
+                    adds)
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+
+    def delete(self, key):
+        """Removes a key:value from the database
+
+        Args:
+            key (str): The key to remove.
+        """
+        self.set_batch([], [key])
+
+    def sync(self):
+        """Ensures that pending writes are flushed to disk
+        """
+        with self._lock:
+            self._conn.execute('PRAGMA wal_checkpoint(PASSIVE)')
+
+    def close(self):
+        """Closes the connection to the database
+        """
+        with self._lock:
+            self._conn.close()
+
+    def keys(self):
+        """Returns a list of keys in the database
+        """
+        with self._lock:
+            return [row[0] for row in
+                    self._conn.execute('SELECT key FROM kv ORDER BY key')]
+
+    def keys_after(self, start_key, limit):
+        with self._lock:
+            if start_key is None:
+                rows = self._conn.execute(
+                    'SELECT key FROM kv ORDER BY key LIMIT ?', (limit,))
+            else:
+                rows = self._conn.execute(
+                    'SELECT key FROM kv WHERE key > ? ORDER BY key LIMIT ?',
+                    (start_key, limit))
+            return [row[0] for row in rows]
@@ -13,7 +13,8 @@
 # limitations under the License.
 # ------------------------------------------------------------------------------
 
-import hashlib
+from collections import OrderedDict
+import itertools
 import logging
 import time
 
@@ -27,6 +28,22 @@ from sawtooth_validator.state.merkle import MerkleDatabase
 
 LOGGER = logging.getLogger(__name__)
 
+# The default number of threads reading the state of new contexts from the
+# merkle tree.
+DEFAULT_READER_COUNT = 4
+
+# The number of state roots whose MerkleDatabase is kept for the readers to
+# share.
+_TRIE_CACHE_SIZE = 16
+
+# The default number of bytes of values read from the merkle tree which are
+# kept for new contexts based on the same state root.
+DEFAULT_READ_CACHE_SIZE = 16 * 1024 * 1024
+
+# The source of context ids, which are unique within the process. Calling
+# next on it is atomic, so it needs no lock.
+_CONTEXT_IDS = itertools.count(1)
+
 
 class AuthorizationException(Exception):
     def __init__(self, address):
@@ -66,10 +83,10 @@ class StateContext(object):
         self._state = {}
         self.base_context_ids = base_context_ids
 
-        self._id = hashlib.sha256((str(state_hash) + ":" +
-                                  str(read_list + write_list) + ":" +
-                                  time.time().hex()).encode()
-                                  ).hexdigest()
+        # Shared by the _ContextFutures of every address in the context
+        self._condition = Condition()
+
+        self._id = '{:x}'.format(next(_CONTEXT_IDS))
 
     @property
     def session_id(self):
@@ -98,9 +115,11 @@ class StateContext(object):
             raise ValueError("reads %, others %s must "
                              "be disjoint", reads, others)
         for add in reads:
-            self._state[add] = _ContextFuture(address=add, wait_for_tree=True)
+            self._state[add] = _ContextFuture(
+                address=add, condition=self._condition, wait_for_tree=True)
         for add in others:
-            self._state[add] = _ContextFuture(address=add)
+            self._state[add] = _ContextFuture(
+                address=add, condition=self._condition)
 
     def set_futures(self, address_value_dict, from_tree=False):
         """
@@ -164,30 +183,78 @@ class StateContext(object):
 
 class ContextManager(object):
 
-    def __init__(self, database):
+    def __init__(self, database, hash_executor=None,
+                 reader_count=DEFAULT_READER_COUNT,
+                 read_cache_size=DEFAULT_READ_CACHE_SIZE):
         """
 
         Args:
             database database.Database subclass: the subclass/implementation of
                                                 the Database
+            hash_executor (:obj:`concurrent.futures.Executor`, optional): an
+                executor on which to rehash changed state subtrees in
+                parallel when squashing contexts.
+            reader_count (int): the number of threads reading the state of
+                new contexts from the merkle tree.
+            read_cache_size (int): the most bytes of values read from the
+                merkle tree to keep for new contexts based on the same
+                state root; 0 disables the cache.
         """
         self._database = database
+        self._hash_executor = hash_executor
         self._first_merkle_root = None
         self._contexts = _ThreadsafeContexts()
 
         self._address_queue = Queue()
+        self._pending_reads = _PendingReads(_ReadCache(read_cache_size))
 
-        self._inflated_addresses = Queue()
+        tries = _TrieCache(database)
+        self._context_readers = []
+        for _ in range(reader_count):
+            reader = _ContextReader(tries, self._address_queue,
+                                    self._pending_reads, self._contexts)
+            reader.setDaemon(True)
+            reader.start()
+            self._context_readers.append(reader)
 
-        self._context_reader = _ContextReader(database, self._address_queue,
-                                              self._inflated_addresses)
-        self._context_reader.setDaemon(True)
-        self._context_reader.start()
+    @property
+    def prefetch_queue_depth(self):
+        """The number of reads of state for new contexts which are waiting
+        for a reader.
+        """
+        return self._address_queue.qsize()
 
-        self._context_writer = _ContextWriter(self._inflated_addresses,
-                                              self._contexts)
-        self._context_writer.setDaemon(True)
-        self._context_writer.start()
+    @property
+    def prefetch_count(self):
+        """The number of reads of state for new contexts which have been
+        made.
+        """
+        return self._pending_reads.read_count
+
+    @property
+    def coalesced_prefetch_count(self):
+        """The number of addresses whose read for a new context was shared
+        with a read already requested for another context.
+        """
+        return self._pending_reads.coalesced_count
+
+    @property
+    def cached_prefetch_count(self):
+        """The number of addresses whose value for a new context was found
+        in the values already read for other contexts.
+        """
+        return self._pending_reads.cached_count
+
+    @property
+    def mean_prefetch_latency(self):
+        """The mean time, in seconds, from a read of state being requested
+        for a new context to its values being set in the context.
+        """
+        return self._pending_reads.mean_latency
+
+    @property
+    def max_prefetch_latency(self):
+        return self._pending_reads.max_latency
 
     def get_first_root(self):
         if self._first_merkle_root is not None:
@@ -217,6 +284,7 @@ class ContextManager(object):
             base_context_ids=base_contexts)
 
         self._contexts[context.session_id] = context
+        self._pending_reads.retain(state_hash)
         contexts_asked_not_found = [cid for cid in base_contexts
                                     if cid not in self._contexts]
         if len(contexts_asked_not_found) > 0:
@@ -245,8 +313,13 @@ class ContextManager(object):
         context.set_futures(prior_state_results)
 
         if len(reads) > 0:
-            self._address_queue.put_nowait(
-                (context.session_id, state_hash, list(reads)))
+            cached, addresses = self._pending_reads.add(
+                context.session_id, state_hash, reads)
+            if cached:
+                context.set_futures(cached, from_tree=True)
+            if addresses:
+                self._address_queue.put_nowait(
+                    (state_hash, addresses, time.time()))
         return context.session_id
 
     def commit_context(self, context_id_list, virtual):
@@ -294,7 +367,8 @@ class ContextManager(object):
 
             updates.update(effective_updates)
 
-        state_hash = tree.update(updates, virtual=False)
+        state_hash = tree.update(updates, virtual=False,
+                                 executor=self._hash_executor)
         # clean up all contexts that are involved in being squashed.
         base_c_ids = []
         for c_id in context_id_list:
@@ -316,7 +390,9 @@ class ContextManager(object):
         """
         for c_id in context_id_list:
             if c_id in self._contexts:
+                state_hash = self._contexts[c_id].merkle_root
                 del self._contexts[c_id]
+                self._pending_reads.release(state_hash)
 
     def get(self, context_id, address_list):
         """Get the values associated with list of addresses, for a specific
@@ -387,7 +463,8 @@ class ContextManager(object):
 
                 updates.update(effective_updates)
 
-            state_hash = tree.update(updates, virtual=False)
+            state_hash = tree.update(updates, virtual=False,
+                                     executor=self._hash_executor)
             # clean up all contexts that are involved in being squashed.
             base_c_ids = []
             for c_id in context_ids:
@@ -399,75 +476,254 @@ class ContextManager(object):
         return _squash
 
     def stop(self):
-        self._context_writer.join(1)
-        self._context_reader.join(1)
+        for _ in self._context_readers:
+            self._address_queue.put_nowait(None)
+        for reader in self._context_readers:
+            reader.join(1)
 
 
 class _ContextReader(Thread):
-    """
+    """Reads the state of new contexts from the merkle tree, and sets the
+    values in every context waiting on them. Several readers share one
+    queue of reads.
+
     Attributes:
-        _in_condition (threading.Condition): threading object for notification
+        _tries (_TrieCache): the MerkleDatabases shared by the readers.
         _addresses (queue.Queue): each item is a tuple
-                                  (context_id, state_hash, address_list)
-        _inflated_addresses (queue.Queue): each item is a tuple
-                                          (context_id, [(address, value), ...
+                                  (state_hash, address_list, request_time),
+                                  or None to stop the reader.
+        _pending_reads (_PendingReads): the contexts waiting on each read.
+        _contexts (_ThreadsafeContexts): the contexts to set values in.
     """
-    def __init__(self, database, address_queue, inflated_addresses):
+    def __init__(self, tries, address_queue, pending_reads, contexts):
         super(_ContextReader, self).__init__()
-        self._database = database
+        self._tries = tries
         self._addresses = address_queue
-        self._inflated_addresses = inflated_addresses
+        self._pending_reads = pending_reads
+        self._contexts = contexts
 
     def run(self):
         while True:
-            context_state_addresslist_tuple = self._addresses.get(block=True)
-            c_id, state_hash, address_list = context_state_addresslist_tuple
-            tree = MerkleDatabase(self._database, state_hash)
-            return_values = []
-            for address in address_list:
-                value = None
+            request = self._addresses.get(block=True)
+            if request is None:
+                return
+            state_hash, address_list, request_time = request
+
+            try:
+                tree = self._tries.get(state_hash)
+                with tree.read_session():
+                    return_values = tree.get_multi(address_list)
+            except Exception:  # pylint: disable=broad-except
+                LOGGER.exception(
+                    'Failed to read state for contexts from root %s',
+                    state_hash)
+                self._pending_reads.remove(state_hash, address_list)
+                continue
+
+            values_by_context = {}
+            for address, value, c_ids in self._pending_reads.resolve(
+                    state_hash, return_values, request_time):
+                for c_id in c_ids:
+                    values_by_context.setdefault(c_id, {})[address] = value
+
+            for c_id, inflated_value_map in values_by_context.items():
+                if c_id in self._contexts:
+                    self._contexts[c_id].set_futures(inflated_value_map,
+                                                     from_tree=True)
+
+
+class _PendingReads(object):
+    """The reads of state requested for new contexts which have not yet been
+    made, keyed by (state_hash, address), so a read requested by several
+    contexts is only made once, and the values of those which have been
+    made. Also keeps the metrics of the reads.
+    """
+    def __init__(self, cache):
+        self._lock = Lock()
+        self._waiting = {}
+        self._cache = cache
+
+        self.read_count = 0
+        self.coalesced_count = 0
+        self.cached_count = 0
+        self.max_latency = 0.0
+        self._total_latency = 0.0
+
+    def retain(self, state_hash):
+        """Notes that a context is based on a state root, so the values
+        read from it are kept.
+        """
+        with self._lock:
+            self._cache.retain(state_hash)
+
+    def release(self, state_hash):
+        """Notes that a context based on a state root has been deleted,
+        dropping the values read from it if no other context is based on it.
+        """
+        with self._lock:
+            self._cache.release(state_hash)
+
+    def add(self, c_id, state_hash, addresses):
+        """Adds a context as waiting on reads of addresses.
+
+        Returns:
+            tuple: a dict of the values of addresses which have already
+                been read, and a list of those addresses which are not
+                already going to be read
+        """
+        cached = {}
+        to_read = []
+        with self._lock:
+            for address in addresses:
+                key = (state_hash, address)
                 try:
-                    value = tree.get(address)
+                    cached[address] = self._cache.get(state_hash, address)
+                    self.cached_count += 1
+                    continue
                 except KeyError:
                     pass
-                return_values.append((address, value))
-            self._inflated_addresses.put((c_id, return_values))
 
+                if key in self._waiting:
+                    self._waiting[key].append(c_id)
+                    self.coalesced_count += 1
+                else:
+                    self._waiting[key] = [c_id]
+                    to_read.append(address)
+        return cached, to_read
+
+    def resolve(self, state_hash, address_values, request_time):
+        """Removes the reads which have been made, returning a list of
+        (address, value, context ids) tuples.
+        """
+        latency = time.time() - request_time
+        resolved = []
+        with self._lock:
+            for address, value in address_values:
+                c_ids = self._waiting.pop((state_hash, address), [])
+                resolved.append((address, value, c_ids))
+                self._cache.put(state_hash, address, value)
 
-class _ContextWriter(Thread):
-    """Reads off of a shared queue from _ContextReader and writes values
-    to the contexts shared with the ContextManager.
+            self.read_count += len(address_values)
+            self._total_latency += latency * len(address_values)
+            self.max_latency = max(self.max_latency, latency)
+        return resolved
+
+    def remove(self, state_hash, addresses):
+        with self._lock:
+            for address in addresses:
+                self._waiting.pop((state_hash, address), None)
 
+    @property
+    def mean_latency(self):
+        with self._lock:
+            if self.read_count == 0:
+                return 0.0
+            return self._total_latency / self.read_count
+
+
+class _ReadCache(object):
+    """The values read from the merkle tree for new contexts, keyed by state
+    root and address. The state at a root never changes, so the values are
+    never stale; the least recently used are evicted once they come to more
+    than max_size bytes, and those of a root are dropped once no context is
+    based on it. It is not threadsafe, and is used under the lock of
+    _PendingReads.
     """
+    def __init__(self, max_size):
+        self._max_size = max_size
+        self._size = 0
+        self._entries = OrderedDict()
+        self._addresses_by_root = {}
+        self._references = {}
+
+    def retain(self, state_hash):
+        self._references[state_hash] = \
+            self._references.get(state_hash, 0) + 1
+
+    def release(self, state_hash):
+        references = self._references.get(state_hash, 0) - 1
+        if references > 0:
+            self._references[state_hash] = references
+            return
+
+        self._references.pop(state_hash, None)
+        for address in self._addresses_by_root.pop(state_hash, ()):
+            value = self._entries.pop((state_hash, address))
+            self._size -= _entry_size(address, value)
+
+    def get(self, state_hash, address):
+        """Returns the value read at an address from a state root, which is
+        None if there is no value there.
 
-    def __init__(self, inflated_addresses, contexts):
-        """
-        Args:
-            inflated_addresses (queue.Queue): Contains the context id of the
-                context to write to, and the address-value pairs.
-            contexts (_ThreadsafeContexts): The datastructures to write the
-                address-value pairs to.
+        Raises:
+            KeyError if the address has not been read from the root.
         """
-        super(_ContextWriter, self).__init__()
-        self._inflated_addresses = inflated_addresses
-        self._contexts = contexts
+        key = (state_hash, address)
+        value = self._entries[key]
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, state_hash, address, value):
+        key = (state_hash, address)
+        size = _entry_size(address, value)
+        if state_hash not in self._references or key in self._entries \
+                or size > self._max_size:
+            return
+
+        self._entries[key] = value
+        self._addresses_by_root.setdefault(state_hash, set()).add(address)
+        self._size += size
+        while self._size > self._max_size:
+            (root, evicted), evicted_value = self._entries.popitem(last=False)
+            addresses = self._addresses_by_root[root]
+            addresses.discard(evicted)
+            if not addresses:
+                del self._addresses_by_root[root]
+            self._size -= _entry_size(evicted, evicted_value)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _entry_size(address, value):
+    return len(address) + (len(value) if value is not None else 0)
+
+
+class _TrieCache(object):
+    """The MerkleDatabases of the most recently read state roots, which are
+    shared by the readers. Their decoded nodes are already shared through
+    the database's node cache.
+    """
+    def __init__(self, database, size=_TRIE_CACHE_SIZE):
+        self._database = database
+        self._size = size
+        self._lock = Lock()
+        self._tries = OrderedDict()
 
-    def run(self):
-        while True:
-            c_id, inflated_address_list = self._inflated_addresses.get(
-                block=True)
-            inflated_value_map = {k: v for k, v in inflated_address_list}
-            if c_id in self._contexts:
-                self._contexts[c_id].set_futures(inflated_value_map,
-                                                 from_tree=True)
+    def get(self, state_hash):
+        with self._lock:
+            tree = self._tries.pop(state_hash, None)
+            if tree is None:
+                tree = MerkleDatabase(self._database, state_hash)
+                if len(self._tries) >= self._size:
+                    self._tries.popitem(last=False)
+            self._tries[state_hash] = tree
+            return tree
 
 
 class _ContextFuture(object):
-    def __init__(self, address, wait_for_tree=False):
+    """The value of an address in a StateContext. The futures of a context
+    share its condition, as there is one for every address the transaction
+    declares.
+    """
+    __slots__ = ['address', '_result', '_result_is_set', '_condition',
+                 '_wait_for_tree', '_tree_has_set']
+
+    def __init__(self, address, condition, wait_for_tree=False):
         self.address = address
         self._result = None
         self._result_is_set = False
-        self._condition = Condition()
+        self._condition = condition
         self._wait_for_tree = wait_for_tree
         self._tree_has_set = False
 
@@ -475,6 +731,10 @@ class _ContextFuture(object):
         return self._result_is_set
 
     def result(self):
+        # The result is set before _result_is_set, so once that is True the
+        # result may be read without the condition.
+        if self._result_is_set:
+            return self._result
         with self._condition:
             self._condition.wait_for(lambda: self._result_is_set)
             return self._result
@@ -24,12 +24,22 @@ from sawtooth_validator.protobuf import processor_pb2
 from sawtooth_validator.protobuf import transaction_pb2
 from sawtooth_validator.protobuf import validator_pb2
 
+from sawtooth_validator.execution.scheduler_parallel import \
+    ParallelScheduler
 from sawtooth_validator.execution.scheduler_serial import SerialScheduler
 from sawtooth_validator.execution import processor_iterator
 
 
 LOGGER = logging.getLogger(__name__)
 
+# The schedulers which may be used to order transactions. The serial
+# scheduler runs one transaction at a time, while the parallel scheduler
+# runs the transactions of batches with no dependencies on each other at
+# the same time.
+SCHEDULER_SERIAL = 'serial'
+SCHEDULER_PARALLEL = 'parallel'
+SCHEDULER_TYPES = (SCHEDULER_SERIAL, SCHEDULER_PARALLEL)
+
 
 class TransactionExecutorThread(threading.Thread):
     """A thread of execution controlled by the TransactionExecutor.
@@ -195,7 +205,8 @@ class TransactionExecutorThread(threading.Thread):
 
 
 class TransactionExecutor(object):
-    def __init__(self, service, context_manager, config_view_factory):
+    def __init__(self, service, context_manager, config_view_factory,
+                 scheduler_type=SCHEDULER_SERIAL):
         """
 
         Args:
@@ -203,6 +214,8 @@ class TransactionExecutor(object):
             context_manager (ContextManager): Cache of state for tps
             config_view_factory (ConfigViewFactory): Read-only view of config
                 state.
+            scheduler_type (str): The scheduler to create, one of
+                SCHEDULER_TYPES.
         Attributes:
             processors (ProcessorIteratorCollection): All of the registered
                 transaction processors and a way to find the next one to send
@@ -217,10 +230,16 @@ class TransactionExecutor(object):
         self.processors = processor_iterator.ProcessorIteratorCollection(
             processor_iterator.RoundRobinProcessorIterator)
         self._config_view_factory = config_view_factory
+        self._scheduler_type = scheduler_type
         self._waiting_threadpool = ThreadPoolExecutor(max_workers=3)
         self._waiters_by_type = _WaitersByType()
 
     def create_scheduler(self, squash_handler, first_state_root):
+        if self._scheduler_type == SCHEDULER_PARALLEL:
+            return ParallelScheduler(
+                squash_handler,
+                first_state_root,
+                delete_handler=self._context_manager.delete_context)
         return SerialScheduler(squash_handler, first_state_root)
 
     def execute(self, scheduler):
@@ -15,6 +15,14 @@
 
 from ast import literal_eval
 from collections import deque
+from threading import Condition
+
+from sawtooth_validator.execution.scheduler import BatchExecutionResult
+from sawtooth_validator.execution.scheduler import TxnInformation
+from sawtooth_validator.execution.scheduler import Scheduler
+from sawtooth_validator.execution.scheduler import SchedulerIterator
+from sawtooth_validator.execution.scheduler_exceptions import SchedulerError
+from sawtooth_validator.protobuf.transaction_pb2 import TransactionHeader
 
 
 class PredecessorTreeNode:
@@ -236,3 +244,226 @@ class PredecessorTree:
             to_process.extendleft(node.children.values())
 
         return predecessors
+
+
+class ParallelScheduler(Scheduler):
+    """Parallel scheduler which returns the transactions of independent
+    batches at the same time.
+
+    The inputs and outputs of each batch's transactions are added to a
+    PredecessorTree, from which the earlier batches it depends on are
+    found. A batch's transactions are returned once every batch up to the
+    last it depends on has been applied, and are all run against the state
+    root at that time. The transactions within a batch are returned one at
+    a time, in order, each with the contexts of the batch's earlier
+    transactions as its base contexts.
+
+    Batches are squashed into the state in the order they were added, so
+    the state hash of each batch is the same as the SerialScheduler would
+    give it. If a transaction fails, the rest of its batch is not returned
+    and the batch's changes are discarded.
+    """
+    def __init__(self, squash_handler, first_state_hash,
+                 delete_handler=None):
+        """
+        Args:
+            squash_handler (function): applies the changes of a list of
+                context ids to a state root, returning the new state root.
+            first_state_hash (str): the state root to apply the first batch
+                to.
+            delete_handler (function, optional): deletes a list of context
+                ids, to discard the changes of a failed batch.
+        """
+        self._squash = squash_handler
+        self._delete = delete_handler
+        self._last_state_hash = first_state_hash
+        self._condition = Condition()
+        self._predecessor_tree = PredecessorTree()
+
+        self._batches = []
+        self._txn_to_batch = {}
+        self._batch_statuses = {}
+        self._scheduled_transactions = []
+
+        # The index of the first batch which has not been applied, so all
+        # batches before it have been applied
+        self._next_to_apply = 0
+
+        self._final = False
+        self._complete = False
+
+    def __iter__(self):
+        return SchedulerIterator(self, self._condition)
+
+    def add_batch(self, batch, state_hash=None):
+        with self._condition:
+            if self._final:
+                raise SchedulerError("Scheduler is finalized. Cannnot take"
+                                     " new batches")
+            index = len(self._batches)
+            headers = []
+            for txn in batch.transactions:
+                header = TransactionHeader()
+                header.ParseFromString(txn.header)
+                headers.append(header)
+
+            # The tree records batch indexes rather than transaction ids, as
+            # a batch's transactions are always run in order
+            predecessors = set()
+            for header in headers:
+                for address in header.inputs:
+                    predecessors.update(
+                        self._predecessor_tree.find_read_predecessors(
+                            address))
+                for address in header.outputs:
+                    predecessors.update(
+                        self._predecessor_tree.find_write_predecessors(
+                            address))
+                for dependency in header.dependencies:
+                    if dependency in self._txn_to_batch:
+                        predecessors.add(self._txn_to_batch[dependency])
+            predecessors.discard(index)
+
+            for header in headers:
+                for address in header.inputs:
+                    self._predecessor_tree.add_reader(address, index)
+                for address in header.outputs:
+                    self._predecessor_tree.set_writer(address, index)
+
+            for txn in batch.transactions:
+                self._txn_to_batch[txn.header_signature] = index
+            self._batches.append(_ScheduledBatch(
+                batch, max(predecessors, default=-1)))
+
+            self._apply_batches()
+            self._condition.notify_all()
+
+    def get_batch_execution_result(self, batch_signature):
+        with self._condition:
+            return self._batch_statuses.get(batch_signature)
+
+    def set_transaction_execution_result(
+            self, txn_signature, is_valid, context_id):
+        with self._condition:
+            if txn_signature not in self._txn_to_batch:
+                raise ValueError("transaction not in any batches: {}".format(
+                    txn_signature))
+            batch = self._batches[self._txn_to_batch[txn_signature]]
+            if batch.in_progress != txn_signature:
+                raise ValueError("transaction not in progress: {}".format(
+                    txn_signature))
+            batch.in_progress = None
+
+            if is_valid:
+                batch.context_ids.append(context_id)
+                batch.next_txn += 1
+                if batch.next_txn == len(batch.batch.transactions):
+                    batch.is_valid = True
+            else:
+                # The failed transaction's context is deleted by the
+                # executor, but the contexts of those before it are not
+                if self._delete is not None and batch.context_ids:
+                    self._delete(batch.context_ids)
+                batch.context_ids = []
+                batch.is_valid = False
+
+            self._apply_batches()
+            self._condition.notify_all()
+
+    def _apply_batches(self):
+        """Applies each finished batch, in the order the batches were added,
+        up to the first batch which has not finished.
+        """
+        while self._next_to_apply < len(self._batches):
+            batch = self._batches[self._next_to_apply]
+            if batch.is_valid is None:
+                break
+
+            if batch.is_valid:
+                if batch.context_ids:
+                    # The last context holds the changes of the whole batch,
+                    # and squashing it deletes the contexts it was based on
+                    self._last_state_hash = self._squash(
+                        self._last_state_hash, batch.context_ids[-1:])
+                self._batch_statuses[batch.batch.header_signature] = \
+                    BatchExecutionResult(
+                        is_valid=True, state_hash=self._last_state_hash)
+            else:
+                self._batch_statuses[batch.batch.header_signature] = \
+                    BatchExecutionResult(is_valid=False, state_hash=None)
+            self._next_to_apply += 1
+
+        if self._final and self._next_to_apply == len(self._batches):
+            self._complete = True
+
+    def count(self):
+        with self._condition:
+            return len(self._scheduled_transactions)
+
+    def get_transaction(self, index):
+        with self._condition:
+            return self._scheduled_transactions[index]
+
+    def next_transaction(self):
+        with self._condition:
+            for batch in self._batches[self._next_to_apply:]:
+                if batch.in_progress is not None or \
+                        batch.is_valid is not None:
+                    continue
+                if batch.state_hash is None:
+                    if batch.last_predecessor >= self._next_to_apply:
+                        continue
+                    batch.state_hash = self._last_state_hash
+
+                txn = batch.batch.transactions[batch.next_txn]
+                batch.in_progress = txn.header_signature
+                txn_info = TxnInformation(
+                    txn=txn,
+                    state_hash=batch.state_hash,
+                    base_context_ids=list(batch.context_ids))
+                self._scheduled_transactions.append(txn_info)
+                return txn_info
+
+            return None
+
+    def finalize(self):
+        with self._condition:
+            self._final = True
+            self._apply_batches()
+            self._condition.notify_all()
+
+    def complete(self, block):
+        with self._condition:
+            if not self._final:
+                return False
+            if self._complete:
+                return True
+            if block:
+                self._condition.wait_for(lambda: self._complete)
+                return True
+            return False
+
+
+class _ScheduledBatch(object):
+    """The progress of a batch through the ParallelScheduler.
+
+    Attributes:
+        batch (batch_pb2.Batch): the batch.
+        last_predecessor (int): the index of the last batch which must be
+            applied before this batch is run, or -1 if there is none.
+        state_hash (str): the state root the batch is run against, once
+            its first transaction has been returned.
+        next_txn (int): the index of the next transaction to return.
+        in_progress (str): the id of the transaction being run, if any.
+        context_ids (list of str): the contexts of the valid transactions.
+        is_valid (bool): whether the batch is valid, or None until all of
+            its transactions are valid or one of them fails.
+    """
+    def __init__(self, batch, last_predecessor):
+        self.batch = batch
+        self.last_predecessor = last_predecessor
+        self.state_hash = None
+        self.next_txn = 0
+        self.in_progress = None
+        self.context_ids = []
+        self.is_valid = None if batch.transactions else True
@@ -47,6 +47,9 @@ class SerialScheduler(Scheduler):
         # last in it's associated batch
         self._last_in_batch = []
         self._last_state_hash = first_state_hash
+        # the state hash before the batch being run, which is restored if
+        # the batch fails
+        self._batch_start_state_hash = first_state_hash
 
     def __iter__(self):
         return SchedulerIterator(self, self._condition)
@@ -86,6 +89,10 @@ class SerialScheduler(Scheduler):
                         BatchExecutionResult(
                             is_valid=is_valid,
                             state_hash=self._last_state_hash)
+                else:
+                    # discard the changes of the batch's valid txns
+                    self._last_state_hash = self._batch_start_state_hash
+                self._batch_start_state_hash = self._last_state_hash
 
             if self._final and self._txn_queue.empty():
                 self._complete = True
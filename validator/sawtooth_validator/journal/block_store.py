@@ -13,9 +13,10 @@
 # limitations under the License.
 # ------------------------------------------------------------------------------
 
-from time import time
-from threading import Condition
+from threading import Event
+from threading import Lock
 # pylint: disable=no-name-in-module
+from collections import OrderedDict
 from collections.abc import MutableMapping
 from sawtooth_validator.journal.block_wrapper import BlockStatus
 from sawtooth_validator.journal.block_wrapper import BlockWrapper
@@ -28,20 +29,47 @@ class BlockStore(MutableMapping):
     A dict like interface wrapper around the block store to guarantee,
     objects are correctly wrapped and unwrapped as they are stored and
     retrieved.
+
+    Blocks, the batch and transaction indexes, which map the ids of the
+    batches and transactions in each block to the block's id, the block
+    number index, which maps the number of each block in the current chain
+    to its id, and the chain head are each kept in a sub database of their
+    own, with raw values.
     """
-    def __init__(self, block_db):
+    def __init__(self, block_db, state_db=None):
+        """
+        Args:
+            block_db (:obj:`Database`): the database holding the blocks.
+            state_db (:obj:`Database`, optional): a database holding the
+                state of the blocks, which is synced before each change to
+                the chain is written, so that the state of a committed block
+                is always on disk when the block is.
+        """
         self._block_store = block_db
-        self._commit_condition = Condition()
+        self._blocks = block_db.sub_database('blocks')
+        self._batch_index = block_db.sub_database('batch_index')
+        self._transaction_index = block_db.sub_database('transaction_index')
+        self._block_num_index = block_db.sub_database('block_num_index')
+        self._metadata = block_db.sub_database('metadata')
+        self._state_db = state_db
+
+        # Clients waiting for batches to commit, by batch id, and those
+        # waiting for any commit
+        self._batch_waiters = {}
+        self._commit_waiters = set()
+        self._waiters_lock = Lock()
+        self._chain_listeners = []
 
     def __setitem__(self, key, value):
         if key != value.identifier:
             raise KeyError("Invalid key to store block under: {} expected {}".
                            format(key, value.identifier))
-        add_ops = self._build_add_block_ops(value)
-        self._block_store.set_batch(add_ops)
+        changes = self._new_changes()
+        self._build_add_block_ops(value, changes)
+        self._write(changes)
 
     def __getitem__(self, key):
-        stored_block = self._block_store[key]
+        stored_block = self._blocks.get(key)
         if stored_block is not None:
             block = Block()
             block.ParseFromString(stored_block)
@@ -51,10 +79,10 @@ class BlockStore(MutableMapping):
         raise KeyError("Key {} not found.".format(key))
 
     def __delitem__(self, key):
-        del self._block_store[key]
+        del self._blocks[key]
 
     def __contains__(self, x):
-        return x in self._block_store
+        return x in self._blocks
 
     def __iter__(self):
         # Required by abstract base class, but implementing is non-trivial
@@ -66,8 +94,8 @@ class BlockStore(MutableMapping):
 
     def __str__(self):
         out = []
-        for key in self._block_store.keys():
-            value = self._block_store[key]
+        for key in self._blocks.keys():
+            value = self._blocks[key]
             out.append(str(value))
         return ','.join(out)
 
@@ -84,26 +112,51 @@ class BlockStore(MutableMapping):
         :return:
         None
         """
-        add_pairs = []
-        del_keys = []
+        changes = self._new_changes()
         for blkw in new_chain:
-            add_pairs = add_pairs + self._build_add_block_ops(blkw)
+            self._build_add_block_ops(blkw, changes)
+            changes[self._block_num_index][0].append(
+                (_block_num_key(blkw.block_num), blkw.identifier.encode()))
         if old_chain is not None:
             for blkw in old_chain:
-                del_keys = del_keys + self._build_remove_block_ops(blkw)
-        add_pairs.append(("chain_head_id", new_chain[0].identifier))
+                self._build_remove_block_ops(blkw, changes)
+                # Deletes are applied before adds, so the numbers shared
+                # with the new chain are left pointing to its blocks
+                changes[self._block_num_index][1].append(
+                    _block_num_key(blkw.block_num))
+        changes[self._metadata][0].append(
+            ("chain_head_id", new_chain[0].identifier.encode()))
+
+        if self._state_db is not None:
+            self._state_db.sync()
+        self._write(changes)
+        self._notify_batch_commits(new_chain)
+        for listener in list(self._chain_listeners):
+            listener(new_chain, old_chain or [])
+
+    def add_chain_listener(self, listener):
+        """Adds a function which is called after each update of the chain
+        is written, with the lists of blocks added to and removed from the
+        chain, newest first. Listeners are called on the thread updating
+        the chain, so should return quickly.
+        """
+        self._chain_listeners.append(listener)
 
-        self._block_store.set_batch(add_pairs, del_keys)
+    def remove_chain_listener(self, listener):
+        if listener in self._chain_listeners:
+            self._chain_listeners.remove(listener)
 
     @property
     def chain_head(self):
         """
         Return the head block of the current chain.
         """
-        if "chain_head_id" not in self._block_store:
+        chain_head_id = self._metadata.get("chain_head_id")
+        if chain_head_id is None:
             return None
-        if self._block_store["chain_head_id"] in self._block_store:
-            return self.__getitem__(self._block_store["chain_head_id"])
+        chain_head_id = chain_head_id.decode()
+        if chain_head_id in self._blocks:
+            return self.__getitem__(chain_head_id)
         return None
 
     @property
@@ -117,65 +170,226 @@ class BlockStore(MutableMapping):
         """Waits for a set of batch ids to be committed to the block chain,
         and returns True when they have. If timeout is exceeded, returns False.
         If no batch_ids are passed in, it will return True on the next commit.
+
+        Waiters are registered by batch id, and are resolved from the batches
+        of each newly committed chain, so a waiter is only woken when its own
+        batches commit, and costs nothing when other blocks are committed.
+        """
+        waiter = _BatchCommitWaiter(batch_ids or [])
+        with self._waiters_lock:
+            if not waiter.pending:
+                self._commit_waiters.add(waiter)
+            for batch_id in waiter.pending:
+                self._batch_waiters.setdefault(batch_id, set()).add(waiter)
+
+        try:
+            # Batches committed before the waiter was registered will not be
+            # notified, so are checked once in the store
+            if waiter.batch_ids:
+                committed = [b for b in waiter.batch_ids if self.has_batch(b)]
+                with self._waiters_lock:
+                    waiter.resolve(committed)
+            return waiter.wait(timeout or 300)
+        finally:
+            with self._waiters_lock:
+                self._commit_waiters.discard(waiter)
+                for batch_id in waiter.batch_ids:
+                    waiters = self._batch_waiters.get(batch_id)
+                    if waiters is not None:
+                        waiters.discard(waiter)
+                        if not waiters:
+                            del self._batch_waiters[batch_id]
+
+    def _notify_batch_commits(self, blocks):
+        """Resolves the waiters on the batches of newly committed blocks,
+        and any waiters on the next commit.
+        """
+        with self._waiters_lock:
+            for waiter in self._commit_waiters:
+                waiter.resolve(())
+            if not self._batch_waiters:
+                return
+            for blkw in blocks:
+                for batch in blkw.batches:
+                    for waiter in self._batch_waiters.get(
+                            batch.header_signature, ()):
+                        waiter.resolve((batch.header_signature,))
+
+    def _new_changes(self):
+        """Returns an empty set of changes to the sub databases, as a dict
+        of a list of key value tuples to add, and a list of keys to remove,
+        by sub database.
         """
-        batch_ids = batch_ids or []
-        timeout = timeout or 300
-        start_time = time()
+        return OrderedDict(
+            (sub_database, ([], []))
+            for sub_database in (self._blocks, self._batch_index,
+                                 self._transaction_index,
+                                 self._block_num_index, self._metadata))
 
-        with self._commit_condition:
-            while True:
-                if all(self.has_batch(b) for b in batch_ids):
-                    return True
-                if time() - start_time > timeout:
-                    return False
-                self._commit_condition.wait(timeout - (time() - start_time))
+    def _write(self, changes):
+        self._block_store.set_batches(
+            [(sub_database, add_pairs, del_keys)
+             for sub_database, (add_pairs, del_keys) in changes.items()
+             if add_pairs or del_keys])
 
-    def _build_add_block_ops(self, blkw):
+    def _build_add_block_ops(self, blkw, changes):
         """Build the batch operations to add a block to the BlockStore.
 
         :param blkw (BlockWrapper): Block to add BlockStore.
-        :return:
-        list of key value tuples to add to the BlockStore
+        :param changes (dict): the changes to the sub databases, from
+            _new_changes, to add the operations to.
         """
-        out = []
         blk_id = blkw.identifier
-        with self._commit_condition:
-            out.append((blk_id, blkw.block.SerializeToString()))
-            for batch in blkw.batches:
-                out.append((batch.header_signature, blk_id))
-                for txn in batch.transactions:
-                    out.append((txn.header_signature, blk_id))
-            self._commit_condition.notify_all()
-        return out
-
-    @staticmethod
-    def _build_remove_block_ops(blkw):
+        packed_id = blk_id.encode()
+        changes[self._blocks][0].append(
+            (blk_id, blkw.block.SerializeToString()))
+        for batch in blkw.batches:
+            changes[self._batch_index][0].append(
+                (batch.header_signature, packed_id))
+            for txn in batch.transactions:
+                changes[self._transaction_index][0].append(
+                    (txn.header_signature, packed_id))
+
+    def _build_remove_block_ops(self, blkw, changes):
         """Build the batch operations to remove a block from the BlockStore.
 
         :param blkw (BlockWrapper): Block to remove.
-        :return:
-        list of values to remove from the BlockStore
+        :param changes (dict): the changes to the sub databases, from
+            _new_changes, to add the operations to.
         """
-        out = []
-        blk_id = blkw.identifier
-        out.append(blk_id)
+        changes[self._blocks][1].append(blkw.identifier)
         for batch in blkw.batches:
-            out.append(batch.header_signature)
+            changes[self._batch_index][1].append(batch.header_signature)
             for txn in batch.transactions:
-                out.append(txn.header_signature)
-        return out
+                changes[self._transaction_index][1].append(
+                    txn.header_signature)
+
+    def _get_indexed_block(self, index, key):
+        block_id = index.get(key)
+        if block_id is None:
+            raise KeyError("Key {} not found.".format(key))
+        return self.__getitem__(block_id.decode())
+
+    def get_block_by_num(self, block_num):
+        """Returns the block of the current chain with a block number.
+
+        Raises:
+            KeyError: if the current chain has no block with the number.
+        """
+        return self._get_indexed_block(
+            self._block_num_index, _block_num_key(block_num))
+
+    def get_blocks_by_num(self, block_nums, head_id=None):
+        """Returns the blocks of a chain with a set of block numbers. The
+        blocks of the current chain are read from the block number index,
+        rather than by walking the chain.
+
+        Args:
+            block_nums (iterable of int): the block numbers, such as a
+                range; a reversed range returns the newest block first.
+            head_id (str, optional): the id of the head of the chain, which
+                may be the head of a fork, or a block within the current
+                chain; the current chain if not given.
+
+        Returns:
+            list of BlockWrapper: the blocks, in the order of their numbers
+                in block_nums. Numbers not in the chain are omitted.
+
+        Raises:
+            KeyError: if the head is not in the block store.
+        """
+        block_nums = list(block_nums)
+        fork = {}
+        last_indexed = None
+        if head_id is not None:
+            fork, last_indexed = self._get_fork(self.__getitem__(head_id))
+
+        keys = [_block_num_key(block_num) for block_num in block_nums
+                if block_num not in fork and
+                (last_indexed is None or block_num <= last_indexed)]
+        by_key = dict(self._block_num_index.get_batch(keys))
+        indexed = {}
+        block_ids = [block_id.decode() for block_id in by_key.values()]
+        for _, stored_block in self._blocks.get_batch(block_ids):
+            block = Block()
+            block.ParseFromString(stored_block)
+            indexed[block.header_signature] = BlockWrapper(
+                status=BlockStatus.Valid, block=block)
+
+        blocks = []
+        for block_num in block_nums:
+            if block_num in fork:
+                blocks.append(fork[block_num])
+                continue
+            block_id = by_key.get(_block_num_key(block_num))
+            if block_id is not None and block_id.decode() in indexed:
+                blocks.append(indexed[block_id.decode()])
+        return blocks
+
+    def _is_on_chain(self, block):
+        """Returns whether a block is part of the current chain.
+        """
+        return self._block_num_index.get(_block_num_key(block.block_num)) \
+            == block.identifier.encode()
+
+    def _get_fork(self, head):
+        """Walks back from a head until its chain joins the current chain.
+
+        Returns:
+            tuple of (dict, int): the blocks of the head's chain which are
+                not in the current chain, by block number, and the number of
+                the newest block the chains share, or -1 if they share none.
+        """
+        fork = {}
+        block = head
+        while not self._is_on_chain(block):
+            fork[block.block_num] = block
+            try:
+                block = self.__getitem__(block.previous_block_id)
+            except KeyError:
+                return fork, -1
+        return fork, block.block_num
+
+    def get_chain(self, head_id, batch_size=100):
+        """Yields the blocks of a chain, from a head back to genesis. The
+        head may be the head of a fork, which is walked block by block
+        until it joins the current chain, after which blocks are read by
+        number, batch_size at a time.
+
+        Args:
+            head_id (str): the id of the newest block to yield.
+            batch_size (int): the number of blocks read at a time from the
+                current chain.
+
+        Yields:
+            BlockWrapper: the blocks of the chain, newest first.
+        """
+        block_id = head_id
+        while block_id in self:
+            block = self.__getitem__(block_id)
+            if self._is_on_chain(block):
+                break
+            yield block
+            block_id = block.previous_block_id
+        else:
+            return
+
+        for stop in range(block.block_num, -1, -batch_size):
+            for chain_block in self.get_blocks_by_num(
+                    range(stop, max(stop - batch_size, -1), -1)):
+                yield chain_block
 
     def get_block_by_transaction_id(self, txn_id):
-        return self.__getitem__(self._block_store[txn_id])
+        return self._get_indexed_block(self._transaction_index, txn_id)
 
     def has_transaction(self, txn_id):
-        return txn_id in self._block_store
+        return txn_id in self._transaction_index
 
     def get_block_by_batch_id(self, batch_id):
-        return self.__getitem__(self._block_store[batch_id])
+        return self._get_indexed_block(self._batch_index, batch_id)
 
     def has_batch(self, batch_id):
-        return batch_id in self._block_store
+        return batch_id in self._batch_index
 
     def get_batch_by_transaction(self, transaction_id):
         """
@@ -220,3 +434,26 @@ class BlockStore(MutableMapping):
                     return batch
 
         raise ValueError("Batch_id %s not found in BlockStore.", batch_id)
+
+
+class _BatchCommitWaiter(object):
+    """A client waiting for a set of batches to be committed, which is woken
+    once all of them have been, or on the next commit if the set is empty.
+    """
+    def __init__(self, batch_ids):
+        self.batch_ids = frozenset(batch_ids)
+        self.pending = set(self.batch_ids)
+        self._committed = Event()
+
+    def resolve(self, batch_ids):
+        self.pending.difference_update(batch_ids)
+        if not self.pending:
+            self._committed.set()
+
+    def wait(self, timeout):
+        return self._committed.wait(timeout)
+
+
+def _block_num_key(block_num):
+    # Fixed width, so that keys sort in the order of the numbers
+    return '{:016x}'.format(block_num)
@@ -248,6 +248,8 @@ class _SendReceive(object):
     def send_message(self, msg, connection_id=None):
         """
         :param msg: protobuf validator_pb2.Message
+        :return: concurrent.futures.Future which is done once the message
+            has been handed to the socket
         """
         zmq_identity = None
         if connection_id is not None and self._connections is not None:
@@ -262,7 +264,7 @@ class _SendReceive(object):
 
         with self._condition:
             self._condition.wait_for(lambda: self._event_loop is not None)
-        asyncio.run_coroutine_threadsafe(
+        return asyncio.run_coroutine_threadsafe(
             self._send_message(zmq_identity, msg),
             self._event_loop)
 
@@ -491,6 +493,27 @@ class Interconnect(object):
         else:
             return connection.send(message_type, data, callback=callback)
 
+    def push(self, message_type, data, connection_id):
+        """
+        Send a message of message_type which expects no response, such as
+        an event pushed to a client. Unlike send, no future is kept waiting
+        for a response.
+        :param connection_id: the identity for the connection to send to
+        :param message_type: validator_pb2.Message.* enum value
+        :param data: bytes serialized protobuf
+        :return: concurrent.futures.Future which is done once the message
+            has been handed to the socket
+        """
+        if connection_id not in self._connections:
+            raise ValueError("Unknown connection id: %s",
+                             connection_id)
+        message = validator_pb2.Message(
+            correlation_id=_generate_id(),
+            content=data,
+            message_type=message_type)
+        return self._send_receive_thread.send_message(
+            msg=message, connection_id=connection_id)
+
     def start(self, daemon=False):
         self._thread = Thread(target=self._send_receive_thread.setup,
                               args=(zmq.ROUTER,))
@@ -19,6 +19,18 @@ import argparse
 import os
 
 from sawtooth_validator.config.path import load_path_config
+from sawtooth_validator.database.backends import DEFAULT_BACKEND
+from sawtooth_validator.database.backends import backend_names
+from sawtooth_validator.database.database import DURABILITY_MODES
+from sawtooth_validator.database.database import DURABILITY_WRITE
+from sawtooth_validator.database.lmdb_nolock_database import \
+    DEFAULT_GROUP_COMMIT_INTERVAL
+from sawtooth_validator.database.lmdb_nolock_database import \
+    DEFAULT_GROUP_COMMIT_WRITES
+from sawtooth_validator.execution.context_manager import \
+    DEFAULT_READER_COUNT
+from sawtooth_validator.execution.executor import SCHEDULER_SERIAL
+from sawtooth_validator.execution.executor import SCHEDULER_TYPES
 from sawtooth_validator.server.core import Validator
 from sawtooth_validator.server.keys import load_identity_signing_key
 from sawtooth_validator.server.log import init_console_logging
@@ -48,6 +60,54 @@ def parse_args(args):
                         help='A list of peers to attempt to connect to '
                              'in the format tcp://hostname:port',
                         nargs='+')
+    parser.add_argument('--state-pruning-depth',
+                        help='Number of recent blocks whose state is kept '
+                             'when pruning old state; 0 disables pruning',
+                        default=0,
+                        type=int)
+    parser.add_argument('--state-durability',
+                        help='When writes to the state database are synced '
+                             'to disk: after every write, by a background '
+                             'group commit, or as each block is committed',
+                        choices=DURABILITY_MODES,
+                        default=DURABILITY_WRITE)
+    parser.add_argument('--group-commit-interval',
+                        help='Milliseconds after a write before a group '
+                             'commit syncs it',
+                        default=DEFAULT_GROUP_COMMIT_INTERVAL * 1000,
+                        type=float)
+    parser.add_argument('--group-commit-writes',
+                        help='Number of writes which trigger a group commit '
+                             'before the interval has passed',
+                        default=DEFAULT_GROUP_COMMIT_WRITES,
+                        type=int)
+    parser.add_argument('--database-backend',
+                        help='Storage engine for the state and block '
+                             'databases',
+                        choices=backend_names(),
+                        default=DEFAULT_BACKEND)
+    parser.add_argument('--memory-database-size',
+                        help='Megabytes each database may hold with the '
+                             'memory backend; 0 for no limit',
+                        default=0,
+                        type=int)
+    parser.add_argument('--scheduler',
+                        help='Transaction scheduler: serial runs one '
+                             'transaction at a time, parallel runs '
+                             'independent batches at once',
+                        choices=SCHEDULER_TYPES,
+                        default=SCHEDULER_SERIAL)
+    parser.add_argument('--context-readers',
+                        help='Number of threads reading the state of new '
+                             'transaction contexts',
+                        default=DEFAULT_READER_COUNT,
+                        type=int)
+    parser.add_argument('--state-hash-workers',
+                        help='Number of processes on which to rehash large '
+                             'changes to the state; 0, the default, '
+                             'rehashes them in the validator process',
+                        default=0,
+                        type=int)
     parser.add_argument('-v', '--verbose',
                         action='count',
                         default=0,
@@ -138,7 +198,19 @@ def main(args=sys.argv[1:]):
                           opts.component_endpoint,
                           opts.peers,
                           path_config.data_dir,
-                          identity_signing_key)
+                          identity_signing_key,
+                          state_pruning_depth=opts.state_pruning_depth,
+                          state_durability=opts.state_durability,
+                          group_commit_interval=(
+                              opts.group_commit_interval / 1000),
+                          group_commit_writes=opts.group_commit_writes,
+                          database_backend=opts.database_backend,
+                          memory_database_size=(
+                              opts.memory_database_size * 1024 * 1024
+                              or None),
+                          scheduler_type=opts.scheduler,
+                          context_readers=opts.context_readers,
+                          state_hash_workers=opts.state_hash_workers)
 
     # pylint: disable=broad-except
     try:
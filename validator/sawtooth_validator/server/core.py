@@ -21,7 +21,15 @@ import os
 import time
 
 from sawtooth_validator.execution.context_manager import ContextManager
-from sawtooth_validator.database.lmdb_nolock_database import LMDBNoLockDatabase
+from sawtooth_validator.execution.context_manager import \
+    DEFAULT_READER_COUNT
+from sawtooth_validator.database.backends import DEFAULT_BACKEND
+from sawtooth_validator.database.backends import open_database
+from sawtooth_validator.database.database import DURABILITY_WRITE
+from sawtooth_validator.database.lmdb_nolock_database import \
+    DEFAULT_GROUP_COMMIT_INTERVAL
+from sawtooth_validator.database.lmdb_nolock_database import \
+    DEFAULT_GROUP_COMMIT_WRITES
 from sawtooth_validator.journal.genesis import GenesisController
 from sawtooth_validator.journal.journal import Journal
 from sawtooth_validator.protobuf import validator_pb2
@@ -40,11 +48,19 @@ from sawtooth_validator.journal.responder import \
     BatchByTransactionIdResponderHandler
 from sawtooth_validator.networking.dispatch import Dispatcher
 from sawtooth_validator.journal.chain_id_manager import ChainIdManager
+from sawtooth_validator.execution.executor import SCHEDULER_SERIAL
 from sawtooth_validator.execution.executor import TransactionExecutor
 from sawtooth_validator.execution import processor_handlers
 from sawtooth_validator.state import client_handlers
+from sawtooth_validator.state.client_events import ClientEventBroadcaster
+from sawtooth_validator.state.client_events import \
+    ClientEventsSubscribeHandler
+from sawtooth_validator.state.client_events import \
+    ClientEventsUnsubscribeHandler
 from sawtooth_validator.state.config_view import ConfigViewFactory
 from sawtooth_validator.state.state_view import StateViewFactory
+from sawtooth_validator.state.merkle import StateHashPool
+from sawtooth_validator.state.pruner import StatePruner
 from sawtooth_validator.gossip import signature_verifier
 from sawtooth_validator.networking.interconnect import Interconnect
 from sawtooth_validator.gossip.gossip import Gossip
@@ -62,7 +78,15 @@ LOGGER = logging.getLogger(__name__)
 
 class Validator(object):
     def __init__(self, network_endpoint, component_endpoint, peer_list,
-                 data_dir, identity_signing_key):
+                 data_dir, identity_signing_key, state_pruning_depth=0,
+                 state_durability=DURABILITY_WRITE,
+                 group_commit_interval=DEFAULT_GROUP_COMMIT_INTERVAL,
+                 group_commit_writes=DEFAULT_GROUP_COMMIT_WRITES,
+                 database_backend=DEFAULT_BACKEND,
+                 memory_database_size=None,
+                 scheduler_type=SCHEDULER_SERIAL,
+                 context_readers=DEFAULT_READER_COUNT,
+                 state_hash_workers=0):
         """Constructs a validator instance.
 
         Args:
@@ -71,22 +95,69 @@ class Validator(object):
             peer_list (list of str): a list of peer addresses
             data_dir (str): path to the data directory
             key_dir (str): path to the key directory
+            state_pruning_depth (int): the number of recent blocks whose
+                state is kept when pruning the state database; 0 disables
+                pruning
+            state_durability (str): when writes to the state database are
+                synced to disk: after every 'write', in a 'group' once
+                group_commit_writes writes have been made or
+                group_commit_interval seconds have passed, or only when a
+                'block' is committed
+            group_commit_interval (float): see state_durability
+            group_commit_writes (int): see state_durability
+            database_backend (str): the name of the storage backend, from
+                sawtooth_validator.database.backends, which the state and
+                block databases are kept in
+            memory_database_size (int): the most bytes the state and
+                block databases may each hold when kept in memory; None
+                for no limit
+            scheduler_type (str): the transaction scheduler to use, from
+                sawtooth_validator.execution.executor.SCHEDULER_TYPES
+            context_readers (int): the number of threads reading the state
+                of new transaction contexts
+            state_hash_workers (int): the number of processes on which to
+                rehash large changes to the state when squashing contexts;
+                0 rehashes them in the squashing thread
         """
         db_filename = os.path.join(data_dir,
-                                   'merkle-{}.lmdb'.format(
-                                       network_endpoint[-2:]))
+                                   'merkle-{}.{}'.format(
+                                       network_endpoint[-2:],
+                                       database_backend))
         LOGGER.debug('database file is %s', db_filename)
 
-        merkle_db = LMDBNoLockDatabase(db_filename, 'n')
-        context_manager = ContextManager(merkle_db)
+        merkle_db = open_database(
+            database_backend, db_filename, 'n', raw=True,
+            durability=state_durability,
+            group_commit_interval=group_commit_interval,
+            group_commit_writes=group_commit_writes,
+            max_size=memory_database_size)
+        self._state_hash_pool = None
+        if state_hash_workers > 0:
+            self._state_hash_pool = StateHashPool(state_hash_workers)
+        context_manager = ContextManager(merkle_db,
+                                         hash_executor=self._state_hash_pool,
+                                         reader_count=context_readers)
         state_view_factory = StateViewFactory(merkle_db)
 
-        block_db_filename = os.path.join(data_dir, 'block-{}.lmdb'.format(
-                                         network_endpoint[-2:]))
+        block_db_filename = os.path.join(data_dir, 'block-{}.{}'.format(
+                                         network_endpoint[-2:],
+                                         database_backend))
         LOGGER.debug('block store file is %s', block_db_filename)
 
-        block_db = LMDBNoLockDatabase(block_db_filename, 'n')
-        block_store = BlockStore(block_db)
+        block_db = open_database(
+            database_backend, block_db_filename, 'n',
+            max_size=memory_database_size)
+        # Unless every state write is synced, the state is synced as each
+        # block is committed.
+        block_store = BlockStore(
+            block_db,
+            state_db=merkle_db
+            if state_durability != DURABILITY_WRITE else None)
+
+        self._state_pruner = None
+        if state_pruning_depth > 0:
+            self._state_pruner = StatePruner(merkle_db, block_store,
+                                             keep_blocks=state_pruning_depth)
 
         # setup network
         self._dispatcher = Dispatcher()
@@ -102,7 +173,8 @@ class Validator(object):
         executor = TransactionExecutor(service=self._service,
                                        context_manager=context_manager,
                                        config_view_factory=ConfigViewFactory(
-                                           StateViewFactory(merkle_db)))
+                                           StateViewFactory(merkle_db)),
+                                       scheduler_type=scheduler_type)
 
         zmq_identity = hashlib.sha512(
             time.time().hex().encode()).hexdigest()[:23]
@@ -294,6 +366,20 @@ class Validator(object):
                 self._journal.get_block_store()),
             thread_pool)
 
+        self._dispatcher.add_handler(
+            validator_pb2.Message.CLIENT_STATE_PROOF_REQUEST,
+            client_handlers.StateProofRequest(
+                merkle_db,
+                self._journal.get_block_store()),
+            thread_pool)
+
+        self._dispatcher.add_handler(
+            validator_pb2.Message.CLIENT_STATE_DIFF_REQUEST,
+            client_handlers.StateDiffRequest(
+                merkle_db,
+                self._journal.get_block_store()),
+            thread_pool)
+
         self._dispatcher.add_handler(
             validator_pb2.Message.CLIENT_BLOCK_LIST_REQUEST,
             client_handlers.BlockListRequest(self._journal.get_block_store()),
@@ -319,9 +405,23 @@ class Validator(object):
             client_handlers.StateCurrentRequest(
                 self._journal.get_current_root), thread_pool)
 
+        self._event_broadcaster = ClientEventBroadcaster(self._service)
+        block_store.add_chain_listener(self._event_broadcaster.chain_update)
+
+        self._dispatcher.add_handler(
+            validator_pb2.Message.CLIENT_EVENTS_SUBSCRIBE_REQUEST,
+            ClientEventsSubscribeHandler(self._event_broadcaster),
+            thread_pool)
+
+        self._dispatcher.add_handler(
+            validator_pb2.Message.CLIENT_EVENTS_UNSUBSCRIBE_REQUEST,
+            ClientEventsUnsubscribeHandler(self._event_broadcaster),
+            thread_pool)
+
     def start(self):
         self._dispatcher.start()
         self._service.start()
+        self._event_broadcaster.start()
         if self._genesis_controller.requires_genesis():
             self._genesis_controller.start(self._start)
         else:
@@ -332,8 +432,15 @@ class Validator(object):
         self._network.start(daemon=True)
         self._gossip.start()
         self._journal.start()
+        if self._state_pruner is not None:
+            self._state_pruner.start()
 
     def stop(self):
+        self._event_broadcaster.stop()
         self._service.stop()
         self._network.stop()
         self._journal.stop()
+        if self._state_pruner is not None:
+            self._state_pruner.stop()
+        if self._state_hash_pool is not None:
+            self._state_hash_pool.shutdown()
@@ -0,0 +1,302 @@
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+import functools
+import logging
+import queue
+from threading import Lock
+from threading import Thread
+import time
+
+# pylint: disable=import-error,no-name-in-module
+# needed for google.protobuf import
+from google.protobuf.message import DecodeError
+
+from sawtooth_validator.networking.dispatch import Handler
+from sawtooth_validator.networking.dispatch import HandlerResult
+from sawtooth_validator.networking.dispatch import HandlerStatus
+
+from sawtooth_validator.protobuf import client_pb2
+from sawtooth_validator.protobuf import validator_pb2
+
+
+LOGGER = logging.getLogger(__name__)
+
+_BatchStatus = client_pb2.ClientBatchStatusResponse
+
+
+class ClientEventBroadcaster(object):
+    """Pushes each change to the chain to the subscribed clients, as a
+    ClientEvent filtered for each subscriber.
+
+    Each subscriber has a bounded queue of events, which one sender thread
+    drains. The sender does not wait for an event to be sent, but sends a
+    subscriber its next event only once the last has been, so a stalled
+    subscriber does not hold up the others. A subscriber whose queue fills,
+    because it receives events more slowly than the chain changes, or
+    whose send stalls, is dropped rather than having events held in memory
+    for it, and must subscribe again.
+    """
+
+    def __init__(self, service, queue_size=100, send_timeout=10):
+        """
+        Args:
+            service (:obj:`Interconnect`): the client interconnect to push
+                events over.
+            queue_size (int): the number of events which may be waiting to
+                be sent to a subscriber before it is dropped.
+            send_timeout (float): the time in seconds after which a
+                subscriber is dropped if an event has not been sent to it.
+                Stalled sends are checked for once in each such period.
+        """
+        self._service = service
+        self._queue_size = queue_size
+        self._send_timeout = send_timeout
+
+        self._subscribers = {}
+        self._lock = Lock()
+
+        # The connection ids of subscribers which have an event queued
+        self._ready = queue.Queue()
+        self._thread = None
+
+    def add_subscriber(self, connection_id, batch_ids=None,
+                       omit_blocks=False):
+        """Subscribes a connection to events, or replaces the filters of
+        an existing subscription.
+        """
+        with self._lock:
+            subscriber = self._subscribers.get(connection_id)
+            if subscriber is None:
+                self._subscribers[connection_id] = _Subscriber(
+                    batch_ids, omit_blocks, self._queue_size)
+            else:
+                subscriber.set_filters(batch_ids, omit_blocks)
+
+    def remove_subscriber(self, connection_id):
+        """Unsubscribes a connection, returning whether it was subscribed.
+        """
+        with self._lock:
+            return self._subscribers.pop(connection_id, None) is not None
+
+    def chain_update(self, new_chain, old_chain):
+        """Queues an event for each subscriber from an update of the chain.
+        This is a chain listener of the BlockStore.
+
+        Args:
+            new_chain (list of BlockWrapper): the blocks added to the chain,
+                newest first.
+            old_chain (list of BlockWrapper): the blocks removed from the
+                chain, newest first.
+        """
+        blocks = [_make_block_commit(b) for b in reversed(new_chain)]
+        removed_block_ids = [b.identifier for b in old_chain]
+
+        batch_statuses = {}
+        for block in old_chain:
+            for batch in block.batches:
+                batch_statuses[batch.header_signature] = _BatchStatus.PENDING
+        for block in new_chain:
+            for batch in block.batches:
+                batch_statuses[batch.header_signature] = \
+                    _BatchStatus.COMMITTED
+
+        with self._lock:
+            for connection_id, subscriber in list(self._subscribers.items()):
+                event = subscriber.make_event(
+                    blocks, removed_block_ids, batch_statuses)
+                if event is None:
+                    continue
+                try:
+                    subscriber.events.put_nowait(event)
+                except queue.Full:
+                    LOGGER.warning(
+                        'Dropping event subscriber %s, which has fallen '
+                        '%s events behind', connection_id, self._queue_size)
+                    del self._subscribers[connection_id]
+                else:
+                    self._ready.put(connection_id)
+
+    def start(self):
+        self._thread = Thread(target=self._send_events, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._ready.put(None)
+
+    def _send_events(self):
+        next_check = time.monotonic() + self._send_timeout
+        while True:
+            try:
+                connection_id = self._ready.get(timeout=self._send_timeout)
+            except queue.Empty:
+                pass
+            else:
+                if connection_id is None:
+                    return
+                self._send_next_event(connection_id)
+
+            now = time.monotonic()
+            if now >= next_check:
+                self._drop_stalled_subscribers(now)
+                next_check = now + self._send_timeout
+
+    def _send_next_event(self, connection_id):
+        with self._lock:
+            subscriber = self._subscribers.get(connection_id)
+            # While a send is in progress, the subscriber's next event is
+            # sent when it completes
+            if subscriber is None or subscriber.send_started is not None:
+                return
+            try:
+                event = subscriber.events.get_nowait()
+            except queue.Empty:
+                return
+            subscriber.send_started = time.monotonic()
+
+        try:
+            sent = self._service.push(
+                validator_pb2.Message.CLIENT_EVENTS,
+                event.SerializeToString(),
+                connection_id)
+        except ValueError:
+            LOGGER.debug(
+                'Event subscriber %s has disconnected', connection_id)
+            self.remove_subscriber(connection_id)
+            return
+
+        sent.add_done_callback(
+            functools.partial(self._event_sent, connection_id, subscriber))
+
+    def _event_sent(self, connection_id, subscriber, sent):
+        with self._lock:
+            # The subscriber may have been dropped, and subscribed again,
+            # while the event was being sent
+            if self._subscribers.get(connection_id) is not subscriber:
+                return
+
+            if sent.cancelled() or sent.exception() is not None:
+                LOGGER.debug(
+                    'Event subscriber %s has disconnected', connection_id)
+                del self._subscribers[connection_id]
+                return
+
+            subscriber.send_started = None
+            if not subscriber.events.empty():
+                self._ready.put(connection_id)
+
+    def _drop_stalled_subscribers(self, now):
+        with self._lock:
+            for connection_id, subscriber in list(self._subscribers.items()):
+                if subscriber.send_started is None:
+                    continue
+                if now - subscriber.send_started >= self._send_timeout:
+                    LOGGER.warning(
+                        'Dropping event subscriber %s, which could not be '
+                        'sent an event in %s seconds', connection_id,
+                        self._send_timeout)
+                    del self._subscribers[connection_id]
+
+
+class _Subscriber(object):
+    def __init__(self, batch_ids, omit_blocks, queue_size):
+        self.events = queue.Queue(maxsize=queue_size)
+        # The time the event being sent was pushed, or None
+        self.send_started = None
+        self.set_filters(batch_ids, omit_blocks)
+
+    def set_filters(self, batch_ids, omit_blocks):
+        self.batch_ids = frozenset(batch_ids or [])
+        self.omit_blocks = omit_blocks
+
+    def make_event(self, blocks, removed_block_ids, batch_statuses):
+        """Returns the event for this subscriber, or None if the filters
+        leave nothing to send.
+        """
+        event = client_pb2.ClientEvent()
+        if not self.omit_blocks:
+            event.blocks.extend(blocks)
+            event.removed_block_ids.extend(removed_block_ids)
+
+        if self.batch_ids:
+            batch_statuses = {
+                batch_id: status for batch_id, status in
+                batch_statuses.items() if batch_id in self.batch_ids}
+        for batch_id, status in batch_statuses.items():
+            event.batch_statuses[batch_id] = status
+
+        if event.blocks or event.removed_block_ids or event.batch_statuses:
+            return event
+        return None
+
+
+def _make_block_commit(block):
+    return client_pb2.ClientBlockCommit(
+        block_id=block.identifier,
+        block_num=block.block_num,
+        previous_block_id=block.previous_block_id,
+        state_root_hash=block.state_root_hash,
+        batch_ids=[b.header_signature for b in block.batches])
+
+
+class ClientEventsSubscribeHandler(Handler):
+    def __init__(self, broadcaster):
+        self._broadcaster = broadcaster
+
+    def handle(self, connection_id, message_content):
+        request = client_pb2.ClientEventsSubscribeRequest()
+        response = client_pb2.ClientEventsSubscribeResponse()
+        try:
+            request.ParseFromString(message_content)
+        except DecodeError:
+            LOGGER.info('Protobuf %s failed to deserialize', request)
+            response.status = response.INTERNAL_ERROR
+        else:
+            self._broadcaster.add_subscriber(
+                connection_id,
+                batch_ids=request.batch_ids,
+                omit_blocks=request.omit_blocks)
+            response.status = response.OK
+
+        return HandlerResult(
+            status=HandlerStatus.RETURN,
+            message_out=response,
+            message_type=validator_pb2.Message.
+            CLIENT_EVENTS_SUBSCRIBE_RESPONSE)
+
+
+class ClientEventsUnsubscribeHandler(Handler):
+    def __init__(self, broadcaster):
+        self._broadcaster = broadcaster
+
+    def handle(self, connection_id, message_content):
+        request = client_pb2.ClientEventsUnsubscribeRequest()
+        response = client_pb2.ClientEventsUnsubscribeResponse()
+        try:
+            request.ParseFromString(message_content)
+        except DecodeError:
+            LOGGER.info('Protobuf %s failed to deserialize', request)
+            response.status = response.INTERNAL_ERROR
+        else:
+            if self._broadcaster.remove_subscriber(connection_id):
+                response.status = response.OK
+            else:
+                response.status = response.NO_RESOURCE
+
+        return HandlerResult(
+            status=HandlerStatus.RETURN,
+            message_out=response,
+            message_type=validator_pb2.Message.
+            CLIENT_EVENTS_UNSUBSCRIBE_RESPONSE)
@@ -14,6 +14,8 @@
 # ------------------------------------------------------------------------------
 
 import abc
+from contextlib import ExitStack
+import itertools
 import logging
 # pylint: disable=import-error,no-name-in-module
 # needed for google.protobuf import
@@ -31,6 +33,11 @@ from sawtooth_validator.protobuf import validator_pb2
 
 LOGGER = logging.getLogger(__name__)
 
+# The number of resources in a page of a list, when a request does not set
+# a limit, and the largest number which a request may set.
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
 
 class _ClientRequestHandler(Handler, metaclass=abc.ABCMeta):
     """Parent class for all Client Request Handlers.
@@ -94,12 +101,21 @@ class _ClientRequestHandler(Handler, metaclass=abc.ABCMeta):
             return self._wrap_result(self._status.INTERNAL_ERROR)
 
         try:
-            response = self._respond(request)
+            with self._read_session():
+                response = self._respond(request)
         except self._ResponseFailed as e:
             response = e.status
 
         return self._wrap_result(response)
 
+    def _read_session(self):
+        """Returns a context in which all of the request's reads of the
+        state tree share one read of the database.
+        """
+        if self._tree is not None:
+            return self._tree.read_session()
+        return ExitStack()
+
     @abc.abstractmethod
     def _respond(self, request):
         """This method must be implemented by each child to build its response.
@@ -203,27 +219,33 @@ class _ClientRequestHandler(Handler, metaclass=abc.ABCMeta):
 
         return head_id
 
-    def _list_store_resources(self, request, head_id, filter_ids,
+    def _list_store_resources(self, request, head, filter_ids,
                               resource_fetcher, block_xform):
-        """Builds a list of blocks or resources derived from blocks,
-        handling multiple possible filter requests:
+        """Builds a page of a list of blocks or resources derived from
+        blocks, handling multiple possible filter requests:
             - filtered by a set of ids
             - filtered by head block
             - filtered by both id and head block
             - not filtered (all current resources)
 
+        Unfiltered lists are read from the chain by block number, a page
+        at a time, and reading stops once the page is full, so the cost of
+        a request depends on its page size, not the length of the chain.
+
         Note:
             This method will fail if `_block_store` has not been set
 
         Args:
             request (object): The parsed protobuf request object
-            head_id (str): Either request.head_id, or the current chain head
+            head (Block): Either the block of request.head_id, or the current
+                chain head
             filter_ids (list of str): the resource ids (if any) to filter by
             resource_fetcher (function): Fetches a resource by its id
                 Expected args:
                     resource_id: The id of the resource to be fetched
                 Expected return:
-                    object: The resource to be appended to the results
+                    tuple of (object, BlockWrapper): The resource to be
+                        appended to the results, and the block holding it
             block_xform (function): Transforms a block into a list of resources
                 Expected args:
                     block: A block object from the block store
@@ -231,37 +253,120 @@ class _ClientRequestHandler(Handler, metaclass=abc.ABCMeta):
                     list: To be concatenated to the end of the results
 
         Returns:
-            list: List of blocks or data from blocks. If filtered by ids,
+            tuple of (list, PagingResponse): The page of blocks or data from
+                blocks, and a description of the page. If filtered by ids,
                 they will be listed in the same order as the id filters,
-                otherwise they will be ordered from newest to oldest
-        """
-        resources = []
+                otherwise they will be ordered from newest to oldest,
+                unless the paging controls reverse the order
 
-        # Simply fetch by id if filtered by id but not by head block
-        if filter_ids and not request.head_id:
-            for resource_id in filter_ids:
-                try:
-                    resources.append(resource_fetcher(resource_id))
-                except (KeyError, ValueError, TypeError):
-                    # Invalid ids should be omitted, not raise an exception
-                    pass
+        Raises:
+            _ResponseFailed: The paging controls are invalid
+        """
+        start_id, limit, reverse = self._get_paging_controls(request)
+        head_id = head.header_signature
+
+        if filter_ids:
+            resources = self._list_filtered_resources(
+                request, head_id, filter_ids, resource_fetcher)
+            if reverse:
+                resources.reverse()
+
+            start = 0
+            if start_id:
+                ids = [r.header_signature for r in resources]
+                if start_id not in ids:
+                    raise self._ResponseFailed(self._status.INVALID_PAGING)
+                start = ids.index(start_id)
+            resources = resources[start:start + limit + 1]
 
-        # Traverse block chain to build results for most scenarios
         else:
-            current_id = head_id
-            while current_id in self._block_store:
-                block = self._block_store[current_id].block
-                resources += block_xform(block)
-                header = BlockHeader()
-                header.ParseFromString(block.header)
-                current_id = header.previous_block_id
-
-        # If filtering by head AND ids, the traverse results must be winnowed
-        if request.head_id and filter_ids:
-            matches = {
-                r.header_signature: r for r in resources
-                if r.header_signature in filter_ids}
-            resources = [matches[i] for i in filter_ids if i in matches]
+            header = BlockHeader()
+            header.ParseFromString(head.header)
+            resources = self._list_chain_resources(
+                head_id, header.block_num, start_id, limit, reverse,
+                resource_fetcher, block_xform)
+
+        paging = client_pb2.PagingResponse(limit=limit)
+        if resources:
+            paging.start_id = resources[0].header_signature
+        if len(resources) > limit:
+            paging.next_id = resources[limit].header_signature
+
+        return resources[:limit], paging
+
+    def _get_paging_controls(self, request):
+        """Returns the start id, limit and direction of a list request,
+        limiting the page size to MAX_PAGE_SIZE.
+
+        Raises:
+            _ResponseFailed: The limit is negative
+        """
+        paging = request.paging
+        if paging.limit < 0:
+            raise self._ResponseFailed(self._status.INVALID_PAGING)
+        limit = min(paging.limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+        return paging.start_id, limit, paging.reverse
+
+    def _list_filtered_resources(self, request, head_id, filter_ids,
+                                 resource_fetcher):
+        """Fetches resources by id, omitting those which are missing, or
+        which are not in the chain of a requested head.
+        """
+        fetched = []
+        for resource_id in filter_ids:
+            try:
+                fetched.append(resource_fetcher(resource_id))
+            except (KeyError, ValueError, TypeError):
+                # Invalid ids should be omitted, not raise an exception
+                pass
+
+        if not request.head_id:
+            return [resource for resource, _ in fetched]
+
+        in_chain = {
+            block.identifier for block in self._block_store.get_blocks_by_num(
+                {block.block_num for _, block in fetched}, head_id=head_id)}
+        return [resource for resource, block in fetched
+                if block.identifier in in_chain]
+
+    def _list_chain_resources(self, head_id, head_num, start_id, limit,
+                              reverse, resource_fetcher, block_xform):
+        """Reads the resources of a chain, from the start id or the end of
+        the chain, until limit + 1 resources have been read.
+        """
+        step = 1 if reverse else -1
+        block_num = 0 if reverse else head_num
+        if start_id:
+            try:
+                _, start_block = resource_fetcher(start_id)
+            except (KeyError, ValueError, TypeError):
+                raise self._ResponseFailed(self._status.INVALID_PAGING)
+            in_chain = self._block_store.get_blocks_by_num(
+                [start_block.block_num], head_id=head_id)
+            if not in_chain or \
+                    in_chain[0].identifier != start_block.identifier:
+                raise self._ResponseFailed(self._status.INVALID_PAGING)
+            block_num = start_block.block_num
+
+        resources = []
+        skipping = bool(start_id)
+        while len(resources) <= limit and 0 <= block_num <= head_num:
+            if reverse:
+                stop = min(block_num + limit + 1, head_num + 1)
+            else:
+                stop = max(block_num - limit - 1, -1)
+            blocks = self._block_store.get_blocks_by_num(
+                range(block_num, stop, step), head_id=head_id)
+            if not blocks:
+                break
+
+            for block in blocks:
+                for resource in block_xform(block.block):
+                    if skipping and resource.header_signature != start_id:
+                        continue
+                    skipping = False
+                    resources.append(resource)
+            block_num = stop
 
         return resources
 
@@ -356,18 +461,33 @@ class StateListRequest(_ClientRequestHandler):
 
     def _respond(self, request):
         head_id = self._set_root(request)
+        start_address, limit, reverse = self._get_paging_controls(request)
+        if reverse:
+            # The trie can only be scanned in address order
+            return self._status.INVALID_PAGING
 
-        # Fetch leaves and encode as protobuf
+        # Scan one leaf past the page, to find the start of the next page
         leaves = [
             client_pb2.Leaf(address=a, data=v) for a, v in
-            self._tree.leaves(request.address or '').items()]
+            self._tree.iter_leaves(
+                request.address,
+                start=start_address or None,
+                limit=limit + 1)]
+
+        paging = client_pb2.PagingResponse(limit=limit)
+        if leaves:
+            paging.start_id = leaves[0].address
+        if len(leaves) > limit:
+            paging.next_id = leaves[limit].address
 
         if not leaves:
             return self._wrap_response(
                 self._status.NO_RESOURCE,
-                head_id=head_id)
+                head_id=head_id,
+                paging=paging)
 
-        return self._wrap_response(head_id=head_id, leaves=leaves)
+        return self._wrap_response(
+            head_id=head_id, leaves=leaves[:limit], paging=paging)
 
 
 class StateGetRequest(_ClientRequestHandler):
@@ -395,6 +515,115 @@ class StateGetRequest(_ClientRequestHandler):
         return self._wrap_response(head_id=head_id, value=value)
 
 
+class StateProofRequest(_ClientRequestHandler):
+    def __init__(self, database, block_store):
+        super().__init__(
+            client_pb2.ClientStateProofRequest,
+            client_pb2.ClientStateProofResponse,
+            validator_pb2.Message.CLIENT_STATE_PROOF_RESPONSE,
+            tree=MerkleDatabase(database),
+            block_store=block_store)
+
+    def _respond(self, request):
+        if not request.addresses:
+            return self._status.NO_RESOURCE
+
+        head_id = self._set_root(request)
+
+        try:
+            nodes = self._tree.get_proof(request.addresses)
+        except KeyError as e:
+            LOGGER.debug('Unable to find node "%s" in database', e)
+            return self._status.NO_ROOT
+
+        return self._wrap_response(
+            head_id=head_id,
+            merkle_root=self._tree.get_merkle_root(),
+            nodes=nodes)
+
+
+class StateDiffRequest(_ClientRequestHandler):
+    def __init__(self, database, block_store):
+        super().__init__(
+            client_pb2.ClientStateDiffRequest,
+            client_pb2.ClientStateDiffResponse,
+            validator_pb2.Message.CLIENT_STATE_DIFF_RESPONSE,
+            tree=MerkleDatabase(database),
+            block_store=block_store)
+
+    def _respond(self, request):
+        if request.from_merkle_root or request.from_head_id:
+            from_root = self._get_root(
+                request.from_merkle_root, request.from_head_id)
+        else:
+            from_root = None
+
+        to_root = self._get_root(request.to_merkle_root, request.to_head_id)
+        start_address, limit, reverse = self._get_paging_controls(request)
+        if reverse:
+            # The tries can only be compared in address order
+            return self._status.INVALID_PAGING
+
+        # Diff one leaf past the page, to find the start of the next page
+        try:
+            changes = [
+                _make_leaf_change(address, old_value, new_value)
+                for address, old_value, new_value in itertools.islice(
+                    self._tree.diff(from_root, to_root, request.address,
+                                    start=start_address or None),
+                    limit + 1)]
+        except KeyError as e:
+            LOGGER.debug('Unable to find root "%s" in database', e)
+            return self._status.NO_ROOT
+
+        paging = client_pb2.PagingResponse(limit=limit)
+        if changes:
+            paging.start_id = changes[0].address
+        if len(changes) > limit:
+            paging.next_id = changes[limit].address
+
+        return self._wrap_response(changes=changes[:limit], paging=paging)
+
+    def _get_root(self, merkle_root, head_id):
+        """Returns the merkle root specified directly, or by the head block
+        id, defaulting to the root of the chain head.
+        """
+        if merkle_root:
+            return merkle_root
+
+        if head_id:
+            try:
+                head = self._block_store[head_id].block
+            except KeyError as e:
+                LOGGER.debug('Unable to find block "%s" in store', e)
+                raise self._ResponseFailed(self._status.NO_ROOT)
+        elif self._block_store.chain_head:
+            head = self._block_store.chain_head.block
+        else:
+            LOGGER.debug('Unable to get chain head from block store')
+            raise self._ResponseFailed(self._status.NOT_READY)
+
+        header = BlockHeader()
+        header.ParseFromString(head.header)
+        return header.state_root_hash
+
+
+def _make_leaf_change(address, old_value, new_value):
+    if old_value is None:
+        return client_pb2.LeafChange(
+            type=client_pb2.LeafChange.ADDED,
+            address=address,
+            data=new_value)
+    if new_value is None:
+        return client_pb2.LeafChange(
+            type=client_pb2.LeafChange.DELETED,
+            address=address)
+    return client_pb2.LeafChange(
+        type=client_pb2.LeafChange.CHANGED,
+        address=address,
+        data=new_value)
+
+
 class BlockListRequest(_ClientRequestHandler):
     def __init__(self, block_store):
         super().__init__(
@@ -404,20 +633,26 @@ class BlockListRequest(_ClientRequestHandler):
             block_store=block_store)
 
     def _respond(self, request):
-        head_id = self._get_head_block(request).header_signature
-        blocks = self._list_store_resources(
+        head = self._get_head_block(request)
+        blocks, paging = self._list_store_resources(
             request,
-            head_id,
+            head,
             request.block_ids,
-            lambda filter_id: self._block_store[filter_id].block,
+            self._fetch_block,
             lambda block: [block])
 
         if not blocks:
             return self._wrap_response(
                 self._status.NO_RESOURCE,
-                head_id=head_id)
+                head_id=head.header_signature,
+                paging=paging)
+
+        return self._wrap_response(
+            head_id=head.header_signature, blocks=blocks, paging=paging)
 
-        return self._wrap_response(head_id=head_id, blocks=blocks)
+    def _fetch_block(self, block_id):
+        block = self._block_store[block_id]
+        return block.block, block
 
 
 class BlockGetRequest(_ClientRequestHandler):
@@ -432,11 +667,12 @@ class BlockGetRequest(_ClientRequestHandler):
         try:
             block = self._block_store[request.block_id].block
         except KeyError:
+            if self._block_store.has_batch(request.block_id):
+                LOGGER.debug('"%s" is a batch id, not block',
+                             request.block_id)
+                return self._status.INVALID_ID
             LOGGER.debug('No block "%s" in store', request.block_id)
             return self._status.NO_RESOURCE
-        except TypeError:
-            LOGGER.debug('"%s" is a batch is, not block', request.block_id)
-            return self._status.INVALID_ID
         return self._wrap_response(block=block)
 
 
@@ -449,20 +685,29 @@ class BatchListRequest(_ClientRequestHandler):
             block_store=block_store)
 
     def _respond(self, request):
-        head_id = self._get_head_block(request).header_signature
-        batches = self._list_store_resources(
+        head = self._get_head_block(request)
+        batches, paging = self._list_store_resources(
             request,
-            head_id,
+            head,
             request.batch_ids,
-            self._block_store.get_batch,
+            self._fetch_batch,
             lambda block: [a for a in block.batches])
 
         if not batches:
             return self._wrap_response(
                 self._status.NO_RESOURCE,
-                head_id=head_id)
+                head_id=head.header_signature,
+                paging=paging)
 
-        return self._wrap_response(head_id=head_id, batches=batches)
+        return self._wrap_response(
+            head_id=head.header_signature, batches=batches, paging=paging)
+
+    def _fetch_batch(self, batch_id):
+        block = self._block_store.get_block_by_batch_id(batch_id)
+        for batch in block.batches:
+            if batch.header_signature == batch_id:
+                return batch, block
+        raise KeyError(batch_id)
 
 
 class BatchGetRequest(_ClientRequestHandler):
@@ -477,9 +722,10 @@ class BatchGetRequest(_ClientRequestHandler):
         try:
             batch = self._block_store.get_batch(request.batch_id)
         except ValueError:
+            if request.batch_id in self._block_store:
+                LOGGER.debug('"%s" is a block id, not batch',
+                             request.batch_id)
+                return self._status.INVALID_ID
             LOGGER.debug('No batch "%s" in store', request.batch_id)
             return self._status.NO_RESOURCE
-        except KeyError:
-            LOGGER.debug('"%s" is a block id, not batch', request.batch_id)
-            return self._status.INVALID_ID
         return self._wrap_response(batch=batch)
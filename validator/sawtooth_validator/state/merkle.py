@@ -13,11 +13,16 @@
 # limitations under the License.
 # ------------------------------------------------------------------------------
 
-import copy
 import logging
 import hashlib
+import multiprocessing
+from threading import Lock
+from weakref import WeakKeyDictionary
+
 import cbor
 
+from sawtooth_validator.state.node_cache import get_node_cache
+
 LOGGER = logging.getLogger(__name__)
 
 INIT_ROOT_KEY = ''
@@ -29,31 +34,155 @@ NODE_PROTO = {"v": None,
 
 TOKEN_SIZE = 2
 
+# The number of changed nodes below which an update is always rehashed
+# serially, as handing the subtrees to an executor would cost more than it
+# saves.
+PARALLEL_REHASH_THRESHOLD = 512
+
+_WRITE_LISTENERS = WeakKeyDictionary()
+_WRITE_LISTENERS_LOCK = Lock()
+
+
+def add_write_listener(database, listener):
+    """Registers a function to be called with the list of node hashes about
+    to be written, before each write of trie nodes to the given database by
+    any MerkleDatabase.
+
+    Args:
+        database (:obj:`Database`): the database to observe.
+        listener (function): called with a list of str node hashes.
+    """
+    with _WRITE_LISTENERS_LOCK:
+        _WRITE_LISTENERS.setdefault(database, []).append(listener)
+
+
+def remove_write_listener(database, listener):
+    with _WRITE_LISTENERS_LOCK:
+        listeners = _WRITE_LISTENERS.get(database, [])
+        if listener in listeners:
+            listeners.remove(listener)
+
 
 class MerkleDatabase(object):
-    def __init__(self, database, merkle_root=INIT_ROOT_KEY):
+    def __init__(self, database, merkle_root=INIT_ROOT_KEY, node_cache=None):
+        """
+        Args:
+            database (:obj:`Database`): the database holding the trie nodes.
+            merkle_root (str): the root of the trie to read from.
+            node_cache (:obj:`NodeCache`): the cache of decoded nodes to
+                use; defaults to the cache shared by all MerkleDatabases on
+                the given database.
+        """
         self._database = database
+        if node_cache is None:
+            node_cache = get_node_cache(database)
+        self._node_cache = node_cache
         self.set_merkle_root(merkle_root)
 
     def __iter__(self):
-        for item in self._yield_iter('', self._root_hash):
-            yield item
+        return self.iter_leaves()
 
-    def _yield_iter(self, path, hash_key):
-        try:
-            node = self._get_by_addr(path)
-        except KeyError:
-            raise StopIteration()
+    def iter_leaves(self, prefix='', start=None, limit=None):
+        """Yields the (address, value) pairs of the leaves under a prefix,
+        in address order.
 
-        if path == INIT_ROOT_KEY:
-            node = self._get_by_hash(hash_key)
+        The trie is descended once, depth first, from the node at the
+        prefix, and nodes are only fetched as the iteration reaches them,
+        so large namespaces may be scanned, or paged through, without
+        holding them in memory.
+
+        Args:
+            prefix (str): the address prefix of the leaves to yield.
+            start (str, optional): the address to start at; leaves with
+                lower addresses are skipped without fetching their nodes.
+            limit (int, optional): the maximum number of leaves to yield.
+        """
+        if limit is not None and limit <= 0:
+            return
 
-        if node["v"] is not None:
-            yield (path, self._decode(node["v"]))
+        # Find the deepest node whose path is a whole-token prefix of the
+        # prefix; any remaining partial token filters that node's children.
+        whole_tokens = len(prefix) - len(prefix) % TOKEN_SIZE
+        try:
+            node = self._get_by_addr(prefix[:whole_tokens])
+        except KeyError:
+            return
+
+        if start is not None and not start.startswith(prefix):
+            if start > prefix:
+                return
+            start = None
+
+        count = 0
+        stack = [(prefix[:whole_tokens], None, node)]
+        while stack:
+            path, key_hash, node = stack.pop()
+            if node is None:
+                node = self._get_by_hash(key_hash)
+
+            if node['v'] is not None and path.startswith(prefix) and \
+                    (start is None or path >= start):
+                yield (path, self._decode(node['v']))
+                count += 1
+                if limit is not None and count >= limit:
+                    return
+
+            # Push the children in reverse so the lowest address is visited
+            # first; each child is only fetched when it is popped.
+            for token in sorted(node['c'], reverse=True):
+                child_path = path + token
+                if _in_range(child_path, prefix, start):
+                    stack.append((child_path, node['c'][token], None))
+
+    def diff(self, root_a, root_b, prefix='', start=None):
+        """Yields the leaves which differ between two merkle roots, in
+        address order.
+
+        Both tries are walked together, and any subtree whose hash is the
+        same under both roots is skipped, so the cost is proportional to
+        the size of the change rather than the size of the state.
 
-        for child in node["c"]:
-            for value in self._yield_iter(path + child, node["c"][child]):
-                yield value
+        Args:
+            root_a (str): the merkle root to diff from, or None to diff
+                from the empty state.
+            root_b (str): the merkle root to diff to, or None to diff to
+                the empty state.
+            prefix (str): the address prefix of the leaves to compare.
+            start (str, optional): the address to start at; subtrees below
+                it are skipped without fetching their nodes.
+
+        Yields:
+            tuple of (str, object, object): the address, the value under
+                root_a, and the value under root_b, where a value of None
+                means the leaf does not exist under that root.
+
+        Raises:
+            KeyError: if either root, or any node below it, is not in the
+                database.
+        """
+        stack = [(INIT_ROOT_KEY, root_a, root_b)]
+        while stack:
+            path, hash_a, hash_b = stack.pop()
+            node_a = self._get_by_hash(hash_a) \
+                if hash_a is not None else NODE_PROTO
+            node_b = self._get_by_hash(hash_b) \
+                if hash_b is not None else NODE_PROTO
+
+            if node_a['v'] != node_b['v'] and path.startswith(prefix) and \
+                    (start is None or path >= start):
+                yield (path,
+                       self._decode(node_a['v'])
+                       if node_a['v'] is not None else None,
+                       self._decode(node_b['v'])
+                       if node_b['v'] is not None else None)
+
+            tokens = set(node_a['c']) | set(node_b['c'])
+            for token in sorted(tokens, reverse=True):
+                child_a = node_a['c'].get(token)
+                child_b = node_b['c'].get(token)
+                if child_a != child_b and \
+                        _in_range(path + token, prefix, start):
+                    stack.append((path + token, child_a, child_b))
 
     def get_merkle_root(self):
         return self._root_hash
@@ -70,12 +199,61 @@ class MerkleDatabase(object):
     def hash(cls, stuff):
         return hashlib.sha512(stuff).hexdigest()[:64]
 
+    @property
+    def node_cache(self):
+        return self._node_cache
+
+    def read_session(self):
+        """Returns a context in which the current thread's reads of trie
+        nodes share one read of the underlying database, such as a single
+        transaction. See Database.read_session.
+        """
+        return self._database.read_session()
+
     def _get_by_hash(self, key_hash):
-        if key_hash in self._database:
-            return self._decode(self._database.get(key_hash))
-        else:
+        """Returns the decoded node with the given hash. The node may be
+        shared with other readers through the node cache, so it must be
+        copied before it is modified.
+        """
+        node = self._node_cache.get(key_hash)
+        if node is not None:
+            return node
+
+        packed = self._database.get(key_hash)
+        if packed is None:
             raise KeyError("hash {} not found in database".format(key_hash))
 
+        node = self._decode(packed)
+        self._node_cache.put(key_hash, node, len(packed))
+        return node
+
+    def _get_batch_by_hash(self, key_hashes):
+        """Returns a dict of hash to decoded node for the given hashes,
+        reading the nodes that are not in the node cache from the database
+        in one batch.
+        """
+        nodes = {}
+        missing = []
+        for key_hash in key_hashes:
+            node = self._node_cache.get(key_hash)
+            if node is not None:
+                nodes[key_hash] = node
+            else:
+                missing.append(key_hash)
+
+        if missing:
+            for key_hash, packed in self._database.get_batch(sorted(missing)):
+                node = self._decode(packed)
+                self._node_cache.put(key_hash, node, len(packed))
+                nodes[key_hash] = node
+
+            for key_hash in missing:
+                if key_hash not in nodes:
+                    raise KeyError(
+                        "hash {} not found in database".format(key_hash))
+
+        return nodes
+
     def __getitem__(self, address):
         return self.get(address)
 
@@ -85,6 +263,97 @@ class MerkleDatabase(object):
     def get_node(self, address):
         return self._get_by_addr(address)
 
+    def get_multi(self, addresses):
+        """Returns the values at many addresses at once.
+
+        The trie is walked one level at a time for all of the addresses
+        together, so nodes on shared prefixes are fetched once, and the
+        nodes of each level are read from the database in a single batch.
+
+        Args:
+            addresses (list of str): the addresses to read.
+
+        Returns:
+            list of (str, object): (address, value) pairs, in the order of
+                the given addresses, with a value of None for each address
+                that has no value set.
+        """
+        nodes = self._get_path_nodes(addresses)
+
+        results = []
+        for address in addresses:
+            node = nodes.get(address)
+            if node is None or node['v'] is None:
+                results.append((address, None))
+            else:
+                results.append((address, self._decode(node['v'])))
+        return results
+
+    def get_proof(self, addresses):
+        """Returns a proof of the values, or the absence of values, at one
+        or more addresses under the current root.
+
+        The proof is the encoded nodes on the path from the root to each
+        address, or to the deepest node on that path which exists. Each
+        node holds the hashes of all of its children, so a verifier holding
+        only the root hash can rehash each node, and follow the children to
+        the addresses' values. Nodes on the paths of several addresses are
+        included once.
+
+        Args:
+            addresses (list of str): the addresses to prove.
+
+        Returns:
+            list of bytes: the encoded nodes, root first, and otherwise in
+                order of depth and then address.
+        """
+        nodes = self._get_path_nodes(addresses)
+
+        proof = []
+        included = set()
+        for path in sorted(nodes, key=lambda p: (len(p), p)):
+            (key_hash, packed) = self._encode_and_hash(nodes[path])
+            if key_hash not in included:
+                included.add(key_hash)
+                proof.append(packed)
+        return proof
+
+    def _get_path_nodes(self, addresses):
+        """Fetches the nodes on the paths to many addresses, a level at a
+        time, as described in get_multi.
+
+        Returns:
+            dict of str: dict: the existing nodes on the addresses' paths,
+                including the root, by path.
+        """
+        nodes = {INIT_ROOT_KEY: self._root_node}
+        pending = sorted(set(addresses))
+        depth = 0
+        with self.read_session():
+            while pending:
+                child_hashes = {}
+                next_pending = []
+                for address in pending:
+                    if len(address) <= depth:
+                        continue
+                    path = address[:depth + TOKEN_SIZE]
+                    if path not in child_hashes:
+                        children = nodes[address[:depth]]['c']
+                        token = path[depth:]
+                        if token not in children:
+                            continue
+                        child_hashes[path] = children[token]
+                    next_pending.append(address)
+
+                fetched = self._get_batch_by_hash(set(child_hashes.values()))
+                for path, key_hash in child_hashes.items():
+                    nodes[path] = fetched[key_hash]
+
+                pending = next_pending
+                depth += TOKEN_SIZE
+
+        return nodes
+
     def __setitem__(self, address, value):
         return self.set(address, value)
 
@@ -111,7 +380,7 @@ class MerkleDatabase(object):
 
     def _get_path_by_addr(self, address, return_empty=False):
         tokens = self._tokenize_address(address)
-        node = copy.deepcopy(self._root_node)
+        node = _copy_node(self._root_node)
         path = ''
         nodes = {}
 
@@ -121,7 +390,7 @@ class MerkleDatabase(object):
         for token in tokens:
             if token in node['c'] and not new_branch:
                 path = path + token
-                node = self._get_by_hash(node['c'][token])
+                node = _copy_node(self._get_by_hash(node['c'][token]))
                 nodes[path] = node
             else:
                 if return_empty:
@@ -165,41 +434,60 @@ class MerkleDatabase(object):
                 if path != '':
                     del path_map[parent_address]['c'][path_branch]
 
-        self._database.set_batch(batch)
+        self._write_batch(batch)
 
         return hash_key
 
-    def update(self, set_items, virtual=True):
+    def update(self, set_items, virtual=True, executor=None):
         """
 
         Args:
             set_items (dict): dict key, values where keys are addresses
             virtual (boolean): True if not committing to disk
                                eg speculative root hash
+            executor (:obj:`concurrent.futures.Executor`, optional): an
+                executor on which to rehash the subtrees under the root's
+                children concurrently, when enough nodes have changed
         Returns:
             the state root after the operations
         """
         path_map = {}
-        batch = []
-        key_hash = None
 
-        for set_address in set_items:
-            path_map.update(self._get_path_by_addr(set_address,
-                                                   return_empty=True))
-            path_map[set_address]["v"] = self._encode(set_items[set_address])
+        with self.read_session():
+            for set_address in set_items:
+                for path, node in self._get_path_by_addr(
+                        set_address, return_empty=True).items():
+                    path_map.setdefault(path, node)
+                path_map[set_address]["v"] = self._encode(
+                    set_items[set_address])
 
-        # Rebuild the hashes to the new root
-        for path in sorted(path_map, key=len, reverse=True):
-            (key_hash, packed) = self._encode_and_hash(path_map[path])
-            batch.append((key_hash, packed))
-            if path != '':
-                parent_address = path[:-TOKEN_SIZE]
-                path_branch = path[-TOKEN_SIZE:]
-                path_map[parent_address]['c'][path_branch] = key_hash
+        if not path_map:
+            return None
+
+        # Group the changed nodes by the root's child they fall under; each
+        # group is a subtree which can be rehashed independently.
+        root_node = path_map.pop(INIT_ROOT_KEY)
+        subtrees = {}
+        for path, node in path_map.items():
+            subtrees.setdefault(path[:TOKEN_SIZE], {})[path] = node
+
+        if executor is not None and len(subtrees) > 1 and \
+                len(path_map) >= PARALLEL_REHASH_THRESHOLD:
+            results = executor.map(_rehash_subtree, subtrees.values())
+        else:
+            results = map(_rehash_subtree, subtrees.values())
+
+        batch = []
+        for (branch, subtree_hash, subtree_batch) in results:
+            batch.extend(subtree_batch)
+            root_node['c'][branch] = subtree_hash
+
+        (key_hash, packed) = self._encode_and_hash(root_node)
+        batch.append((key_hash, packed))
 
         if not virtual:
             # Apply all new hash, value pairs to the database
-            self._database.set_batch(batch)
+            self._write_batch(batch)
         return key_hash
 
     def _set_by_addr(self, address, value):
@@ -225,13 +513,13 @@ class MerkleDatabase(object):
             child = path_map[parent_address]
 
         # Update the child of the root node to the prior hash
-        root_node = copy.deepcopy(self._root_node)
+        root_node = _copy_node(self._root_node)
         root_node["c"][tokens[0]] = key_hash
         (root_hash, packed) = self._encode_and_hash(root_node)
 
         batch.append((root_hash, packed))
 
-        self._database.set_batch(batch)
+        self._write_batch(batch)
 
         return root_hash
 
@@ -245,9 +533,50 @@ class MerkleDatabase(object):
     def _set_kv(self, value):
         packed = self._encode(value)
         hashed_key = MerkleDatabase.hash(packed)
+        self._notify_write([hashed_key])
         self._database.set(hashed_key, packed)
         return hashed_key
 
+    def _write_batch(self, batch):
+        self._notify_write([key_hash for key_hash, _ in batch])
+        self._database.set_batch(batch)
+
+    def _notify_write(self, key_hashes):
+        # Listeners are told of writes before they happen, so that a
+        # listener deleting nodes never deletes one that is being written.
+        with _WRITE_LISTENERS_LOCK:
+            try:
+                listeners = list(_WRITE_LISTENERS.get(self._database, []))
+            except TypeError:
+                # databases which cannot be weakly referenced have no
+                # listeners
+                listeners = []
+        for listener in listeners:
+            listener(key_hashes)
+
+    def mark_reachable(self, marked):
+        """Adds the hashes of all of the nodes reachable from the root to a
+        set. Subtrees whose root hash is already in the set are not
+        descended, so the set may be shared across calls to mark several
+        roots at the cost of walking only the nodes they do not share.
+
+        Args:
+            marked (set of str): the set of node hashes to add to.
+        """
+        if self._root_hash in marked:
+            return
+        marked.add(self._root_hash)
+
+        frontier = [self._root_node]
+        while frontier:
+            child_hashes = set()
+            for node in frontier:
+                for key_hash in node['c'].values():
+                    if key_hash not in marked:
+                        child_hashes.add(key_hash)
+            marked.update(child_hashes)
+            frontier = list(self._get_batch_by_hash(child_hashes).values())
+
     def addresses(self):
         addresses = []
         for address, _ in self:
@@ -257,9 +586,96 @@ class MerkleDatabase(object):
 
     def leaves(self, prefix):
         leaves = {}
-        for address, value in self._yield_iter(prefix, self._root_hash):
+        for address, value in self.iter_leaves(prefix):
             leaves[address] = value
         return leaves
 
     def close(self):
         self._database.close()
+
+
+def _rehash_subtree(nodes):
+    """Hashes the changed nodes of one of the root's subtrees, deepest
+    first, updating each parent with its children's new hashes. This is a
+    module level function so that it may be run in a process pool.
+
+    Args:
+        nodes (dict of str: dict): the changed nodes of the subtree, by
+            path; the shortest path is the subtree's root.
+
+    Returns:
+        tuple of (str, str, list): the path of the subtree's root, the new
+            hash of the subtree's root, and the (hash, packed node) pairs of
+            all of the subtree's changed nodes.
+    """
+    root_path = min(nodes, key=len)
+    root_hash = None
+    batch = []
+    for path in sorted(nodes, key=len, reverse=True):
+        packed = cbor.dumps(nodes[path], sort_keys=True)
+        key_hash = MerkleDatabase.hash(packed)
+        batch.append((key_hash, packed))
+        parent_address = path[:-TOKEN_SIZE]
+        if parent_address in nodes:
+            nodes[parent_address]['c'][path[-TOKEN_SIZE:]] = key_hash
+        if path == root_path:
+            root_hash = key_hash
+
+    return (root_path, root_hash, batch)
+
+
+class StateHashPool(object):
+    """A pool of worker processes on which MerkleDatabase.update may rehash
+    subtrees, passed as its executor.
+
+    The workers are started with the 'spawn' method, so that they do not
+    inherit the threads, sockets and database handles of the process using
+    the pool, and are only started when first needed.
+    """
+
+    def __init__(self, workers):
+        """
+        Args:
+            workers (int): the number of worker processes.
+        """
+        self._workers = workers
+        self._lock = Lock()
+        self._pool = None
+
+    def map(self, func, iterable):
+        with self._lock:
+            if self._pool is None:
+                self._pool = multiprocessing.get_context('spawn').Pool(
+                    self._workers)
+            pool = self._pool
+        return pool.map(func, iterable)
+
+    def shutdown(self):
+        with self._lock:
+            pool = self._pool
+            self._pool = None
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+
+def _copy_node(node):
+    """Returns a copy of a node which may be modified without affecting the
+    original, which may be held in the node cache.
+    """
+    return {"v": node["v"], "c": dict(node["c"])}
+
+
+def _in_range(path, prefix, start):
+    """Returns whether the subtree at path may contain addresses which both
+    begin with prefix and are not less than start.
+    """
+    if not (path.startswith(prefix) or prefix.startswith(path)):
+        return False
+
+    if start is None:
+        return True
+
+    # Every address in the subtree begins with path, so the subtree is
+    # entirely below start only if path sorts below start's leading part.
+    return path >= start[:len(path)]
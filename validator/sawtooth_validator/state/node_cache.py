@@ -0,0 +1,156 @@
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+from collections import OrderedDict
+from threading import Lock
+from weakref import WeakKeyDictionary
+
+# Default upper bound, in bytes, on the encoded size of the nodes held in a
+# database's node cache.
+DEFAULT_NODE_CACHE_SIZE = 64 * 1024 * 1024
+
+
+class NodeCache(object):
+    """A bounded, least-recently-used cache of decoded merkle trie nodes,
+    keyed by node hash.
+
+    Nodes are content-addressed, so an entry can never become stale and is
+    only ever removed to keep the cache within its size bound. The size of
+    an entry is taken to be the length of its encoded form, which is a
+    stable proxy for the memory held by the decoded node.
+
+    Cached nodes are shared between all readers, and must not be mutated.
+
+    Accesses are thread safe.
+    """
+
+    def __init__(self, max_size=DEFAULT_NODE_CACHE_SIZE):
+        """
+        Args:
+            max_size (int): the maximum total encoded size, in bytes, of
+                the nodes held in the cache.
+        """
+        self._lock = Lock()
+        self._cache = OrderedDict()
+        self._max_size = max_size
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key_hash):
+        """Returns the decoded node for the given hash, or None if the node
+        is not cached.
+        """
+        with self._lock:
+            try:
+                node, size = self._cache.pop(key_hash)
+            except KeyError:
+                self._misses += 1
+                return None
+            self._cache[key_hash] = (node, size)
+            self._hits += 1
+            return node
+
+    def put(self, key_hash, node, size):
+        """Adds a decoded node to the cache, evicting the least recently
+        used nodes as needed to stay within the size bound.
+
+        Args:
+            key_hash (str): the hash of the node
+            node (dict): the decoded node
+            size (int): the length of the node's encoded form
+        """
+        if size > self._max_size:
+            return
+
+        with self._lock:
+            previous = self._cache.pop(key_hash, None)
+            if previous is not None:
+                self._size -= previous[1]
+
+            self._cache[key_hash] = (node, size)
+            self._size += size
+
+            while self._size > self._max_size:
+                _, (_, evicted_size) = self._cache.popitem(last=False)
+                self._size -= evicted_size
+
+    def discard(self, key_hashes):
+        """Removes the nodes with the given hashes, such as those deleted
+        from the database, if they are cached.
+        """
+        with self._lock:
+            for key_hash in key_hashes:
+                entry = self._cache.pop(key_hash, None)
+                if entry is not None:
+                    self._size -= entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self._size = 0
+
+    def __contains__(self, key_hash):
+        with self._lock:
+            return key_hash in self._cache
+
+    def __len__(self):
+        with self._lock:
+            return len(self._cache)
+
+    @property
+    def size(self):
+        """The total encoded size, in bytes, of the cached nodes.
+        """
+        return self._size
+
+    @property
+    def max_size(self):
+        return self._max_size
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def misses(self):
+        return self._misses
+
+
+_NODE_CACHES = WeakKeyDictionary()
+_NODE_CACHES_LOCK = Lock()
+
+
+def get_node_cache(database):
+    """Returns the NodeCache shared by every MerkleDatabase reading from the
+    given database, creating it on first use.
+
+    Args:
+        database (:obj:`Database`): the database holding the merkle nodes.
+
+    Returns:
+        NodeCache: the database's node cache.
+    """
+    try:
+        with _NODE_CACHES_LOCK:
+            cache = _NODE_CACHES.get(database)
+            if cache is None:
+                cache = NodeCache()
+                _NODE_CACHES[database] = cache
+            return cache
+    except TypeError:
+        # The database cannot be weakly referenced, so its cache cannot be
+        # shared without keeping the database alive.
+        return NodeCache()
@@ -0,0 +1,253 @@
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+from collections import deque
+import itertools
+import logging
+from threading import Event
+from threading import RLock
+from threading import Thread
+import time
+
+from sawtooth_validator.state.merkle import MerkleDatabase
+from sawtooth_validator.state.merkle import add_write_listener
+from sawtooth_validator.state.merkle import remove_write_listener
+from sawtooth_validator.state.node_cache import get_node_cache
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+class StatePruner(object):
+    """Deletes the merkle trie nodes which are no longer reachable from any
+    retained state root.
+
+    The retained roots are the state roots of the last `keep_blocks` blocks
+    of the current chain, plus any roots pinned with `pin`. Pruning sweeps
+    the database in order, over many passes. Each pass marks the nodes
+    reachable from the retained roots which are not yet marked, then
+    examines up to `max_keys_per_pass` keys from where the last pass
+    stopped, deleting up to `max_nodes_per_pass` unmarked nodes. The marks
+    are cleared when a sweep reaches the end of the database, so that nodes
+    of roots which are no longer retained are swept on the next.
+
+    Nodes written less than `grace_period` seconds ago are never swept.
+    This protects the state of blocks which are still being built or
+    validated, whose roots are not yet on the chain, including nodes which
+    are rewritten with the same content as an unreachable node.
+    """
+
+    def __init__(self, database, block_store, keep_blocks,
+                 max_nodes_per_pass=10000, max_keys_per_pass=100000,
+                 grace_period=600, pass_interval=60):
+        """
+        Args:
+            database (:obj:`Database`): the database holding the merkle
+                trie.
+            block_store (:obj:`BlockStore`): the block store of the chain
+                whose recent state is retained.
+            keep_blocks (int): the number of blocks, counting back from the
+                chain head, whose state roots are retained.
+            max_nodes_per_pass (int): the maximum number of nodes deleted
+                by a single pass.
+            max_keys_per_pass (int): the maximum number of keys examined
+                by a single pass.
+            grace_period (float): the time in seconds for which newly
+                written nodes are protected from pruning.
+            pass_interval (float): the time in seconds between passes when
+                running in the background.
+        """
+        self._database = database
+        self._block_store = block_store
+        self._keep_blocks = keep_blocks
+        self._max_nodes_per_pass = max_nodes_per_pass
+        self._max_keys_per_pass = max_keys_per_pass
+        self._grace_period = grace_period
+        self._pass_interval = pass_interval
+
+        self._lock = RLock()
+        self._pinned = {}
+        self._recent_writes = deque()
+        self._write_sequence = itertools.count()
+
+        # The key the current sweep has reached, and the nodes it has found
+        # to be reachable from a retained root
+        self._cursor = None
+        self._marked = set()
+
+        self._pruned_nodes = 0
+        self._reclaimed_bytes = 0
+
+        self._thread = None
+        self._stop_event = Event()
+
+        add_write_listener(database, self._on_write)
+
+    @property
+    def pruned_nodes(self):
+        """The total number of nodes deleted by this pruner.
+        """
+        return self._pruned_nodes
+
+    @property
+    def reclaimed_bytes(self):
+        """The total size of the nodes deleted by this pruner.
+        """
+        return self._reclaimed_bytes
+
+    def pin(self, state_root):
+        """Retains the state at a root until it is unpinned. A root may be
+        pinned more than once, and is retained until it has been unpinned
+        the same number of times.
+        """
+        with self._lock:
+            self._pinned[state_root] = self._pinned.get(state_root, 0) + 1
+
+    def unpin(self, state_root):
+        with self._lock:
+            count = self._pinned.get(state_root, 0)
+            if count <= 1:
+                self._pinned.pop(state_root, None)
+            else:
+                self._pinned[state_root] = count - 1
+
+    def _on_write(self, key_hashes):
+        with self._lock:
+            self._recent_writes.append(
+                (next(self._write_sequence), time.time(), key_hashes))
+
+    def _retained_roots(self):
+        roots = set()
+        with self._lock:
+            roots.update(self._pinned)
+
+        block = self._block_store.chain_head
+        count = 0
+        while block is not None and count < self._keep_blocks:
+            roots.add(block.state_root_hash)
+            count += 1
+            try:
+                block = self._block_store[block.previous_block_id]
+            except KeyError:
+                block = None
+
+        return roots
+
+    def prune(self):
+        """Runs a single pruning pass.
+
+        Returns:
+            tuple of (int, int): the number of nodes deleted and the number
+                of bytes reclaimed by the pass.
+        """
+        if self._block_store.chain_head is None:
+            return (0, 0)
+
+        if self._cursor is None:
+            self._marked = set()
+        # Marking is incremental within a sweep, as the subtrees of roots
+        # already marked are not walked again.
+        for state_root in self._retained_roots():
+            try:
+                MerkleDatabase(self._database, state_root).mark_reachable(
+                    self._marked)
+            except KeyError:
+                LOGGER.warning("Retained state root %s is missing from the "
+                               "database", state_root)
+                return (0, 0)
+
+        with self._lock:
+            horizon = time.time() - self._grace_period
+            while self._recent_writes and \
+                    self._recent_writes[0][1] < horizon:
+                self._recent_writes.popleft()
+            recent_writes = list(self._recent_writes)
+
+        protected = set()
+        for _, _, key_hashes in recent_writes:
+            protected.update(key_hashes)
+        last_sequence = recent_writes[-1][0] if recent_writes else -1
+
+        keys = self._database.keys_after(
+            self._cursor, self._max_keys_per_pass)
+        unreachable = []
+        for key in keys:
+            if key not in self._marked and key not in protected:
+                unreachable.append(key)
+                if len(unreachable) >= self._max_nodes_per_pass:
+                    break
+
+        if unreachable and len(unreachable) >= self._max_nodes_per_pass:
+            self._cursor = unreachable[-1]
+        elif len(keys) >= self._max_keys_per_pass:
+            self._cursor = keys[-1]
+        else:
+            self._cursor = None
+
+        if not unreachable:
+            return (0, 0)
+
+        sizes = dict(
+            (key, len(packed)) for key, packed in
+            self._database.get_batch(unreachable))
+
+        # Writers tell the pruner of nodes before writing them, so holding
+        # the lock while deleting means that any node written since the
+        # snapshot of recent writes is known here, and is kept.
+        with self._lock:
+            for sequence, _, key_hashes in reversed(self._recent_writes):
+                if sequence <= last_sequence:
+                    break
+                protected.update(key_hashes)
+            unreachable = [key for key in unreachable
+                           if key not in protected]
+            if not unreachable:
+                return (0, 0)
+            self._database.set_batch([], unreachable)
+
+        get_node_cache(self._database).discard(unreachable)
+
+        reclaimed = sum(sizes.get(key, 0) for key in unreachable)
+        self._pruned_nodes += len(unreachable)
+        self._reclaimed_bytes += reclaimed
+
+        LOGGER.debug("Pruned %s state nodes, reclaiming %s bytes",
+                     len(unreachable), reclaimed)
+
+        return (len(unreachable), reclaimed)
+
+    def start(self):
+        """Starts running pruning passes in a background thread.
+        """
+        if self._thread is None:
+            self._stop_event.clear()
+            self._thread = Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+        remove_write_listener(self._database, self._on_write)
+
+    def _run(self):
+        while not self._stop_event.wait(self._pass_interval):
+            try:
+                self.prune()
+            # pylint: disable=broad-except
+            except Exception as exc:
+                LOGGER.exception(exc)
@@ -0,0 +1,309 @@
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+"""Exports the state at a merkle root to a snapshot file, and imports it
+into another database, so that a new validator may be given recent state
+without replaying the chain.
+
+A snapshot file is a header followed by a sequence of chunks:
+
+    header:  MAGIC, then the 64 character merkle root in ASCII
+    chunk:   a 12 byte big endian (length, count, crc32) prefix, then
+             `length` bytes of zlib compressed payload, holding `count`
+             nodes, each as a 4 byte big endian length and the encoded node
+    end:     a chunk prefix with a length of 0, and a count of the total
+             number of nodes in the snapshot
+
+Nodes are stored without their keys, which are recomputed from the node
+contents on import, so a node can not be altered without detection.
+
+Usage:
+    python3 -m sawtooth_validator.state.snapshot export DATABASE ROOT FILE
+    python3 -m sawtooth_validator.state.snapshot import FILE DATABASE
+"""
+
+import argparse
+import logging
+import struct
+import sys
+import zlib
+
+import cbor
+
+from sawtooth_validator.database.lmdb_nolock_database import \
+    LMDBNoLockDatabase
+from sawtooth_validator.state.merkle import MerkleDatabase
+
+
+LOGGER = logging.getLogger(__name__)
+
+MAGIC = b'STSNAP01'
+
+# The uncompressed payload size, in bytes, at which a chunk is closed.
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+
+# The number of nodes buffered between writes to the database.
+DEFAULT_BATCH_SIZE = 50000
+
+_CHUNK_PREFIX = struct.Struct('>III')
+_NODE_PREFIX = struct.Struct('>I')
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def export_snapshot(database, merkle_root, output,
+                    chunk_size=DEFAULT_CHUNK_SIZE):
+    """Writes every node reachable from a merkle root to a snapshot.
+
+    The trie is walked a level at a time, reading each level's nodes from
+    the database in batches, and the encoded nodes are streamed out as they
+    are read, so only the node hashes, and not the state, are held in
+    memory. Subtrees shared within the trie are written once.
+
+    Args:
+        database (:obj:`Database`): the database holding the merkle trie.
+        merkle_root (str): the root of the state to export.
+        output (file): a binary file to write the snapshot to.
+        chunk_size (int): the uncompressed payload size at which a chunk
+            is written out.
+
+    Returns:
+        int: the number of nodes written.
+
+    Raises:
+        ValueError: if the merkle root is not a node hash.
+        KeyError: if the root, or any node below it, is not in the
+            database.
+    """
+    if len(merkle_root) != 64:
+        raise ValueError("Invalid merkle root {}".format(merkle_root))
+
+    output.write(MAGIC)
+    output.write(merkle_root.encode())
+
+    writer = _ChunkWriter(output, chunk_size)
+    seen = set()
+    frontier = [merkle_root]
+    while frontier:
+        next_frontier = []
+        for start in range(0, len(frontier), DEFAULT_BATCH_SIZE):
+            key_hashes = frontier[start:start + DEFAULT_BATCH_SIZE]
+            fetched = dict(database.get_batch(key_hashes))
+            for key_hash in key_hashes:
+                try:
+                    packed = fetched[key_hash]
+                except KeyError:
+                    raise KeyError(
+                        "hash {} not found in database".format(key_hash))
+
+                writer.add(packed)
+                for child_hash in cbor.loads(packed)['c'].values():
+                    if child_hash not in seen:
+                        seen.add(child_hash)
+                        next_frontier.append(child_hash)
+        frontier = next_frontier
+
+    return writer.close()
+
+
+class _ChunkWriter(object):
+    def __init__(self, output, chunk_size):
+        self._output = output
+        self._chunk_size = chunk_size
+        self._payload = []
+        self._payload_size = 0
+        self._total = 0
+
+    def add(self, packed):
+        self._payload.append(_NODE_PREFIX.pack(len(packed)))
+        self._payload.append(packed)
+        self._payload_size += _NODE_PREFIX.size + len(packed)
+        self._total += 1
+        if self._payload_size >= self._chunk_size:
+            self._flush()
+
+    def _flush(self):
+        if not self._payload:
+            return
+        compressed = zlib.compress(b''.join(self._payload))
+        count = len(self._payload) // 2
+        self._output.write(_CHUNK_PREFIX.pack(
+            len(compressed), count, zlib.crc32(compressed)))
+        self._output.write(compressed)
+        self._payload = []
+        self._payload_size = 0
+
+    def close(self):
+        self._flush()
+        self._output.write(_CHUNK_PREFIX.pack(0, self._total, 0))
+        return self._total
+
+
+def import_snapshot(source, database, batch_size=DEFAULT_BATCH_SIZE):
+    """Loads the nodes of a snapshot into a database, and verifies that the
+    database then holds the complete trie under the snapshot's root.
+
+    Args:
+        source (file): a binary file to read the snapshot from.
+        database (:obj:`Database`): the database to load the nodes into.
+        batch_size (int): the number of nodes per write to the database.
+
+    Returns:
+        str: the merkle root of the imported state.
+
+    Raises:
+        SnapshotError: if the snapshot is malformed or corrupt, or does not
+            hold every node under its root.
+    """
+    if _read_exactly(source, len(MAGIC)) != MAGIC:
+        raise SnapshotError("File is not a state snapshot")
+    merkle_root = _read_exactly(source, 64).decode()
+
+    total = 0
+    batch = []
+    while True:
+        length, count, checksum = _CHUNK_PREFIX.unpack(
+            _read_exactly(source, _CHUNK_PREFIX.size))
+        if length == 0:
+            if count != total:
+                raise SnapshotError(
+                    "Snapshot holds {} nodes, but {} were read".format(
+                        count, total))
+            break
+
+        compressed = _read_exactly(source, length)
+        if zlib.crc32(compressed) != checksum:
+            raise SnapshotError(
+                "Checksum mismatch in chunk after {} nodes".format(total))
+
+        for packed in _split_payload(zlib.decompress(compressed), count):
+            batch.append((MerkleDatabase.hash(packed), packed))
+            if len(batch) >= batch_size:
+                database.set_batch(batch)
+                batch = []
+        total += count
+
+    if batch:
+        database.set_batch(batch)
+
+    try:
+        MerkleDatabase(database, merkle_root).mark_reachable(set())
+    except KeyError as e:
+        raise SnapshotError(
+            "Snapshot of {} is incomplete: {}".format(merkle_root, e))
+
+    LOGGER.info("Imported %s state nodes under root %s", total, merkle_root)
+
+    return merkle_root
+
+
+def _split_payload(payload, count):
+    nodes = []
+    offset = 0
+    for _ in range(count):
+        (size,) = _NODE_PREFIX.unpack_from(payload, offset)
+        offset += _NODE_PREFIX.size
+        nodes.append(payload[offset:offset + size])
+        offset += size
+
+    if offset != len(payload):
+        raise SnapshotError("Chunk does not hold {} nodes".format(count))
+
+    return nodes
+
+
+def _read_exactly(source, size):
+    data = source.read(size)
+    if len(data) != size:
+        raise SnapshotError("Snapshot is truncated")
+    return data
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+        description='Exports and imports snapshots of the merkle state.')
+
+    subparsers = parser.add_subparsers(title='subcommands', dest='command')
+
+    export_parser = subparsers.add_parser(
+        'export', help='write the state at a merkle root to a snapshot')
+    export_parser.add_argument('database',
+                               help='the raw mode merkle database to read',
+                               type=str)
+    export_parser.add_argument('merkle_root',
+                               help='the merkle root of the state to export',
+                               type=str)
+    export_parser.add_argument('snapshot',
+                               help='the snapshot file to create',
+                               type=str)
+
+    import_parser = subparsers.add_parser(
+        'import', help='load a snapshot into a merkle database')
+    import_parser.add_argument('snapshot',
+                               help='the snapshot file to read',
+                               type=str)
+    import_parser.add_argument('database',
+                               help='the raw mode merkle database to load '
+                                    'into; it is created if it does not '
+                                    'exist',
+                               type=str)
+    import_parser.add_argument('--batch-size',
+                               help='nodes to buffer per write',
+                               default=DEFAULT_BATCH_SIZE,
+                               type=int)
+
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+    opts = parse_args(args)
+
+    if opts.command == 'export':
+        database = LMDBNoLockDatabase(opts.database, 'r', raw=True)
+        try:
+            with open(opts.snapshot, 'wb') as output:
+                count = export_snapshot(database, opts.merkle_root, output)
+        except (KeyError, ValueError, OSError) as e:
+            print("Error: {}".format(e), file=sys.stderr)
+            sys.exit(1)
+        finally:
+            database.close()
+        print("Exported {} nodes to {}".format(count, opts.snapshot))
+
+    elif opts.command == 'import':
+        database = LMDBNoLockDatabase(opts.database, 'c', raw=True)
+        try:
+            with open(opts.snapshot, 'rb') as source, database.bulk_load():
+                merkle_root = import_snapshot(
+                    source, database, batch_size=opts.batch_size)
+        except (SnapshotError, OSError) as e:
+            print("Error: {}".format(e), file=sys.stderr)
+            sys.exit(1)
+        finally:
+            database.close()
+        print("Imported state with merkle root {}".format(merkle_root))
+
+    else:
+        print("Error: a subcommand of export or import is required",
+              file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+from concurrent.futures import Future
+import time
+import unittest
+
+from sawtooth_validator.database.dict_database import DictDatabase
+from sawtooth_validator.journal.block_store import BlockStore
+from sawtooth_validator.journal.block_wrapper import BlockWrapper
+from sawtooth_validator.protobuf import client_pb2
+from sawtooth_validator.protobuf import validator_pb2
+from sawtooth_validator.protobuf.batch_pb2 import Batch
+from sawtooth_validator.protobuf.block_pb2 import Block
+from sawtooth_validator.protobuf.block_pb2 import BlockHeader
+from sawtooth_validator.state.client_events import ClientEventBroadcaster
+from sawtooth_validator.state.client_events import \
+    ClientEventsSubscribeHandler
+
+
+class _MockService(object):
+    """Records the events pushed to each connection. Sends to the
+    connections in hung never complete.
+    """
+    def __init__(self):
+        self.events = {}
+        self.hung = set()
+
+    def push(self, message_type, data, connection_id):
+        assert message_type == validator_pb2.Message.CLIENT_EVENTS
+        event = client_pb2.ClientEvent()
+        event.ParseFromString(data)
+        self.events.setdefault(connection_id, []).append(event)
+
+        sent = Future()
+        if connection_id not in self.hung:
+            sent.set_result(None)
+        return sent
+
+
+def _make_block(block_num, previous_block_id, batch_ids):
+    header = BlockHeader(
+        block_num=block_num,
+        previous_block_id=previous_block_id,
+        batch_ids=batch_ids,
+        state_root_hash='root-{}'.format(block_num))
+    return BlockWrapper(Block(
+        header=header.SerializeToString(),
+        header_signature='B-{}'.format(block_num),
+        batches=[Batch(header_signature=b) for b in batch_ids]))
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() >= deadline:
+            raise AssertionError('Timed out waiting for condition')
+        time.sleep(0.01)
+
+
+class TestClientEventBroadcaster(unittest.TestCase):
+    def setUp(self):
+        self.service = _MockService()
+        self.broadcaster = ClientEventBroadcaster(self.service, queue_size=2)
+        self.block_store = BlockStore(DictDatabase())
+        self.block_store.add_chain_listener(self.broadcaster.chain_update)
+        self.chain = [_make_block(0, '0000000000000000', ['b-0'])]
+        self.block_store.update_chain(self.chain)
+
+    def _commit(self, batch_ids):
+        head = self.chain[0]
+        block = _make_block(head.block_num + 1, head.identifier, batch_ids)
+        self.chain.insert(0, block)
+        self.block_store.update_chain([block])
+
+    def _send_events(self):
+        """Sends the queued events, then stops the sender.
+        """
+        self.broadcaster.stop()
+        self.broadcaster._send_events()
+
+    def test_block_events(self):
+        """Tests that a subscriber without filters is sent each committed
+        block, and the status of each of its batches, and that nothing is
+        sent to connections which are not subscribed.
+        """
+        self.broadcaster.add_subscriber('conn-a')
+        self._commit(['b-1', 'b-2'])
+        self._send_events()
+
+        self.assertEqual(['conn-a'], list(self.service.events))
+        event = self.service.events['conn-a'][0]
+        self.assertEqual(['B-1'], [b.block_id for b in event.blocks])
+        self.assertEqual(1, event.blocks[0].block_num)
+        self.assertEqual('root-1', event.blocks[0].state_root_hash)
+        self.assertEqual(['b-1', 'b-2'], list(event.blocks[0].batch_ids))
+        self.assertEqual(
+            {'b-1': client_pb2.ClientBatchStatusResponse.COMMITTED,
+             'b-2': client_pb2.ClientBatchStatusResponse.COMMITTED},
+            dict(event.batch_statuses))
+
+    def test_batch_filter(self):
+        """Tests that a subscriber filtered by batch ids, omitting blocks,
+        is only sent the statuses of its batches, and no empty events.
+        """
+        self.broadcaster.add_subscriber(
+            'conn-a', batch_ids=['b-2'], omit_blocks=True)
+        self._commit(['b-1'])
+        self._commit(['b-2', 'b-3'])
+        self._send_events()
+
+        events = self.service.events['conn-a']
+        self.assertEqual(1, len(events))
+        self.assertFalse(events[0].blocks)
+        self.assertEqual(
+            {'b-2': client_pb2.ClientBatchStatusResponse.COMMITTED},
+            dict(events[0].batch_statuses))
+
+    def test_fork_switch(self):
+        """Tests that switching to a fork sends the removed blocks, and
+        marks their batches which are not in the fork as pending.
+        """
+        self._commit(['b-1', 'b-2'])
+        self.broadcaster.add_subscriber('conn-a')
+
+        fork = _make_block(1, 'B-0', ['b-2'])
+        fork.block.header_signature = 'F-1'
+        self.block_store.update_chain([fork], [self.chain[0]])
+        self._send_events()
+
+        event = self.service.events['conn-a'][0]
+        self.assertEqual(['F-1'], [b.block_id for b in event.blocks])
+        self.assertEqual(['B-1'], list(event.removed_block_ids))
+        self.assertEqual(
+            {'b-1': client_pb2.ClientBatchStatusResponse.PENDING,
+             'b-2': client_pb2.ClientBatchStatusResponse.COMMITTED},
+            dict(event.batch_statuses))
+
+    def test_slow_subscriber_dropped(self):
+        """Tests that a subscriber whose queue of events fills is dropped,
+        and is sent no more events.
+        """
+        self.broadcaster.add_subscriber('conn-a')
+        self._commit(['b-1'])
+        self._commit(['b-2'])
+        self._commit(['b-3'])
+        self._send_events()
+
+        self.assertNotIn('conn-a', self.service.events)
+        self.assertFalse(self.broadcaster.remove_subscriber('conn-a'))
+
+    def test_stalled_subscriber_dropped(self):
+        """Tests that a subscriber whose send stalls does not delay the
+        events sent to other subscribers, and is dropped once the send
+        times out.
+        """
+        broadcaster = ClientEventBroadcaster(
+            self.service, queue_size=2, send_timeout=0.5)
+        self.block_store.add_chain_listener(broadcaster.chain_update)
+        self.service.hung.add('conn-a')
+        broadcaster.add_subscriber('conn-a')
+        broadcaster.add_subscriber('conn-b')
+        self._commit(['b-1'])
+        self._commit(['b-2'])
+
+        broadcaster.start()
+        try:
+            _wait_for(lambda: len(self.service.events.get('conn-b', [])) == 2)
+            self.assertIn('conn-a', broadcaster._subscribers)
+            _wait_for(lambda: 'conn-a' not in broadcaster._subscribers)
+        finally:
+            broadcaster.stop()
+
+        self.assertEqual(1, len(self.service.events['conn-a']))
+        self.assertFalse(broadcaster.remove_subscriber('conn-a'))
+        self.assertTrue(broadcaster.remove_subscriber('conn-b'))
+
+    def test_subscribe_handler(self):
+        """Tests that the subscribe handler subscribes the connection which
+        sent the request, with the request's filters.
+        """
+        handler = ClientEventsSubscribeHandler(self.broadcaster)
+        result = handler.handle(
+            'conn-a',
+            client_pb2.ClientEventsSubscribeRequest(
+                batch_ids=['b-1']).SerializeToString())
+
+        self.assertEqual(
+            client_pb2.ClientEventsSubscribeResponse.OK,
+            result.message_out.status)
+        self.assertEqual(
+            validator_pb2.Message.CLIENT_EVENTS_SUBSCRIBE_RESPONSE,
+            result.message_type)
+
+        self._commit(['b-1'])
+        self._send_events()
+        self.assertEqual(
+            ['b-1'], list(self.service.events['conn-a'][0].batch_statuses))
@@ -18,6 +18,7 @@ from time import time, sleep
 from collections import Hashable
 
 import sawtooth_validator.state.client_handlers as handlers
+from sawtooth_validator.state.merkle import MerkleDatabase
 from sawtooth_validator.protobuf import client_pb2
 from sawtooth_validator.protobuf.block_pb2 import Block
 from sawtooth_validator.protobuf.batch_pb2 import Batch
@@ -61,7 +62,7 @@ class _ClientHandlerTestCase(unittest.TestCase):
         """Breaks the chain head causing certain "latest" requests to fail.
         Simulates what block store would look like if genesis had not been run.
         """
-        del self._store.store['chain_head_id']
+        del self._store.store.sub_database('metadata')['chain_head_id']
 
     def assert_all_instances(self, items, cls):
         """Checks that all items in a collection are instances of a class
@@ -513,6 +514,48 @@ class TestStateListRequests(_ClientHandlerTestCase):
         self.assertEqual('B-1', response.head_id)
         self.assertFalse(response.leaves)
 
+    def test_state_list_paginated(self):
+        """Verifies requests for data lists are paged in address order.
+
+        Queries the latest state in the default mock db a page at a time:
+            {'a': b'3', 'b': b'5', 'c': b'7'}
+
+        Expects to find:
+            - a first page with the leaves 'a' and 'b', a start_id of 'a',
+              and a next_id of 'c'
+            - a page starting at 'c' with just the leaf 'c', and no next_id
+        """
+        response = self.make_request(
+            paging=client_pb2.PagingControls(limit=2))
+
+        self.assertEqual(self.status.OK, response.status)
+        self.assertEqual(['a', 'b'], [l.address for l in response.leaves])
+        self.assertEqual('a', response.paging.start_id)
+        self.assertEqual(2, response.paging.limit)
+        self.assertEqual('c', response.paging.next_id)
+
+        response = self.make_request(
+            paging=client_pb2.PagingControls(start_id='c', limit=2))
+
+        self.assertEqual(self.status.OK, response.status)
+        self.assertEqual(['c'], [l.address for l in response.leaves])
+        self.assertFalse(response.paging.next_id)
+
+    def test_state_list_invalid_paging(self):
+        """Verifies requests for data lists break with invalid paging.
+
+        Expects to find:
+            - a status of INVALID_PAGING for a negative limit
+            - a status of INVALID_PAGING for a reversed list
+        """
+        response = self.make_request(
+            paging=client_pb2.PagingControls(limit=-1))
+        self.assertEqual(self.status.INVALID_PAGING, response.status)
+
+        response = self.make_request(
+            paging=client_pb2.PagingControls(reverse=True))
+        self.assertEqual(self.status.INVALID_PAGING, response.status)
+
 
 class TestStateGetRequests(_ClientHandlerTestCase):
     def setUp(self):
@@ -658,6 +701,248 @@ class TestStateGetRequests(_ClientHandlerTestCase):
         self.assertFalse(response.value)
 
 
+class TestStateProofRequests(_ClientHandlerTestCase):
+    def setUp(self):
+        db, store, roots = make_db_and_store()
+        self.roots = roots
+        self.initialize(
+            handlers.StateProofRequest(db, store),
+            client_pb2.ClientStateProofRequest,
+            client_pb2.ClientStateProofResponse,
+            store=store,
+            roots=roots)
+
+    def test_state_proof_request(self):
+        """Verifies requests for proofs of many addresses work properly.
+
+        Queries the latest state in the default mock db:
+            {'a': b'3', 'b': b'5', 'c': b'7'}
+
+        Expects to find:
+            - a status of OK
+            - a head_id of 'B-2' (the latest)
+            - a merkle_root of the latest root
+            - the root node, and one node for each of 'a' and 'c'
+        """
+        response = self.make_request(addresses=['a', 'c'])
+
+        self.assertEqual(self.status.OK, response.status)
+        self.assertEqual('B-2', response.head_id)
+        self.assertEqual(self.roots[2], response.merkle_root)
+        self.assertEqual(3, len(response.nodes))
+        self.assertEqual(
+            self.roots[2],
+            MerkleDatabase.hash(response.nodes[0]))
+
+    def test_state_proof_with_head(self):
+        """Verifies requests for proofs work properly with a head id.
+
+        Queries the second state in the default mock db:
+            {'a': b'2', 'b': b'4'}
+
+        Expects to find:
+            - a status of OK
+            - a head_id of 'B-1'
+            - a merkle_root of the second root
+            - the root node only, proving that 'c' is absent
+        """
+        response = self.make_request(head_id='B-1', addresses=['c'])
+
+        self.assertEqual(self.status.OK, response.status)
+        self.assertEqual('B-1', response.head_id)
+        self.assertEqual(self.roots[1], response.merkle_root)
+        self.assertEqual(1, len(response.nodes))
+
+    def test_state_proof_bad_request(self):
+        """Verifies requests for proofs break with bad protobufs.
+
+        Expects to find:
+            - a status of INTERNAL_ERROR
+            - that nodes is missing
+        """
+        response = self.make_bad_request(addresses=['a'])
+
+        self.assertEqual(self.status.INTERNAL_ERROR, response.status)
+        self.assertFalse(response.nodes)
+
+    def test_state_proof_no_addresses(self):
+        """Verifies requests for proofs break without addresses.
+
+        Expects to find:
+            - a status of NO_RESOURCE
+            - that nodes is missing
+        """
+        response = self.make_request(head_id='B-1')
+
+        self.assertEqual(self.status.NO_RESOURCE, response.status)
+        self.assertFalse(response.nodes)
+
+    def test_state_proof_bad_head(self):
+        """Verifies requests for proofs break with a bad head.
+
+        Expects to find:
+            - a status of NO_ROOT
+            - that nodes is missing
+        """
+        response = self.make_request(head_id='bad', addresses=['a'])
+
+        self.assertEqual(self.status.NO_ROOT, response.status)
+        self.assertFalse(response.nodes)
+
+
+class TestStateDiffRequests(_ClientHandlerTestCase):
+    def setUp(self):
+        db, store, roots = make_db_and_store()
+        self.roots = roots
+        self.initialize(
+            handlers.StateDiffRequest(db, store),
+            client_pb2.ClientStateDiffRequest,
+            client_pb2.ClientStateDiffResponse,
+            store=store,
+            roots=roots)
+
+    def test_state_diff_request(self):
+        """Verifies requests for the changes between two heads work properly.
+
+        Queries the first and latest states in the default mock db:
+            {'a': b'1'}
+            {'a': b'3', 'b': b'5', 'c': b'7'}
+
+        Expects to find:
+            - a status of OK
+            - a CHANGED change at 'a' with data of b'3'
+            - ADDED changes at 'b' and 'c', in that order
+        """
+        response = self.make_request(from_head_id='B-0', to_head_id='B-2')
+
+        self.assertEqual(self.status.OK, response.status)
+        self.assertEqual(3, len(response.changes))
+
+        a, b, c = response.changes
+        self.assertEqual(client_pb2.LeafChange.CHANGED, a.type)
+        self.assertEqual('a', a.address)
+        self.assertEqual(b'3', a.data)
+        self.assertEqual(client_pb2.LeafChange.ADDED, b.type)
+        self.assertEqual('b', b.address)
+        self.assertEqual(b'5', b.data)
+        self.assertEqual(client_pb2.LeafChange.ADDED, c.type)
+        self.assertEqual('c', c.address)
+
+    def test_state_diff_reversed(self):
+        """Verifies diffs from a later state to an earlier one list deletes.
+
+        Expects to find:
+            - a status of OK
+            - a DELETED change at 'c' without data
+        """
+        response = self.make_request(
+            from_merkle_root=self.roots[2], to_merkle_root=self.roots[1])
+
+        self.assertEqual(self.status.OK, response.status)
+        deleted = [c for c in response.changes
+                   if c.type == client_pb2.LeafChange.DELETED]
+        self.assertEqual(['c'], [c.address for c in deleted])
+        self.assertFalse(deleted[0].data)
+
+    def test_state_diff_with_address(self):
+        """Verifies diffs can be filtered to a single address.
+
+        Expects to find:
+            - a status of OK
+            - only the change at 'b', which was ADDED with data b'5'
+        """
+        response = self.make_request(from_head_id='B-0', address='b')
+
+        self.assertEqual(self.status.OK, response.status)
+        self.assertEqual(['b'], [c.address for c in response.changes])
+        self.assertEqual(b'5', response.changes[0].data)
+
+    def test_state_diff_paginated(self):
+        """Verifies diffs are paged in address order, including diffs from
+        the empty state.
+
+        Queries the changes from the empty state to the latest state in the
+        default mock db a page at a time:
+            {'a': b'3', 'b': b'5', 'c': b'7'}
+
+        Expects to find:
+            - a first page with the changes at 'a' and 'b', a start_id of
+              'a', and a next_id of 'c'
+            - a page starting at 'c' with just the change at 'c', and no
+              next_id
+        """
+        response = self.make_request(
+            paging=client_pb2.PagingControls(limit=2))
+
+        self.assertEqual(self.status.OK, response.status)
+        self.assertEqual(['a', 'b'], [c.address for c in response.changes])
+        self.assertEqual('a', response.paging.start_id)
+        self.assertEqual(2, response.paging.limit)
+        self.assertEqual('c', response.paging.next_id)
+
+        response = self.make_request(
+            paging=client_pb2.PagingControls(start_id='c', limit=2))
+
+        self.assertEqual(self.status.OK, response.status)
+        self.assertEqual(['c'], [c.address for c in response.changes])
+        self.assertFalse(response.paging.next_id)
+
+    def test_state_diff_invalid_paging(self):
+        """Verifies requests for state diffs break with invalid paging.
+
+        Expects to find:
+            - a status of INVALID_PAGING for a negative limit
+            - a status of INVALID_PAGING for a reversed diff
+        """
+        response = self.make_request(
+            paging=client_pb2.PagingControls(limit=-1))
+        self.assertEqual(self.status.INVALID_PAGING, response.status)
+
+        response = self.make_request(
+            paging=client_pb2.PagingControls(reverse=True))
+        self.assertEqual(self.status.INVALID_PAGING, response.status)
+
+    def test_state_diff_bad_request(self):
+        """Verifies requests for state diffs break with bad protobufs.
+
+        Expects to find:
+            - a status of INTERNAL_ERROR
+            - that changes is missing
+        """
+        response = self.make_bad_request(from_head_id='B-0')
+
+        self.assertEqual(self.status.INTERNAL_ERROR, response.status)
+        self.assertFalse(response.changes)
+
+    def test_state_diff_no_genesis(self):
+        """Verifies requests for state diffs break properly with no genesis.
+
+        Expects to find:
+            - a status of NOT_READY
+            - that changes is missing
+        """
+        self.break_genesis()
+        response = self.make_request()
+
+        self.assertEqual(self.status.NOT_READY, response.status)
+        self.assertFalse(response.changes)
+
+    def test_state_diff_bad_ids(self):
+        """Verifies requests for state diffs break with a bad head or root.
+
+        Expects to find:
+            - a status of NO_ROOT for both requests
+            - that changes is missing
+        """
+        response = self.make_request(from_head_id='bad')
+        self.assertEqual(self.status.NO_ROOT, response.status)
+        self.assertFalse(response.changes)
+
+        response = self.make_request(to_merkle_root='bad')
+        self.assertEqual(self.status.NO_ROOT, response.status)
+        self.assertFalse(response.changes)
+
+
 class TestBlockListRequests(_ClientHandlerTestCase):
     def setUp(self):
         store = MockBlockStore()
@@ -858,6 +1143,93 @@ class TestBlockListRequests(_ClientHandlerTestCase):
         self.assertFalse(response.blocks)
 
 
+class TestBlockListPaging(_ClientHandlerTestCase):
+    def setUp(self):
+        store = MockBlockStore(size=5)
+        self.initialize(
+            handlers.BlockListRequest(store),
+            client_pb2.ClientBlockListRequest,
+            client_pb2.ClientBlockListResponse,
+            store=store)
+
+    def make_paged_request(self, **kwargs):
+        paging_kwargs = {k: kwargs.pop(k) for k in ('start_id', 'limit',
+                                                    'reverse')
+                         if k in kwargs}
+        return self.make_request(
+            paging=client_pb2.PagingControls(**paging_kwargs), **kwargs)
+
+    def assert_page(self, response, block_ids, next_id=''):
+        self.assertEqual(self.status.OK, response.status)
+        self.assertEqual(
+            block_ids, [b.header_signature for b in response.blocks])
+        self.assertEqual(block_ids[0], response.paging.start_id)
+        self.assertEqual(next_id, response.paging.next_id)
+
+    def test_block_list_paged(self):
+        """Verifies that a limit returns the newest blocks, with the id of
+        the block which starts the next page, and that the next page starts
+        with it.
+        """
+        response = self.make_paged_request(limit=2)
+        self.assert_page(response, ['B-4', 'B-3'], 'B-2')
+        self.assertEqual(2, response.paging.limit)
+
+        response = self.make_paged_request(start_id='B-2', limit=2)
+        self.assert_page(response, ['B-2', 'B-1'], 'B-0')
+
+        response = self.make_paged_request(start_id='B-0', limit=2)
+        self.assert_page(response, ['B-0'])
+
+    def test_block_list_paged_reverse(self):
+        """Verifies that a reversed list pages from genesis to the head.
+        """
+        response = self.make_paged_request(limit=3, reverse=True)
+        self.assert_page(response, ['B-0', 'B-1', 'B-2'], 'B-3')
+
+        response = self.make_paged_request(
+            start_id='B-3', limit=3, reverse=True)
+        self.assert_page(response, ['B-3', 'B-4'])
+
+    def test_block_list_paged_with_head(self):
+        """Verifies that pages of a list from a head block do not include
+        blocks after the head, and that a start id after the head is
+        rejected.
+        """
+        response = self.make_paged_request(
+            head_id='B-2', limit=1, reverse=True, start_id='B-2')
+        self.assert_page(response, ['B-2'])
+
+        response = self.make_paged_request(head_id='B-2', start_id='B-3')
+        self.assertEqual(self.status.INVALID_PAGING, response.status)
+
+    def test_block_list_paged_with_ids(self):
+        """Verifies that lists filtered by ids are paged in the order of
+        the ids.
+        """
+        response = self.make_paged_request(
+            block_ids=['B-1', 'B-3', 'B-4'], limit=2)
+        self.assert_page(response, ['B-1', 'B-3'], 'B-4')
+
+        response = self.make_paged_request(
+            block_ids=['B-1', 'B-3', 'B-4'], start_id='B-4', limit=2)
+        self.assert_page(response, ['B-4'])
+
+    def test_block_list_invalid_paging(self):
+        """Verifies that a start id not in the list, or a negative limit,
+        are rejected, and that limits are capped at the maximum page size.
+        """
+        response = self.make_paged_request(start_id='missing')
+        self.assertEqual(self.status.INVALID_PAGING, response.status)
+
+        response = self.make_paged_request(limit=-1)
+        self.assertEqual(self.status.INVALID_PAGING, response.status)
+
+        response = self.make_paged_request(limit=handlers.MAX_PAGE_SIZE + 1)
+        self.assertEqual(handlers.MAX_PAGE_SIZE, response.paging.limit)
+        self.assertEqual(5, len(response.blocks))
+
+
 class TestBlockGetRequests(_ClientHandlerTestCase):
     def setUp(self):
         store = MockBlockStore()
@@ -1119,6 +1491,41 @@ class TestBatchListRequests(_ClientHandlerTestCase):
         self.assertFalse(response.batches)
 
 
+class TestBatchListPaging(_ClientHandlerTestCase):
+    def setUp(self):
+        store = MockBlockStore(size=5)
+        self.initialize(
+            handlers.BatchListRequest(store),
+            client_pb2.ClientBatchListRequest,
+            client_pb2.ClientBatchListResponse,
+            store=store)
+
+    def test_batch_list_paged(self):
+        """Verifies that batch lists are paged by batch id, in both
+        directions.
+        """
+        response = self.make_request(
+            paging=client_pb2.PagingControls(start_id='b-3', limit=2))
+        self.assertEqual(
+            ['b-3', 'b-2'], [b.header_signature for b in response.batches])
+        self.assertEqual('b-1', response.paging.next_id)
+
+        response = self.make_request(
+            paging=client_pb2.PagingControls(
+                start_id='b-3', limit=2, reverse=True))
+        self.assertEqual(
+            ['b-3', 'b-4'], [b.header_signature for b in response.batches])
+        self.assertFalse(response.paging.next_id)
+
+    def test_batch_list_paging_block_id(self):
+        """Verifies that a block id is not a valid start id for a batch
+        list.
+        """
+        response = self.make_request(
+            paging=client_pb2.PagingControls(start_id='B-3'))
+        self.assertEqual(self.status.INVALID_PAGING, response.status)
+
+
 class TestBatchGetRequests(_ClientHandlerTestCase):
     def setUp(self):
         store = MockBlockStore()
@@ -13,6 +13,7 @@
 # limitations under the License.
 # ------------------------------------------------------------------------------
 
+from threading import Thread
 import unittest
 
 from sawtooth_validator.database import dict_database
@@ -20,6 +21,38 @@ from sawtooth_validator.execution import context_manager
 from sawtooth_validator.state.merkle import MerkleDatabase
 
 
+class TestStateContext(unittest.TestCase):
+
+    def test_set_before_tree_read(self):
+        """Tests that a value set in a context for an address which is
+        still being read from the merkle tree is not overwritten by the
+        value read, and that the futures of other addresses, which share
+        the context's condition, are not held up.
+        """
+        context = context_manager.StateContext(
+            state_hash='root',
+            read_list=['aaaa'],
+            write_list=['aaaa', 'bbbb'],
+            base_context_ids=[])
+        context.initialize_futures(reads=['aaaa'], others=['bbbb'])
+
+        setter = Thread(target=context.set_futures, args=({'aaaa': b'2'},))
+        setter.start()
+        context.set_futures({'bbbb': b'3'})
+        self.assertEqual(context.get_state()['bbbb'].result(), b'3')
+        self.assertFalse(context.get_state()['aaaa'].done())
+
+        context.set_futures({'aaaa': b'1'}, from_tree=True)
+        setter.join(5)
+        self.assertFalse(setter.is_alive())
+        self.assertEqual(context.get_state()['aaaa'].result(), b'2')
+
+    def test_unique_ids(self):
+        ids = {context_manager.StateContext('root', [], [], []).session_id
+               for _ in range(100)}
+        self.assertEqual(len(ids), 100)
+
+
 class TestContextManager(unittest.TestCase):
 
     def test_create_context_with_prior_state(self):
@@ -86,6 +119,68 @@ class TestContextManager(unittest.TestCase):
         # 4)
         self.assertEqual(resulting_state_hash, test_resulting_state_hash)
 
+    def test_shared_reads(self):
+        """Tests that contexts reading the same addresses from the same
+        state root each get their values, whether or not their reads are
+        shared, and that the reads are counted.
+        """
+        state_hash = MerkleDatabase(self.database_of_record).update(
+            {'aaaa': b'1', 'bbbb': b'2'}, virtual=False)
+
+        context_ids = [
+            self.context_manager.create_context(
+                state_hash=state_hash,
+                base_contexts=[],
+                inputs=['aaaa', 'bbbb'],
+                outputs=['aaaa'])
+            for _ in range(10)]
+
+        for context_id in context_ids:
+            self.assertEqual(
+                self.context_manager.get(context_id, ['aaaa', 'bbbb']),
+                [('aaaa', b'1'), ('bbbb', b'2')])
+
+        self.assertEqual(
+            self.context_manager.prefetch_count
+            + self.context_manager.coalesced_prefetch_count
+            + self.context_manager.cached_prefetch_count,
+            20)
+        self.assertEqual(self.context_manager.prefetch_queue_depth, 0)
+        self.assertGreaterEqual(
+            self.context_manager.max_prefetch_latency,
+            self.context_manager.mean_prefetch_latency)
+
+    def test_cached_reads(self):
+        """Tests that the values read for a context are used by new
+        contexts based on the same state root, until every context based on
+        it has been deleted.
+        """
+        state_hash = MerkleDatabase(self.database_of_record).update(
+            {'aaaa': b'1'}, virtual=False)
+
+        def create_and_get():
+            context_id = self.context_manager.create_context(
+                state_hash=state_hash,
+                base_contexts=[],
+                inputs=['aaaa', 'bbbb'],
+                outputs=[])
+            self.assertEqual(
+                self.context_manager.get(context_id, ['aaaa', 'bbbb']),
+                [('aaaa', b'1'), ('bbbb', None)])
+            return context_id
+
+        first_id = create_and_get()
+        self.assertEqual(self.context_manager.cached_prefetch_count, 0)
+
+        second_id = create_and_get()
+        self.assertEqual(self.context_manager.cached_prefetch_count, 2)
+        self.assertEqual(self.context_manager.prefetch_count, 2)
+
+        self.context_manager.delete_context([first_id, second_id])
+        create_and_get()
+        self.assertEqual(self.context_manager.cached_prefetch_count, 2)
+        self.assertEqual(self.context_manager.prefetch_count, 4)
+
     def _setup_context(self):
         # 1) Create transaction data
         first_transaction = {'inputs': ['aaaa', 'bbbb', 'cccc'],
@@ -0,0 +1,100 @@
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+"""Times the merkle state workload against each registered storage
+backend, so that backends can be compared on the same host.
+
+Usage:
+    PYTHONPATH=signing:core:validator \
+        python3 validator/tests/unit3/test_database_backends/benchmark.py
+"""
+
+import argparse
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from sawtooth_validator.database.backends import backend_names
+from sawtooth_validator.database.backends import open_database
+from sawtooth_validator.database.database import DURABILITY_MODES
+from sawtooth_validator.database.database import DURABILITY_WRITE
+from sawtooth_validator.state.merkle import MerkleDatabase
+
+
+def _run(backend, directory, blocks, writes, durability):
+    database = open_database(
+        backend, os.path.join(directory, 'bench.' + backend), 'n',
+        raw=True, durability=durability)
+    trie = MerkleDatabase(database)
+    addresses = []
+    timings = {}
+
+    try:
+        start = time.perf_counter()
+        for block in range(blocks):
+            updates = {}
+            for i in range(writes):
+                address = hashlib.sha512(
+                    '{}-{}'.format(block, i).encode()).hexdigest()[:70]
+                updates[address] = address.encode()
+                addresses.append(address)
+            trie.set_merkle_root(trie.update(updates, virtual=False))
+        timings['write'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for address in addresses:
+            trie.get(address)
+        timings['read'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        trie.get_multi(addresses)
+        timings['batch read'] = time.perf_counter() - start
+    finally:
+        database.close()
+
+    return timings
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backend', action='append',
+                        help='a backend to time; the default is every '
+                             'registered backend')
+    parser.add_argument('--blocks', type=int, default=20)
+    parser.add_argument('--writes', type=int, default=500,
+                        help='state writes per block')
+    parser.add_argument('--durability', choices=DURABILITY_MODES,
+                        default=DURABILITY_WRITE)
+    opts = parser.parse_args(args)
+
+    directory = tempfile.mkdtemp()
+    try:
+        print('{:<10}{:>12}{:>12}{:>12}'.format(
+            'backend', 'write (s)', 'read (s)', 'batch (s)'))
+        for backend in opts.backend or backend_names():
+            timings = _run(backend, directory, opts.blocks, opts.writes,
+                           opts.durability)
+            print('{:<10}{:>12.3f}{:>12.3f}{:>12.3f}'.format(
+                backend, timings['write'], timings['read'],
+                timings['batch read']))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,302 @@
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+import hashlib
+import os
+import shutil
+import tempfile
+from threading import Thread
+import unittest
+
+from sawtooth_validator.database.backends import backend_names
+from sawtooth_validator.database.backends import open_database
+from sawtooth_validator.database.dict_database import DictDatabase
+from sawtooth_validator.database.memory_database import DatabaseFullError
+from sawtooth_validator.database.memory_database import MemoryDatabase
+from sawtooth_validator.journal.block_store import BlockStore
+from sawtooth_validator.journal.block_wrapper import BlockWrapper
+from sawtooth_validator.protobuf.batch_pb2 import Batch
+from sawtooth_validator.protobuf.block_pb2 import Block
+from sawtooth_validator.protobuf.transaction_pb2 import Transaction
+from sawtooth_validator.state.merkle import MerkleDatabase
+
+
+class _BackendConformance(object):
+    """The behaviour every storage backend must share. Subclasses set
+    BACKEND to the name of a registered backend.
+    """
+
+    BACKEND = None
+    PERSISTENT = True
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.file = os.path.join(self.dir, 'test.' + self.BACKEND)
+        self.databases = []
+
+    def tearDown(self):
+        for database in self.databases:
+            database.close()
+        shutil.rmtree(self.dir)
+
+    def open(self, flag='c', raw=False, **options):
+        database = open_database(
+            self.BACKEND, self.file, flag, raw=raw, **options)
+        self.databases.append(database)
+        return database
+
+    def test_set_get(self):
+        """Tests that values are read back as written, encoded or raw, and
+        that a missing key reads as None.
+        """
+        database = self.open()
+        database.set('a', {'b': [1, 2]})
+        self.assertEqual({'b': [1, 2]}, database.get('a'))
+        self.assertIsNone(database.get('missing'))
+        self.assertIn('a', database)
+        self.assertNotIn('missing', database)
+
+        database.set('a', 'replaced')
+        self.assertEqual('replaced', database.get('a'))
+        self.assertEqual(1, len(database))
+
+    def test_keys_after(self):
+        """Tests that keys may be scanned in order, in bounded steps which
+        each start after the last key of the step before.
+        """
+        database = self.open(raw=True)
+        database.set_batch([(key, b'x') for key in ['d', 'b', 'e', 'a']])
+        database.delete('e')
+
+        self.assertEqual(['a', 'b'], database.keys_after(None, 2))
+        self.assertEqual(['d'], database.keys_after('b', 2))
+        self.assertEqual(['b', 'd'], database.keys_after('aa', 5))
+        self.assertEqual([], database.keys_after('d', 2))
+
+    def test_raw(self):
+        """Tests that raw values are stored as bytes, and that a mutable
+        value may be changed after it is written without changing the
+        stored value.
+        """
+        database = self.open(raw=True)
+        value = bytearray(b'raw')
+        database.set('a', value)
+        value[0] = 0
+
+        self.assertEqual(b'raw', database.get('a'))
+        self.assertIsInstance(database.get('a'), bytes)
+
+    def test_batches(self):
+        """Tests that set_batch applies deletes, ignoring keys which are
+        not present, and that get_batch returns the present keys in the
+        order requested.
+        """
+        database = self.open(raw=True)
+        database.set_batch([(str(i), str(i).encode()) for i in range(10)])
+        database.set_batch([('10', b'10')], ['3', '4', 'missing'])
+
+        self.assertEqual(9, len(database))
+        self.assertEqual(
+            sorted(str(i) for i in range(11) if i not in (3, 4)),
+            database.keys())
+        self.assertEqual(
+            [('9', b'9'), ('10', b'10'), ('0', b'0')],
+            database.get_batch(['9', '3', '10', 'missing', '0']))
+
+        database.delete('9')
+        self.assertNotIn('9', database)
+
+    def test_large_get_batch(self):
+        """Tests that get_batch returns every key of a batch larger than a
+        single query may hold.
+        """
+        database = self.open(raw=True)
+        pairs = [('{:04}'.format(i), b'x') for i in range(1200)]
+        database.set_batch(pairs)
+
+        self.assertEqual(pairs, database.get_batch(
+            [key for key, _ in pairs]))
+
+    def test_reopen(self):
+        """Tests that a database reopened with 'c' holds the data written
+        before it was closed, and that one opened with 'n' is empty.
+        """
+        if not self.PERSISTENT:
+            self.skipTest('{} is not persistent'.format(self.BACKEND))
+
+        database = self.open(flag='n')
+        database.set('a', 1)
+        database.sync()
+        database.close()
+        self.databases.remove(database)
+
+        self.assertEqual(1, self.open(flag='c').get('a'))
+        self.databases.pop().close()
+        self.assertEqual(0, len(self.open(flag='n')))
+
+    def test_concurrent_writers(self):
+        """Tests that writes from several threads are all applied.
+        """
+        database = self.open(raw=True)
+
+        def write(thread):
+            for i in range(50):
+                database.set_batch(
+                    [('{}-{}'.format(thread, i), b'v')])
+
+        threads = [Thread(target=write, args=(t,)) for t in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(200, len(database))
+
+    def test_merkle_root(self):
+        """Tests that a merkle trie kept in the backend has the same root
+        as one kept in a DictDatabase, and reads back its leaves.
+        """
+        items = {
+            hashlib.sha512(str(i).encode()).hexdigest()[:70]:
+                str(i).encode()
+            for i in range(200)}
+
+        expected = MerkleDatabase(DictDatabase()).update(
+            items, virtual=False)
+
+        trie = MerkleDatabase(self.open(raw=True))
+        root = trie.update(items, virtual=False)
+        self.assertEqual(expected, root)
+
+        trie.set_merkle_root(root)
+        self.assertEqual(items, dict(trie))
+
+    def test_sub_databases(self):
+        """Tests that sub databases have keyspaces of their own, and that
+        set_batches changes several of them in one write.
+        """
+        database = self.open()
+        first = database.sub_database('first')
+        second = database.sub_database('second')
+
+        first.set('a', b'1')
+        self.assertEqual(b'1', first.get('a'))
+        self.assertNotIn('a', second)
+        self.assertIsNone(database.get('a'))
+
+        database.set_batches([
+            (first, [('b', b'2')], ['a']),
+            (second, [('a', b'3'), ('c', b'4')], None)])
+
+        self.assertEqual(['b'], first.keys())
+        self.assertEqual(1, len(first))
+        self.assertEqual(
+            [('c', b'4'), ('a', b'3')], second.get_batch(['c', 'b', 'a']))
+
+        other = open_database(self.BACKEND, self.file + '-other', 'n')
+        self.databases.append(other)
+        with self.assertRaises(ValueError):
+            database.set_batches(
+                [(other.sub_database('first'), [('x', b'x')], None)])
+
+    def test_block_store(self):
+        """Tests that a block store kept in the backend indexes the batches
+        and transactions of the chain, and removes those of blocks replaced
+        by a fork.
+        """
+        block_store = BlockStore(self.open(flag='n'))
+
+        def block(block_id):
+            return BlockWrapper(Block(
+                header_signature=block_id,
+                batches=[Batch(
+                    header_signature='b-' + block_id,
+                    transactions=[Transaction(
+                        header_signature='t-' + block_id)])]))
+
+        self.assertIsNone(block_store.chain_head)
+        block_store.update_chain([block('B-1'), block('B-0')])
+
+        self.assertEqual('B-1', block_store.chain_head.identifier)
+        self.assertIn('B-0', block_store)
+        self.assertNotIn('b-B-0', block_store)
+        self.assertTrue(block_store.has_batch('b-B-0'))
+        self.assertFalse(block_store.has_batch('B-0'))
+        self.assertTrue(block_store.has_transaction('t-B-1'))
+        self.assertEqual(
+            'B-1', block_store.get_block_by_batch_id('b-B-1').identifier)
+        self.assertEqual(
+            'B-0',
+            block_store.get_block_by_transaction_id('t-B-0').identifier)
+        with self.assertRaises(KeyError):
+            block_store.get_block_by_batch_id('b-B-2')
+
+        block_store.update_chain([block('B-2')], [block('B-1')])
+
+        self.assertEqual('B-2', block_store.chain_head.identifier)
+        self.assertNotIn('B-1', block_store)
+        self.assertFalse(block_store.has_batch('b-B-1'))
+        self.assertFalse(block_store.has_transaction('t-B-1'))
+        self.assertTrue(block_store.has_transaction('t-B-2'))
+
+
+class TestLMDBBackend(_BackendConformance, unittest.TestCase):
+    BACKEND = 'lmdb'
+
+
+class TestSQLiteBackend(_BackendConformance, unittest.TestCase):
+    BACKEND = 'sqlite'
+
+
+class TestMemoryBackend(_BackendConformance, unittest.TestCase):
+    BACKEND = 'memory'
+    PERSISTENT = False
+
+    def test_max_size(self):
+        """Tests that a write which would take the database over its size
+        limit is rejected, and that none of it is applied.
+        """
+        database = MemoryDatabase(raw=True, max_size=100)
+        database.set('a', b'x' * 40)
+
+        with self.assertRaises(DatabaseFullError):
+            database.set_batch([('b', b'x' * 40), ('c', b'x' * 40)])
+        self.assertEqual([('a', b'x' * 40)], database.get_batch('abc'))
+        self.assertEqual(41, database.size)
+
+        # Deletes in the same batch make room for the adds
+        database.set_batch([('b', b'x' * 40), ('c', b'x' * 40)], ['a'])
+        self.assertEqual(['b', 'c'], database.keys())
+        self.assertEqual(82, database.size)
+
+    def test_size_in_bytes(self):
+        """Tests that keys are sized by their encoded length.
+        """
+        database = MemoryDatabase(raw=True)
+        database.set('\u00e9', b'x')
+        self.assertEqual(3, database.size)
+        database.delete('\u00e9')
+        self.assertEqual(0, database.size)
+
+
+class TestBackendRegistry(unittest.TestCase):
+    def test_registered(self):
+        """Tests that every built in backend is registered, and that
+        opening an unknown backend fails.
+        """
+        self.assertEqual(
+            ['lmdb', 'sqlite', 'memory'], backend_names()[:3])
+        with self.assertRaises(ValueError):
+            open_database('unknown', 'file', 'c')
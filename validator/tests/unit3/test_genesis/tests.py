@@ -46,8 +46,14 @@ class TestGenesisController(unittest.TestCase):
         shutil.rmtree(self._temp_dir)
 
     @staticmethod
-    def make_block_store(data=None):
-        return BlockStore(DictDatabase(data))
+    def make_block_store(chain_head_id=None, blocks=None):
+        block_db = DictDatabase()
+        if chain_head_id is not None:
+            block_db.sub_database('metadata').set(
+                'chain_head_id', chain_head_id.encode())
+        for block_id, block in (blocks or {}).items():
+            block_db.sub_database('blocks').set(block_id, block)
+        return BlockStore(block_db)
 
     def test_requires_genesis(self):
         self._with_empty_batch_file()
@@ -67,9 +73,7 @@ class TestGenesisController(unittest.TestCase):
         self.assertEqual(True, genesis_ctrl.requires_genesis())
 
     def test_does_not_require_genesis_block_exists(self):
-        block_store = self.make_block_store({
-            'chain_head_id': 'some_other_id'
-        })
+        block_store = self.make_block_store(chain_head_id='some_other_id')
 
         genesis_ctrl = GenesisController(
             Mock('context_manager'),
@@ -138,10 +142,9 @@ class TestGenesisController(unittest.TestCase):
         """
         self._with_empty_batch_file()
 
-        block_store = self.make_block_store({
-            'chain_head_id': 'some_other_id',
-            'some_other_id': b''
-        })
+        block_store = self.make_block_store(
+            chain_head_id='some_other_id',
+            blocks={'some_other_id': b''})
 
         genesis_ctrl = GenesisController(
             Mock('context_manager'),
@@ -16,12 +16,14 @@
 import logging
 import unittest
 import time
+from threading import Thread
 
 from sawtooth_signing import pbct as signing
 
 from sawtooth_validator.database.dict_database import DictDatabase
 
 from sawtooth_validator.journal.block_cache import BlockCache
+from sawtooth_validator.journal.block_store import BlockStore
 from sawtooth_validator.journal.block_wrapper import BlockStatus
 from sawtooth_validator.journal.block_wrapper import BlockWrapper
 
@@ -32,6 +34,8 @@ from sawtooth_validator.journal.publisher import BlockPublisher
 from sawtooth_validator.journal.timed_cache import TimedCache
 
 from sawtooth_validator.protobuf.batch_pb2 import Batch
+from sawtooth_validator.protobuf.block_pb2 import Block
+from sawtooth_validator.protobuf.block_pb2 import BlockHeader
 
 from sawtooth_validator.state.state_view import StateViewFactory
 
@@ -66,6 +70,116 @@ class TestBlockCache(unittest.TestCase):
             bc["test-missing"]
 
 
+def _make_chain(prefix, start, count, previous_block_id='0000000000000000'):
+    """Returns count blocks numbered from start, newest first, with ids
+    prefixed by prefix.
+    """
+    chain = []
+    for block_num in range(start, start + count):
+        block_id = '{}-{}'.format(prefix, block_num)
+        header = BlockHeader(
+            block_num=block_num, previous_block_id=previous_block_id)
+        chain.insert(0, BlockWrapper(Block(
+            header=header.SerializeToString(), header_signature=block_id)))
+        previous_block_id = block_id
+    return chain
+
+
+def _make_batch_block(block_id, block_num, previous_block_id, batch_ids):
+    """Returns a block holding empty batches with a set of ids.
+    """
+    header = BlockHeader(
+        block_num=block_num,
+        previous_block_id=previous_block_id,
+        batch_ids=batch_ids)
+    return BlockWrapper(Block(
+        header=header.SerializeToString(),
+        header_signature=block_id,
+        batches=[Batch(header_signature=b) for b in batch_ids]))
+
+
+class TestBlockStore(unittest.TestCase):
+    def setUp(self):
+        self.block_store = BlockStore(DictDatabase())
+        self.chain = _make_chain('A', 0, 10)
+        self.block_store.update_chain(self.chain)
+
+    def test_get_blocks_by_num(self):
+        """Tests that blocks of the current chain are read by number, in
+        the order requested, and that missing numbers are omitted.
+        """
+        self.assertEqual(
+            'A-3', self.block_store.get_block_by_num(3).identifier)
+        with self.assertRaises(KeyError):
+            self.block_store.get_block_by_num(10)
+
+        self.assertEqual(
+            ['A-9', 'A-8', 'A-7'],
+            [b.identifier for b in
+             self.block_store.get_blocks_by_num(range(12, 6, -1))])
+
+    def test_fork_switch(self):
+        """Tests that switching to a fork updates the block number index,
+        including removing numbers beyond the end of a shorter fork.
+        """
+        fork = _make_chain('B', 6, 2, previous_block_id='A-5')
+        self.block_store.update_chain(fork, self.chain[:4])
+
+        self.assertEqual(
+            ['B-7', 'B-6', 'A-5'],
+            [b.identifier for b in
+             self.block_store.get_blocks_by_num(range(9, 4, -1))])
+
+    def test_get_chain(self):
+        """Tests that get_chain yields every block from a head back to
+        genesis, for the head of the current chain, a block within it, and
+        the head of a fork which is not the current chain.
+        """
+        self.assertEqual(
+            [b.identifier for b in self.chain],
+            [b.identifier for b in
+             self.block_store.get_chain('A-9', batch_size=3)])
+        self.assertEqual(
+            ['A-2', 'A-1', 'A-0'],
+            [b.identifier for b in self.block_store.get_chain('A-2')])
+
+        fork = _make_chain('B', 4, 3, previous_block_id='A-3')
+        for block in fork:
+            self.block_store[block.identifier] = block
+        self.assertEqual(
+            ['B-6', 'B-5', 'B-4', 'A-3', 'A-2', 'A-1', 'A-0'],
+            [b.identifier for b in
+             self.block_store.get_chain('B-6', batch_size=2)])
+
+        self.assertEqual([], list(self.block_store.get_chain('missing')))
+
+    def test_wait_for_batch_commits(self):
+        """Tests that a client waiting on a set of batches is only woken once
+        all of them are committed, that batches which are already committed
+        do not wait, and that waiting on a missing batch times out.
+        """
+        results = []
+        waiter = Thread(target=lambda: results.append(
+            self.block_store.wait_for_batch_commits(
+                ['b-1', 'b-2'], timeout=10)))
+        waiter.start()
+
+        self.block_store.update_chain(
+            [_make_batch_block('A-10', 10, 'A-9', ['b-1'])])
+        waiter.join(0.5)
+        self.assertTrue(waiter.is_alive())
+
+        self.block_store.update_chain(
+            [_make_batch_block('A-11', 11, 'A-10', ['b-2', 'b-3'])])
+        waiter.join(5)
+        self.assertEqual([True], results)
+
+        self.assertTrue(
+            self.block_store.wait_for_batch_commits(['b-1'], timeout=1))
+        self.assertFalse(
+            self.block_store.wait_for_batch_commits(['missing'], timeout=0.1))
+
+
 class TestBlockPublisher(unittest.TestCase):
     def setUp(self):
         self.blocks = BlockTreeManager()
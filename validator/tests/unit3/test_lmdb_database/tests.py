@@ -0,0 +1,265 @@
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+import os
+import shutil
+import tempfile
+from threading import Event
+from threading import Thread
+import unittest
+from unittest import mock
+
+from sawtooth_validator.database.dict_database import DictDatabase
+from sawtooth_validator.database.lmdb_nolock_database import \
+    LMDBNoLockDatabase
+from sawtooth_validator.database.lmdb_nolock_database import \
+    _GroupCommitter
+from sawtooth_validator.journal.block_store import BlockStore
+from sawtooth_validator.journal.block_wrapper import BlockWrapper
+from sawtooth_validator.protobuf.block_pb2 import Block
+
+
+class TestLMDBNoLockDatabaseBulkLoad(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.file = os.path.join(self.dir, 'bulk.lmdb')
+        self.database = LMDBNoLockDatabase(self.file, 'n', raw=True)
+
+    def tearDown(self):
+        self.database.close()
+        shutil.rmtree(self.dir)
+
+    def reopen(self):
+        self.database.close()
+        self.database = LMDBNoLockDatabase(self.file, 'c', raw=True)
+
+    def test_bulk_load(self):
+        """Tests that writes within a bulk load are visible to reads within
+        it, and are all kept when it ends, across periodic commits.
+        """
+        with self.database.bulk_load(commit_size=1000):
+            for i in range(100):
+                self.database.set('{:04}'.format(i), b'x' * 50)
+            self.database.set_batch(
+                [('{:04}'.format(i), b'y') for i in range(100, 200)],
+                ['0000'])
+
+            self.assertEqual(b'x' * 50, self.database.get('0001'))
+            self.assertNotIn('0000', self.database)
+            self.assertEqual(199, len(self.database))
+
+        self.reopen()
+        self.assertEqual(199, len(self.database))
+        self.assertEqual(b'y', self.database.get('0150'))
+
+    def test_bulk_load_error(self):
+        """Tests that a bulk load ending with an exception discards the
+        writes made since its last periodic commit, and that the database
+        may be used normally afterwards.
+        """
+        with self.assertRaises(RuntimeError):
+            with self.database.bulk_load(commit_size=1000):
+                for i in range(8):
+                    self.database.set('{:04}'.format(i), b'x' * 200)
+                raise RuntimeError()
+
+        # the first commit was after the fifth write
+        self.assertEqual(
+            ['{:04}'.format(i) for i in range(5)],
+            self.database.keys())
+
+        self.database.set('later', b'z')
+        self.assertEqual(b'z', self.database.get('later'))
+
+    def test_bulk_load_append(self):
+        """Tests that appending keys in order succeeds, and that appending a
+        key lower than those already in the database fails.
+        """
+        self.database.set('b', b'1')
+
+        with self.database.bulk_load(append=True):
+            self.database.set_batch([('c', b'2'), ('d', b'3')])
+
+        self.assertEqual(['b', 'c', 'd'], self.database.keys())
+
+        with self.assertRaises(ValueError):
+            with self.database.bulk_load(append=True):
+                self.database.set('a', b'0')
+
+        self.assertNotIn('a', self.database)
+
+
+class TestLMDBNoLockDatabaseReadSession(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.database = LMDBNoLockDatabase(
+            os.path.join(self.dir, 'session.lmdb'), 'n')
+        self.database.set_batch([('a', 1), ('b', 2)])
+
+    def tearDown(self):
+        self.database.close()
+        shutil.rmtree(self.dir)
+
+    def test_read_session(self):
+        """Tests that reads within a session, including a nested session,
+        see the database as it was when the session began, while other
+        threads continue to see the latest writes.
+        """
+        with self.database.read_session():
+            self.assertEqual(1, self.database.get('a'))
+            self.assertIn('b', self.database)
+            self.assertIsNone(self.database.get('c'))
+
+            writer = Thread(
+                target=lambda: self.database.set_batch([('c', 3)]))
+            writer.start()
+            writer.join()
+
+            with self.database.read_session():
+                self.assertNotIn('c', self.database)
+                self.assertEqual(
+                    [('a', 1), ('b', 2)],
+                    self.database.get_batch(['a', 'b', 'c']))
+
+            seen = []
+            reader = Thread(target=lambda: seen.append(
+                self.database.get('c')))
+            reader.start()
+            reader.join()
+            self.assertEqual([3], seen)
+
+        self.assertEqual(3, self.database.get('c'))
+
+
+class _MockEnvironment(object):
+    def __init__(self):
+        self.syncs = 0
+        self.synced = Event()
+
+    def sync(self, force=False):
+        if force:
+            self.syncs += 1
+            self.synced.set()
+
+
+class _MockStateDatabase(DictDatabase):
+    def __init__(self, block_db):
+        super().__init__()
+        self._block_db = block_db
+        self.synced_before = []
+
+    def sync(self):
+        self.synced_before.append(len(self._block_db))
+
+
+class TestLMDBNoLockDatabaseDurability(unittest.TestCase):
+    def test_group_commit_writes(self):
+        """Tests that a group commit syncs once enough writes have been
+        made, well before its interval has passed.
+        """
+        env = _MockEnvironment()
+        committer = _GroupCommitter(env, interval=60, max_writes=3)
+        try:
+            committer.written()
+            committer.written()
+            self.assertFalse(env.synced.wait(0.1))
+
+            committer.written()
+            self.assertTrue(env.synced.wait(5))
+            self.assertEqual(1, env.syncs)
+        finally:
+            committer.stop()
+
+    def test_group_commit_interval(self):
+        """Tests that a group commit syncs a single write once its interval
+        has passed, and does not sync while there are no writes.
+        """
+        env = _MockEnvironment()
+        committer = _GroupCommitter(env, interval=0.05, max_writes=100)
+        try:
+            self.assertFalse(env.synced.wait(0.2))
+
+            committer.written()
+            self.assertTrue(env.synced.wait(5))
+            self.assertEqual(1, env.syncs)
+        finally:
+            committer.stop()
+
+    def test_group_database(self):
+        """Tests that a database in group mode keeps its writes when closed.
+        """
+        directory = tempfile.mkdtemp()
+        filename = os.path.join(directory, 'group.lmdb')
+        try:
+            database = LMDBNoLockDatabase(
+                filename, 'n', durability='group')
+            for i in range(10):
+                database.set(str(i), i)
+            database.close()
+
+            database = LMDBNoLockDatabase(filename, 'c')
+            self.assertEqual(10, len(database))
+            database.close()
+        finally:
+            shutil.rmtree(directory)
+
+    @mock.patch('sawtooth_validator.database.lmdb_nolock_database.lmdb')
+    def test_forced_syncs(self, mock_lmdb):
+        """Tests that LMDB never syncs commits itself, and that each write
+        forces a synchronous flush in write mode, while in block mode only
+        syncing the database does.
+        """
+        env = mock_lmdb.Environment.return_value
+
+        database = LMDBNoLockDatabase('write.lmdb', 'c', durability='write')
+        self.assertFalse(mock_lmdb.Environment.call_args[1]['sync'])
+        database.set('a', 1)
+        database.set_batch([('b', 2)])
+        database.delete('a')
+        self.assertEqual([mock.call(True)] * 3, env.sync.call_args_list)
+
+        env.reset_mock()
+        database = LMDBNoLockDatabase('block.lmdb', 'c', durability='block')
+        self.assertFalse(mock_lmdb.Environment.call_args[1]['sync'])
+        database.set('a', 1)
+        database.set_batch([('b', 2)])
+        database.delete('a')
+        env.sync.assert_not_called()
+
+        database.sync()
+        env.sync.assert_called_once_with(True)
+
+        database.close()
+        self.assertEqual([mock.call(True)] * 2, env.sync.call_args_list)
+
+    def test_unknown_durability(self):
+        with self.assertRaises(ValueError):
+            LMDBNoLockDatabase(
+                os.path.join(tempfile.mkdtemp(), 'bad.lmdb'), 'n',
+                durability='never')
+
+    def test_block_store_syncs_state(self):
+        """Tests that the block store syncs the state database before each
+        change to the chain is written.
+        """
+        block_db = DictDatabase()
+        state_db = _MockStateDatabase(block_db)
+        block_store = BlockStore(block_db, state_db=state_db)
+
+        block = BlockWrapper(Block(header_signature='B-0'))
+        block_store.update_chain([block])
+
+        self.assertEqual([0], state_db.synced_before)
+        self.assertEqual('B-0', block_store.chain_head.identifier)
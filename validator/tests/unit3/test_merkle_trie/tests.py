@@ -13,14 +13,20 @@
 # limitations under the License.
 # ------------------------------------------------------------------------------
 
+from concurrent.futures import ThreadPoolExecutor
 import os
 import unittest
 import random
 import tempfile
 from string import ascii_lowercase
 
+import cbor
+
 from sawtooth_validator.state.merkle import MerkleDatabase
+from sawtooth_validator.state.merkle import StateHashPool
+from sawtooth_validator.state.node_cache import NodeCache
 from sawtooth_validator.database import lmdb_nolock_database
+from sawtooth_validator.database.migrate import migrate_to_raw
 
 
 class TestSawtoothMerkleTrie(unittest.TestCase):
@@ -119,6 +125,240 @@ class TestSawtoothMerkleTrie(unittest.TestCase):
             self.assert_value_at_address(
                 address, value, ishash=True)
 
+    def test_merkle_trie_parallel_update(self):
+        """Tests that updates rehashed on thread and process pools produce
+        the same root and nodes as a serial update, and as setting each
+        address in turn.
+        """
+        set_items = {
+            _hash(key): {key: _random_string(10)} for key in
+            (_random_string(10) for _ in range(200))
+        }
+
+        serial_root = self.update(set_items, virtual=True)
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            self.assertEqual(
+                serial_root,
+                self.trie.update(set_items, virtual=True, executor=executor))
+
+        pool = StateHashPool(workers=2)
+        try:
+            parallel_root = self.trie.update(
+                set_items, virtual=False, executor=pool)
+        finally:
+            pool.shutdown()
+        self.assertEqual(serial_root, parallel_root)
+
+        for address, value in set_items.items():
+            self.set_merkle_root(self.set(address, value, ishash=True))
+        self.assert_root(parallel_root)
+
+    def test_merkle_trie_get_multi(self):
+        """Tests that get_multi returns the same values as get for each
+        address, in the order given, and None for addresses without values.
+        """
+        set_items = {
+            _hash(key): {key: _random_string(10)} for key in
+            (_random_string(10) for _ in range(100))
+        }
+        # addresses sharing a long prefix with the existing ones
+        for address in random.sample(list(set_items), 10):
+            set_items[address[:-2] + 'ff'] = {address: 'sibling'}
+
+        self.set_merkle_root(self.update(set_items, virtual=False))
+
+        missing = [_hash('missing'), list(set_items)[0][:-2] + 'zz']
+        addresses = list(set_items) + missing
+        random.shuffle(addresses)
+
+        results = self.trie.get_multi(addresses)
+
+        self.assertEqual(addresses, [address for address, _ in results])
+        for address, value in results:
+            if address in missing:
+                self.assertIsNone(value)
+            else:
+                self.assertEqual(set_items[address], value)
+
+    def test_merkle_trie_iter_leaves(self):
+        """Tests that iter_leaves yields the leaves under a prefix in
+        address order, and pages through them with start and limit.
+        """
+        set_items = {
+            _hash(key): {key: key} for key in
+            (_random_string(10) for _ in range(200))
+        }
+        self.set_merkle_root(self.update(set_items, virtual=False))
+
+        addresses = sorted(set_items)
+        self.assertEqual(
+            addresses,
+            [address for address, _ in self.trie.iter_leaves()])
+
+        for prefix in ('', addresses[0][:1], addresses[0][:2],
+                       addresses[0][:3], addresses[0]):
+            expected = {
+                address: value for address, value in set_items.items()
+                if address.startswith(prefix)}
+            self.assertEqual(expected, self.trie.leaves(prefix))
+
+        self.assertEqual({}, self.trie.leaves('zz'))
+
+        # page through the leaves, restarting after each page's last address
+        paged = []
+        start = None
+        while True:
+            page = list(self.trie.iter_leaves(start=start, limit=30))
+            if start is not None:
+                self.assertEqual(start, page[0][0])
+                page = page[1:]
+            paged.extend(page)
+            if len(page) < 29:
+                break
+            start = page[-1][0]
+
+        self.assertEqual(addresses, [address for address, _ in paged])
+
+        # a start between addresses begins at the next address
+        start = addresses[100][:-1] + 'z'
+        self.assertEqual(
+            addresses[101:104],
+            [address for address, _ in
+             self.trie.iter_leaves(start=start, limit=3)])
+
+    def test_merkle_trie_get_proof(self):
+        """Tests that get_proof returns each node on the addresses' paths
+        once, starting with the root, and that following the children's
+        hashes through the proof leads to each address's value.
+        """
+        set_items = {
+            _hash(key): {key: key} for key in
+            (_random_string(10) for _ in range(100))
+        }
+        self.set_merkle_root(self.update(set_items, virtual=False))
+
+        addresses = random.sample(list(set_items), 10)
+        missing = _hash('missing')
+        proof = self.trie.get_proof(addresses + [missing])
+
+        by_hash = {MerkleDatabase.hash(packed): packed for packed in proof}
+        self.assertEqual(len(proof), len(by_hash))
+        self.assertEqual(
+            self.get_merkle_root(),
+            MerkleDatabase.hash(proof[0]))
+
+        def walk(address):
+            node = cbor.loads(by_hash[self.get_merkle_root()])
+            for i in range(0, len(address), 2):
+                child = node['c'].get(address[i:i + 2])
+                if child is None:
+                    return None
+                node = cbor.loads(by_hash[child])
+            return cbor.loads(node['v'])
+
+        for address in addresses:
+            self.assertEqual(set_items[address], walk(address))
+        self.assertIsNone(walk(missing))
+
+    def test_merkle_trie_diff(self):
+        """Tests that diff yields the added, changed and deleted leaves
+        between two roots in address order, and nothing for equal roots.
+        """
+        set_items = {
+            _hash(key): {key: key} for key in
+            (_random_string(10) for _ in range(50))
+        }
+        root_a = self.update(set_items, virtual=False)
+
+        addresses = sorted(set_items)
+        changed = addresses[:5]
+        deleted = addresses[5:10]
+        added = [_hash(_random_string(10)) for _ in range(5)]
+
+        self.set_merkle_root(root_a)
+        for address in deleted:
+            self.set_merkle_root(self.delete(address, ishash=True))
+        root_b = self.update(
+            dict(
+                [(address, 'changed') for address in changed] +
+                [(address, 'added') for address in added]),
+            virtual=False)
+
+        expected = sorted(
+            [(address, set_items[address], 'changed')
+             for address in changed] +
+            [(address, set_items[address], None) for address in deleted] +
+            [(address, None, 'added') for address in added])
+
+        self.assertEqual(expected, list(self.trie.diff(root_a, root_b)))
+        self.assertEqual([], list(self.trie.diff(root_b, root_b)))
+
+        # a None root is the empty state
+        self.assertEqual(
+            [(address, None, set_items[address]) for address in addresses],
+            list(self.trie.diff(None, root_a)))
+
+        prefix = changed[0][:2]
+        self.assertEqual(
+            [change for change in expected if change[0].startswith(prefix)],
+            list(self.trie.diff(root_a, root_b, prefix)))
+
+    def test_merkle_trie_node_cache(self):
+        """Tests that decoded nodes are shared between the MerkleDatabases
+        reading from the same database, and that reads of cached nodes are
+        counted as hits.
+        """
+        value = {'name': 'foo', 'value': 1}
+        new_root = self.set('foo', value)
+        self.set_merkle_root(new_root)
+
+        cache = self.trie.node_cache
+        self.assert_value_at_address('foo', value)
+        misses = cache.misses
+
+        other_trie = MerkleDatabase(self.lmdb, new_root)
+        self.assertIs(cache, other_trie.node_cache)
+
+        hits = cache.hits
+        self.assertEqual(
+            other_trie.get(_hash('foo')),
+            value)
+        self.assertGreater(cache.hits, hits)
+        self.assertEqual(cache.misses, misses)
+
+        # writes through a cached node must not alter the cached copy
+        cached_root = cache.get(new_root)
+        self.set('bar', value)
+        self.assertEqual(cached_root, cache.get(new_root))
+        self.assert_value_at_address('foo', value)
+
+    def test_node_cache_eviction(self):
+        """Tests that the NodeCache evicts the least recently used nodes
+        once the total size of its nodes exceeds the bound.
+        """
+        cache = NodeCache(max_size=100)
+        cache.put('a', {'v': None, 'c': {}}, 40)
+        cache.put('b', {'v': None, 'c': {}}, 40)
+
+        # touch 'a' so that 'b' is the least recently used
+        self.assertIsNotNone(cache.get('a'))
+
+        cache.put('c', {'v': None, 'c': {}}, 40)
+
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertIn('c', cache)
+        self.assertEqual(80, cache.size)
+
+        # a node larger than the whole cache is never held
+        cache.put('d', {'v': None, 'c': {}}, 101)
+        self.assertNotIn('d', cache)
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(1, cache.hits)
+        self.assertEqual(1, cache.misses)
+
     # assertions
 
     def assert_value_at_address(self, address, value, ishash=False):
@@ -172,6 +412,43 @@ class TestSawtoothMerkleTrie(unittest.TestCase):
         return self.trie.update(items, virtual)
 
 
+class TestSawtoothMerkleTrieRaw(TestSawtoothMerkleTrie):
+    """Runs the merkle trie tests against a database in raw mode.
+    """
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.file = os.path.join(self.dir, 'merkle.lmdb')
+
+        self.lmdb = lmdb_nolock_database.LMDBNoLockDatabase(
+            self.file,
+            'n',
+            raw=True)
+
+        self.trie = MerkleDatabase(self.lmdb)
+
+    def test_merkle_trie_migrate_to_raw(self):
+        """Tests that a database written in CBOR mode is readable in raw
+        mode after migration, at the same merkle root.
+        """
+        cbor_file = os.path.join(self.dir, 'merkle-cbor.lmdb')
+        cbor_db = lmdb_nolock_database.LMDBNoLockDatabase(cbor_file, 'n')
+        cbor_trie = MerkleDatabase(cbor_db)
+
+        values = {_hash(key): {key: key} for key in ('foo', 'bar', 'baz')}
+        root = cbor_trie.update(values, virtual=False)
+        cbor_db.close()
+
+        raw_file = os.path.join(self.dir, 'merkle-raw.lmdb')
+        migrate_to_raw(cbor_file, raw_file, batch_size=2)
+
+        raw_db = lmdb_nolock_database.LMDBNoLockDatabase(
+            raw_file, 'c', raw=True)
+        raw_trie = MerkleDatabase(raw_db, root)
+        for address, value in values.items():
+            self.assertEqual(value, raw_trie.get(address))
+        raw_db.close()
+
+
 def _hash(key):
     return MerkleDatabase.hash(key.encode())
 
@@ -0,0 +1,356 @@
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+"""Times each scheduler on synthetic workloads, without ZMQ or real
+transaction processors, and checks that they all reach the same state.
+
+Transactions are run in-process by a pool of worker threads, which stand
+in for transaction processors, against a ContextManager on a DictDatabase.
+
+Usage:
+    PYTHONPATH=signing:core:validator \
+        python3 validator/tests/unit3/test_scheduler/benchmark.py
+"""
+
+import argparse
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import queue
+import random
+import sys
+import threading
+import time
+
+import sawtooth_validator.protobuf.batch_pb2 as batch_pb2
+import sawtooth_validator.protobuf.transaction_pb2 as transaction_pb2
+
+from sawtooth_validator.database.dict_database import DictDatabase
+from sawtooth_validator.execution.context_manager import ContextManager
+from sawtooth_validator.execution.scheduler_parallel import \
+    ParallelScheduler
+from sawtooth_validator.execution.scheduler_serial import SerialScheduler
+
+
+# Each scheduler, created from a ContextManager and the first state root
+SCHEDULERS = OrderedDict([
+    ('serial', lambda context_manager, state_root: SerialScheduler(
+        context_manager.get_squash_handler(), state_root)),
+    ('parallel', lambda context_manager, state_root: ParallelScheduler(
+        context_manager.get_squash_handler(), state_root,
+        delete_handler=context_manager.delete_context)),
+])
+
+# Transactions with this payload prefix fail when they are run
+FAIL_PREFIX = b'fail'
+
+
+def _address(name):
+    return hashlib.sha512(name.encode()).hexdigest()[:70]
+
+
+def _make_transaction(payload, inputs, outputs):
+    header = transaction_pb2.TransactionHeader(
+        family_name='scheduler_benchmark',
+        family_version='1.0',
+        inputs=inputs,
+        outputs=outputs,
+        payload_encoding='application/octet-stream',
+        payload_sha512=hashlib.sha512(payload).hexdigest())
+    header_bytes = header.SerializeToString()
+
+    return transaction_pb2.Transaction(
+        header=header_bytes,
+        payload=payload,
+        header_signature=hashlib.sha512(header_bytes).hexdigest())
+
+
+def _make_batch(transactions):
+    header_bytes = batch_pb2.BatchHeader(
+        transaction_ids=[t.header_signature for t in transactions]
+    ).SerializeToString()
+
+    return batch_pb2.Batch(
+        header=header_bytes,
+        transactions=transactions,
+        header_signature=hashlib.sha512(header_bytes).hexdigest())
+
+
+def _make_workload(rand, batches, address_sets, fail_rate=0.0):
+    """Makes a list of batches of one to three transactions, each of which
+    reads and writes a set of addresses from address_sets(). A transaction
+    fails if a random draw falls under fail_rate.
+    """
+    workload = []
+    for b in range(batches):
+        transactions = []
+        for t in range(rand.randint(1, 3)):
+            payload = '{}-{}'.format(b, t).encode()
+            if rand.random() < fail_rate:
+                payload = FAIL_PREFIX + payload
+            inputs, outputs = address_sets()
+            transactions.append(_make_transaction(payload, inputs, outputs))
+        workload.append(_make_batch(transactions))
+    return workload
+
+
+def disjoint_workload(batches, seed=0):
+    """Every transaction reads and writes addresses of its own.
+    """
+    rand = random.Random(seed)
+    names = iter(range(sys.maxsize))
+
+    def address_sets():
+        addresses = [_address(str(next(names))) for _ in range(2)]
+        return addresses, addresses
+
+    return _make_workload(rand, batches, address_sets)
+
+
+def contention_workload(batches, seed=0, hot_keys=4):
+    """Every transaction reads one of a few hot addresses, and most write
+    one as well, along with an address of its own.
+    """
+    rand = random.Random(seed)
+    names = iter(range(sys.maxsize))
+    hot = [_address('hot-{}'.format(i)) for i in range(hot_keys)]
+
+    def address_sets():
+        own = _address(str(next(names)))
+        inputs = [rand.choice(hot), own]
+        if rand.random() < 0.75:
+            return inputs, [rand.choice(hot), own]
+        return inputs, [own]
+
+    return _make_workload(rand, batches, address_sets)
+
+
+def prefix_workload(batches, seed=0, keys=64):
+    """Every transaction touches addresses which share all but their last
+    few characters, so they sit deep in one branch of the predecessor tree,
+    and some of them collide.
+    """
+    rand = random.Random(seed)
+    prefix = _address('prefix')[:64]
+    addresses = [prefix + '{:06x}'.format(i) for i in range(keys)]
+
+    def address_sets():
+        chosen = rand.sample(addresses, 3)
+        return chosen, chosen[1:]
+
+    return _make_workload(rand, batches, address_sets)
+
+
+def failing_workload(batches, seed=0, keys=32):
+    """Transactions share a small set of addresses, and a fifth of them
+    fail, so later batches depend on the state of batches which failed.
+    """
+    rand = random.Random(seed)
+    addresses = [_address('key-{}'.format(i)) for i in range(keys)]
+
+    def address_sets():
+        chosen = rand.sample(addresses, 2)
+        return chosen, chosen[1:]
+
+    return _make_workload(rand, batches, address_sets, fail_rate=0.2)
+
+
+WORKLOADS = OrderedDict([
+    ('disjoint', disjoint_workload),
+    ('contention', contention_workload),
+    ('prefix', prefix_workload),
+    ('failing', failing_workload),
+])
+
+
+class FakeExecutor(object):
+    """Runs a scheduler's transactions on a pool of worker threads.
+
+    Each transaction sets every one of its outputs to a hash of its payload
+    and the values of its inputs, unless its payload starts with
+    FAIL_PREFIX, in which case it fails.
+
+    Args:
+        context_manager (ContextManager): the context manager to run the
+            transactions in.
+        workers (int): the number of transactions which may run at once.
+        latency (float): seconds each transaction takes, standing in for
+            the round trip to a transaction processor.
+    """
+    def __init__(self, context_manager, workers=4, latency=0.0):
+        self._context_manager = context_manager
+        self._workers = workers
+        self._latency = latency
+
+        self._lock = threading.Lock()
+        self._overhead = 0.0
+
+    def run(self, scheduler, batches):
+        """Adds the batches to the scheduler and runs all of their
+        transactions.
+
+        Returns:
+            tuple: the number of transactions run, the seconds taken, and
+                the seconds spent in calls to the scheduler
+        """
+        self._overhead = 0.0
+        finished = queue.Queue()
+        in_flight = 0
+        count = 0
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self._workers) as pool:
+            for batch in batches:
+                self._timed(scheduler.add_batch, batch)
+            self._timed(scheduler.finalize)
+
+            while not scheduler.complete(block=False):
+                txn_info = self._timed(scheduler.next_transaction)
+                if txn_info is not None:
+                    in_flight += 1
+                    count += 1
+                    pool.submit(self._execute, scheduler, txn_info, finished)
+                    continue
+
+                if in_flight == 0:
+                    raise AssertionError(
+                        'Scheduler is incomplete, with no transactions '
+                        'running or ready to run')
+                finished.get()
+                in_flight -= 1
+
+        return count, time.perf_counter() - start, self._overhead
+
+    def _timed(self, method, *args):
+        start = time.perf_counter()
+        result = method(*args)
+        with self._lock:
+            self._overhead += time.perf_counter() - start
+        return result
+
+    def _execute(self, scheduler, txn_info, finished):
+        try:
+            header = transaction_pb2.TransactionHeader()
+            header.ParseFromString(txn_info.txn.header)
+            context_id = self._context_manager.create_context(
+                state_hash=txn_info.state_hash,
+                base_contexts=txn_info.base_context_ids,
+                inputs=list(header.inputs),
+                outputs=list(header.outputs))
+
+            if self._latency:
+                time.sleep(self._latency)
+
+            if txn_info.txn.payload.startswith(FAIL_PREFIX):
+                self._context_manager.delete_context([context_id])
+                self._timed(
+                    scheduler.set_transaction_execution_result,
+                    txn_info.txn.header_signature, False, None)
+                return
+
+            value = hashlib.sha256(txn_info.txn.payload)
+            for _, input_value in self._context_manager.get(
+                    context_id, list(header.inputs)):
+                value.update(input_value or b'')
+            self._context_manager.set(
+                context_id,
+                [{address: value.digest()} for address in header.outputs])
+            self._timed(
+                scheduler.set_transaction_execution_result,
+                txn_info.txn.header_signature, True, context_id)
+        finally:
+            finished.put(txn_info)
+
+
+def run_scheduler(name, batches, workers=4, latency=0.0):
+    """Runs a workload through a fresh scheduler and state.
+
+    Returns:
+        dict: the number of transactions run, the seconds taken and spent
+            in the scheduler, the final state root, and whether each batch
+            was valid
+    """
+    context_manager = ContextManager(DictDatabase())
+    first_state_root = context_manager.get_first_root()
+    scheduler = SCHEDULERS[name](context_manager, first_state_root)
+
+    count, elapsed, overhead = FakeExecutor(
+        context_manager, workers=workers, latency=latency).run(
+            scheduler, batches)
+
+    state_root = first_state_root
+    valid = []
+    for batch in batches:
+        result = scheduler.get_batch_execution_result(
+            batch.header_signature)
+        valid.append(result.is_valid)
+        if result.is_valid:
+            state_root = result.state_hash
+
+    return {
+        'transactions': count,
+        'elapsed': elapsed,
+        'overhead': overhead,
+        'state_root': state_root,
+        'valid': valid,
+    }
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scheduler', action='append',
+                        choices=list(SCHEDULERS),
+                        help='a scheduler to time; the default is all of '
+                             'them')
+    parser.add_argument('--workload', action='append',
+                        choices=list(WORKLOADS),
+                        help='a workload to run; the default is all of them')
+    parser.add_argument('--batches', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=8,
+                        help='transactions which may run at once')
+    parser.add_argument('--latency', type=float, default=1.0,
+                        help='milliseconds each transaction takes to run')
+    parser.add_argument('--seed', type=int, default=0)
+    opts = parser.parse_args(args)
+
+    mismatched = []
+    print('{:<12}{:<12}{:>8}{:>12}{:>16}'.format(
+        'workload', 'scheduler', 'txns', 'txns/s', 'overhead (us)'))
+    for workload in opts.workload or WORKLOADS:
+        batches = WORKLOADS[workload](opts.batches, seed=opts.seed)
+        results = OrderedDict()
+        for scheduler in opts.scheduler or SCHEDULERS:
+            result = run_scheduler(
+                scheduler, batches, workers=opts.workers,
+                latency=opts.latency / 1000)
+            results[scheduler] = result
+            print('{:<12}{:<12}{:>8}{:>12.1f}{:>16.1f}'.format(
+                workload, scheduler, result['transactions'],
+                result['transactions'] / result['elapsed'],
+                result['overhead'] / result['transactions'] * 1e6))
+
+        outcomes = {(r['state_root'], tuple(r['valid']))
+                    for r in results.values()}
+        if len(outcomes) > 1:
+            mismatched.append(workload)
+
+    if mismatched:
+        print('Schedulers reached different states on: {}'.format(
+            ', '.join(mismatched)), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -26,22 +26,33 @@ import sawtooth_validator.protobuf.transaction_pb2 as transaction_pb2
 from sawtooth_validator.execution.context_manager import ContextManager
 from sawtooth_validator.execution.scheduler_serial import SerialScheduler
 from sawtooth_validator.database import dict_database
+from sawtooth_validator.execution.scheduler_parallel import \
+    ParallelScheduler
 from sawtooth_validator.execution.scheduler_parallel import PredecessorTree
 
+from test_scheduler.benchmark import SCHEDULERS
+from test_scheduler.benchmark import WORKLOADS
+from test_scheduler.benchmark import run_scheduler
+
 
 LOGGER = logging.getLogger(__name__)
 
 
-def create_transaction(name, private_key, public_key):
+def create_address(name):
+    return '000000' + hashlib.sha512(name.encode()).hexdigest()
+
+
+def create_transaction(name, private_key, public_key, inputs=None,
+                       outputs=None):
     payload = name
-    addr = '000000' + hashlib.sha512(name.encode()).hexdigest()
+    addr = create_address(name)
 
     header = transaction_pb2.TransactionHeader(
         signer_pubkey=public_key,
         family_name='scheduler_test',
         family_version='1.0',
-        inputs=[addr],
-        outputs=[addr],
+        inputs=[addr] if inputs is None else inputs,
+        outputs=[addr] if outputs is None else outputs,
         dependencies=[],
         payload_encoding="application/cbor",
         payload_sha512=hashlib.sha512(payload.encode()).hexdigest(),
@@ -446,6 +457,240 @@ class TestSerialScheduler(unittest.TestCase):
         self.assertIsNone(batch2_result.state_hash)
 
 
+class TestParallelScheduler(unittest.TestCase):
+    def setUp(self):
+        self.private_key = signing.generate_privkey()
+        self.public_key = signing.generate_pubkey(self.private_key)
+
+    def create_batch(self, *txn_specs):
+        """Creates a batch of transactions from (name, inputs, outputs)
+        tuples, where the inputs and outputs are names of addresses.
+        """
+        txns = [
+            create_transaction(
+                name=name,
+                private_key=self.private_key,
+                public_key=self.public_key,
+                inputs=[create_address(i) for i in inputs],
+                outputs=[create_address(o) for o in outputs])
+            for name, inputs, outputs in txn_specs]
+        return create_batch(
+            transactions=txns,
+            private_key=self.private_key,
+            public_key=self.public_key)
+
+    def test_independent_batches(self):
+        """Tests that the transactions of independent batches are returned
+        at once, and that a batch which depends on another is not returned
+        until the other has been applied.
+
+        Batches 'a' and 'b' write different addresses, and batch 'c' reads
+        the address written by 'a'.
+        """
+        context_manager = ContextManager(dict_database.DictDatabase())
+        first_state_root = context_manager.get_first_root()
+        scheduler = ParallelScheduler(
+            context_manager.get_squash_handler(), first_state_root)
+
+        batches = [
+            self.create_batch(('a', ['x'], ['x'])),
+            self.create_batch(('b', ['y'], ['y'])),
+            self.create_batch(('c', ['x'], ['z']))]
+        for batch in batches:
+            scheduler.add_batch(batch)
+        scheduler.finalize()
+
+        txn_info_a = scheduler.next_transaction()
+        txn_info_b = scheduler.next_transaction()
+        self.assertEqual(b'a', txn_info_a.txn.payload)
+        self.assertEqual(b'b', txn_info_b.txn.payload)
+        self.assertEqual(first_state_root, txn_info_a.state_hash)
+        self.assertEqual(first_state_root, txn_info_b.state_hash)
+        self.assertIsNone(scheduler.next_transaction())
+
+        # b finishing first does not apply it before a, or release c
+        self.execute(context_manager, scheduler, txn_info_b)
+        self.assertIsNone(scheduler.get_batch_execution_result(
+            batches[1].header_signature))
+        self.assertIsNone(scheduler.next_transaction())
+
+        self.execute(context_manager, scheduler, txn_info_a)
+        result_a = scheduler.get_batch_execution_result(
+            batches[0].header_signature)
+        result_b = scheduler.get_batch_execution_result(
+            batches[1].header_signature)
+        self.assertTrue(result_a.is_valid)
+        self.assertTrue(result_b.is_valid)
+        self.assertNotEqual(result_a.state_hash, result_b.state_hash)
+
+        txn_info_c = scheduler.next_transaction()
+        self.assertEqual(b'c', txn_info_c.txn.payload)
+        self.assertEqual(result_b.state_hash, txn_info_c.state_hash)
+        self.execute(context_manager, scheduler, txn_info_c)
+
+        self.assertTrue(scheduler.complete(block=False))
+
+    def test_transactions_in_batch(self):
+        """Tests that the transactions of a batch are returned in order,
+        each based on the contexts of those before it, and that when one
+        fails, the rest of the batch is not returned and the batch's changes
+        are discarded.
+        """
+        context_manager = ContextManager(dict_database.DictDatabase())
+        first_state_root = context_manager.get_first_root()
+        scheduler = ParallelScheduler(
+            context_manager.get_squash_handler(), first_state_root,
+            delete_handler=context_manager.delete_context)
+
+        invalid_batch = self.create_batch(
+            ('a', ['x'], ['x']),
+            ('invalid', ['y'], ['y']),
+            ('b', ['z'], ['z']))
+        valid_batch = self.create_batch(
+            ('c', ['x'], ['x']),
+            ('d', ['x'], ['y']))
+        scheduler.add_batch(invalid_batch)
+        scheduler.add_batch(valid_batch)
+        scheduler.finalize()
+
+        txn_info_a = scheduler.next_transaction()
+        self.assertEqual(b'a', txn_info_a.txn.payload)
+        self.assertEqual([], txn_info_a.base_context_ids)
+        self.assertIsNone(scheduler.next_transaction())
+        context_id_a = self.execute(context_manager, scheduler, txn_info_a)
+
+        txn_info_invalid = scheduler.next_transaction()
+        self.assertEqual(b'invalid', txn_info_invalid.txn.payload)
+        self.assertEqual([context_id_a], txn_info_invalid.base_context_ids)
+        self.execute(context_manager, scheduler, txn_info_invalid)
+
+        result = scheduler.get_batch_execution_result(
+            invalid_batch.header_signature)
+        self.assertFalse(result.is_valid)
+        self.assertIsNone(result.state_hash)
+
+        # 'b' is never returned, and 'c' runs without the changes of 'a'
+        txn_info_c = scheduler.next_transaction()
+        self.assertEqual(b'c', txn_info_c.txn.payload)
+        self.assertEqual(first_state_root, txn_info_c.state_hash)
+        context_id_c = self.execute(context_manager, scheduler, txn_info_c)
+
+        txn_info_d = scheduler.next_transaction()
+        self.assertEqual(b'd', txn_info_d.txn.payload)
+        self.assertEqual([context_id_c], txn_info_d.base_context_ids)
+        self.execute(context_manager, scheduler, txn_info_d)
+
+        self.assertTrue(scheduler.complete(block=False))
+        self.assertEqual(
+            ['a', 'invalid', 'c', 'd'],
+            [t.txn.payload.decode() for t in scheduler])
+        self.assertTrue(scheduler.get_batch_execution_result(
+            valid_batch.header_signature).is_valid)
+
+    def test_same_state_as_serial(self):
+        """Tests that running the same batches through the ParallelScheduler,
+        with transactions finishing out of order, gives each batch the same
+        result as the SerialScheduler.
+        """
+        batches = [
+            self.create_batch(('a', ['x'], ['x']), ('b', ['x'], ['y'])),
+            self.create_batch(('c', ['z'], ['z'])),
+            self.create_batch(('d', ['y'], ['w'])),
+            self.create_batch(('e', ['w'], ['x']), ('invalid', ['v'], ['v'])),
+            self.create_batch(('f', ['x', 'z'], ['v'])),
+            self.create_batch(('g', ['u'], ['u']))]
+
+        serial_manager = ContextManager(dict_database.DictDatabase())
+        serial = SerialScheduler(
+            serial_manager.get_squash_handler(),
+            serial_manager.get_first_root())
+        parallel_manager = ContextManager(dict_database.DictDatabase())
+        parallel = ParallelScheduler(
+            parallel_manager.get_squash_handler(),
+            parallel_manager.get_first_root(),
+            delete_handler=parallel_manager.delete_context)
+
+        for batch in batches:
+            serial.add_batch(batch)
+            parallel.add_batch(batch)
+        serial.finalize()
+        parallel.finalize()
+
+        for txn_info in serial:
+            self.execute(serial_manager, serial, txn_info)
+
+        while not parallel.complete(block=False):
+            txn_infos = []
+            txn_info = parallel.next_transaction()
+            while txn_info is not None:
+                txn_infos.append(txn_info)
+                txn_info = parallel.next_transaction()
+            self.assertTrue(txn_infos)
+            for txn_info in reversed(txn_infos):
+                self.execute(parallel_manager, parallel, txn_info)
+
+        for batch in batches:
+            serial_result = serial.get_batch_execution_result(
+                batch.header_signature)
+            parallel_result = parallel.get_batch_execution_result(
+                batch.header_signature)
+            self.assertEqual(serial_result.is_valid, parallel_result.is_valid)
+            self.assertEqual(
+                serial_result.state_hash, parallel_result.state_hash)
+
+    def execute(self, context_manager, scheduler, txn_info):
+        """Runs a transaction, which sets each of its outputs to a hash of
+        its name and the values of its inputs, unless it is named 'invalid'.
+        Returns the transaction's context id.
+        """
+        header = transaction_pb2.TransactionHeader()
+        header.ParseFromString(txn_info.txn.header)
+        context_id = context_manager.create_context(
+            state_hash=txn_info.state_hash,
+            base_contexts=txn_info.base_context_ids,
+            inputs=list(header.inputs),
+            outputs=list(header.outputs))
+
+        if txn_info.txn.payload == b'invalid':
+            context_manager.delete_context([context_id])
+            scheduler.set_transaction_execution_result(
+                txn_info.txn.header_signature, False, context_id)
+            return context_id
+
+        value = hashlib.sha256(txn_info.txn.payload)
+        for _, input_value in context_manager.get(
+                context_id, list(header.inputs)):
+            value.update(input_value or b'')
+        context_manager.set(
+            context_id,
+            [{address: value.digest()} for address in header.outputs])
+        scheduler.set_transaction_execution_result(
+            txn_info.txn.header_signature, True, context_id)
+        return context_id
+
+
+class TestSchedulerEquivalence(unittest.TestCase):
+    def test_workloads(self):
+        """Tests that every scheduler reaches the same state root, and finds
+        the same batches valid, on each of the benchmark's workloads, with
+        transactions finishing out of order on several threads.
+        """
+        for workload, make_batches in WORKLOADS.items():
+            batches = make_batches(40)
+            results = {
+                scheduler: run_scheduler(scheduler, batches, workers=4)
+                for scheduler in SCHEDULERS}
+
+            serial = results.pop('serial')
+            for scheduler, result in results.items():
+                self.assertEqual(
+                    serial['state_root'], result['state_root'],
+                    '{} on {}'.format(scheduler, workload))
+                self.assertEqual(
+                    serial['valid'], result['valid'],
+                    '{} on {}'.format(scheduler, workload))
+
+
 class TestPredecessorTree(unittest.TestCase):
     '''
     With an empty tree initialized in setUp, the predecessor tree
@@ -0,0 +1,103 @@
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+import unittest
+
+import cbor
+
+from sawtooth_sdk.client.exceptions import InvalidProofError
+from sawtooth_sdk.client.state_proof import verify_state_proof
+from sawtooth_validator.database.dict_database import DictDatabase
+from sawtooth_validator.state.merkle import MerkleDatabase
+
+
+class TestVerifyStateProof(unittest.TestCase):
+    """Checks proofs made by MerkleDatabase.get_proof with the SDK's
+    verifier, which clients use to trust state read from a validator.
+    """
+
+    def setUp(self):
+        self.trie = MerkleDatabase(DictDatabase())
+        self.root = self.trie.update({
+            'aabb00': b'1',
+            'aabb01': b'2',
+            'cc0000': b'3',
+        }, virtual=False)
+        self.trie.set_merkle_root(self.root)
+
+    def test_single_address(self):
+        proof = self.trie.get_proof(['aabb00'])
+
+        self.assertEqual(
+            {'aabb00': b'1'},
+            verify_state_proof(self.root, proof, ['aabb00']))
+
+    def test_multiple_addresses(self):
+        """Tests that one proof of several addresses, sharing nodes on
+        their paths, proves each of them.
+        """
+        addresses = ['aabb00', 'aabb01', 'cc0000']
+        proof = self.trie.get_proof(addresses)
+
+        self.assertEqual(
+            {'aabb00': b'1', 'aabb01': b'2', 'cc0000': b'3'},
+            verify_state_proof(self.root, proof, addresses))
+
+    def test_absent_child(self):
+        """Tests that an address whose path leaves the trie is proven to
+        have no entry.
+        """
+        proof = self.trie.get_proof(['dd0000', 'aabb02'])
+
+        self.assertEqual(
+            {'dd0000': None, 'aabb02': None},
+            verify_state_proof(self.root, proof, ['dd0000', 'aabb02']))
+
+    def test_node_without_value(self):
+        """Tests that an address at an inner node, which has no value, is
+        proven to have no entry.
+        """
+        proof = self.trie.get_proof(['aabb'])
+
+        self.assertEqual(
+            {'aabb': None}, verify_state_proof(self.root, proof, ['aabb']))
+
+    def test_tampered_node(self):
+        """Tests that a proof with an altered node is rejected, as the
+        altered node no longer matches the hash its parent holds.
+        """
+        proof = self.trie.get_proof(['aabb00'])
+        leaf = cbor.loads(proof[-1])
+        leaf['v'] = cbor.dumps(b'9')
+        proof[-1] = cbor.dumps(leaf, sort_keys=True)
+
+        with self.assertRaises(InvalidProofError):
+            verify_state_proof(self.root, proof, ['aabb00'])
+
+    def test_wrong_root(self):
+        other_root = self.trie.update({'aabb00': b'9'}, virtual=False)
+        proof = self.trie.get_proof(['aabb00'])
+
+        with self.assertRaises(InvalidProofError):
+            verify_state_proof(other_root, proof, ['aabb00'])
+
+    def test_missing_node(self):
+        proof = self.trie.get_proof(['aabb00', 'cc0000'])
+
+        for i in range(len(proof)):
+            with self.assertRaises(InvalidProofError):
+                verify_state_proof(
+                    self.root, proof[:i] + proof[i + 1:],
+                    ['aabb00', 'cc0000'])
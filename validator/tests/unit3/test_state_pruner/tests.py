@@ -0,0 +1,180 @@
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+import unittest
+
+from sawtooth_validator.database.dict_database import DictDatabase
+from sawtooth_validator.state.merkle import MerkleDatabase
+from sawtooth_validator.state.node_cache import get_node_cache
+from sawtooth_validator.state.pruner import StatePruner
+
+
+class _MockBlock(object):
+    def __init__(self, identifier, previous_block_id, state_root_hash):
+        self.identifier = identifier
+        self.previous_block_id = previous_block_id
+        self.state_root_hash = state_root_hash
+
+
+class _MockBlockStore(object):
+    """A chain of blocks, each with the state root given when it was added.
+    """
+    def __init__(self):
+        self._blocks = {}
+        self.chain_head = None
+
+    def add_block(self, state_root_hash):
+        previous_id = self.chain_head.identifier \
+            if self.chain_head is not None else None
+        block = _MockBlock(str(len(self._blocks)), previous_id,
+                           state_root_hash)
+        self._blocks[block.identifier] = block
+        self.chain_head = block
+
+    def __getitem__(self, block_id):
+        return self._blocks[block_id]
+
+
+class TestStatePruner(unittest.TestCase):
+    def setUp(self):
+        self.database = DictDatabase()
+        self.block_store = _MockBlockStore()
+        self.trie = MerkleDatabase(self.database)
+        self.roots = []
+
+    def commit(self, updates):
+        root = self.trie.update(updates, virtual=False)
+        self.trie.set_merkle_root(root)
+        self.block_store.add_block(root)
+        self.roots.append(root)
+        return root
+
+    def make_pruner(self, keep_blocks, **kwargs):
+        kwargs.setdefault('grace_period', 0)
+        pruner = StatePruner(self.database, self.block_store,
+                             keep_blocks=keep_blocks, **kwargs)
+        self.addCleanup(pruner.stop)
+        return pruner
+
+    def test_prune_keeps_recent_roots(self):
+        """Tests that a pruning pass deletes the nodes of old state only,
+        leaving the state at the retained roots intact, and reports the
+        reclaimed bytes.
+        """
+        for i in range(5):
+            self.commit({'aabb' + str(i) * 2: str(i).encode(),
+                         'aacc00': str(i).encode()})
+
+        pruner = self.make_pruner(keep_blocks=2)
+        size_before = len(self.database)
+
+        pruned, reclaimed = pruner.prune()
+
+        self.assertGreater(pruned, 0)
+        self.assertGreater(reclaimed, 0)
+        self.assertEqual(size_before - pruned, len(self.database))
+        self.assertEqual(pruned, pruner.pruned_nodes)
+        self.assertEqual(reclaimed, pruner.reclaimed_bytes)
+
+        for root in self.roots[-2:]:
+            tree = MerkleDatabase(self.database, root)
+            self.assertEqual(b'4' if root == self.roots[-1] else b'3',
+                             tree.get('aacc00'))
+            self.assertEqual(b'0', tree.get('aabb00'))
+
+        for root in self.roots[:-2]:
+            self.assertNotIn(root, self.database)
+
+        # a second pass has nothing left to delete
+        self.assertEqual((0, 0), pruner.prune())
+
+    def test_prune_keeps_pinned_roots(self):
+        """Tests that pinned roots are retained until they are unpinned.
+        """
+        for i in range(3):
+            self.commit({'aacc00': str(i).encode()})
+
+        pruner = self.make_pruner(keep_blocks=1)
+        pruner.pin(self.roots[0])
+        pruner.prune()
+
+        self.assertEqual(
+            b'0', MerkleDatabase(self.database, self.roots[0]).get('aacc00'))
+        self.assertNotIn(self.roots[1], self.database)
+
+        pruner.unpin(self.roots[0])
+        pruner.prune()
+        self.assertNotIn(self.roots[0], self.database)
+
+    def test_prune_is_bounded(self):
+        """Tests that a pass deletes at most max_nodes_per_pass nodes.
+        """
+        for i in range(5):
+            self.commit({'aacc00': str(i).encode()})
+
+        pruner = self.make_pruner(keep_blocks=1, max_nodes_per_pass=2)
+
+        self.assertEqual(2, pruner.prune()[0])
+        self.assertEqual(2, pruner.prune()[0])
+
+    def test_prune_scan_is_bounded(self):
+        """Tests that a pass examines at most max_keys_per_pass keys, and
+        that passes resume where the last stopped until every unreachable
+        node has been deleted.
+        """
+        for i in range(5):
+            self.commit({'aabb' + str(i) * 2: str(i).encode(),
+                         'aacc00': str(i).encode()})
+
+        pruner = self.make_pruner(keep_blocks=1, max_keys_per_pass=3)
+
+        passes = [pruner.prune()[0] for _ in range(len(self.database))]
+
+        self.assertTrue(all(pruned <= 3 for pruned in passes))
+        self.assertGreater(sum(passes), 3)
+        for root in self.roots[:-1]:
+            self.assertNotIn(root, self.database)
+        tree = MerkleDatabase(self.database, self.roots[-1])
+        self.assertEqual(b'4', tree.get('aacc00'))
+        self.assertEqual(b'0', tree.get('aabb00'))
+
+    def test_prune_evicts_cached_nodes(self):
+        """Tests that deleted nodes are removed from the node cache.
+        """
+        for i in range(2):
+            self.commit({'aacc00': str(i).encode()})
+        MerkleDatabase(self.database, self.roots[0]).get('aacc00')
+        self.assertIn(self.roots[0], get_node_cache(self.database))
+
+        self.make_pruner(keep_blocks=1).prune()
+
+        self.assertNotIn(self.roots[0], get_node_cache(self.database))
+
+    def test_prune_protects_recent_writes(self):
+        """Tests that nodes written within the grace period are not pruned,
+        even when they are not reachable from a retained root.
+        """
+        for i in range(2):
+            self.commit({'aacc00': str(i).encode()})
+
+        pruner = self.make_pruner(keep_blocks=1, grace_period=600)
+
+        # rewrite the state of the first block, which is not retained
+        self.trie.update({'aacc00': b'0'}, virtual=False)
+
+        pruner.prune()
+
+        self.assertEqual(
+            b'0', MerkleDatabase(self.database, self.roots[0]).get('aacc00'))
@@ -0,0 +1,128 @@
+# Copyright 2017 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ------------------------------------------------------------------------------
+
+import hashlib
+import io
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+import zlib
+
+from sawtooth_validator.database.dict_database import DictDatabase
+from sawtooth_validator.database.lmdb_nolock_database import \
+    LMDBNoLockDatabase
+from sawtooth_validator.state.merkle import MerkleDatabase
+from sawtooth_validator.state.snapshot import MAGIC
+from sawtooth_validator.state.snapshot import SnapshotError
+from sawtooth_validator.state.snapshot import export_snapshot
+from sawtooth_validator.state.snapshot import import_snapshot
+
+
+def _hash(key):
+    return hashlib.sha512(key.encode()).hexdigest()[:70]
+
+
+class TestStateSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.source = LMDBNoLockDatabase(
+            os.path.join(self.dir, 'source.lmdb'), 'n', raw=True)
+
+        trie = MerkleDatabase(self.source)
+        self.items = {
+            _hash(str(i)): str(i).encode() for i in range(500)}
+        self.old_root = trie.update(self.items, virtual=False)
+
+        trie.set_merkle_root(self.old_root)
+        self.items[_hash('0')] = b'changed'
+        self.root = trie.update({_hash('0'): b'changed'}, virtual=False)
+
+    def tearDown(self):
+        self.source.close()
+        shutil.rmtree(self.dir)
+
+    def export(self, chunk_size=1024):
+        snapshot = io.BytesIO()
+        count = export_snapshot(
+            self.source, self.root, snapshot, chunk_size=chunk_size)
+        snapshot.seek(0)
+        return count, snapshot
+
+    def test_export_import(self):
+        """Tests that importing an export of a root into a new database
+        reproduces the state at that root, and only the nodes reachable
+        from it.
+        """
+        count, snapshot = self.export()
+
+        marked = set()
+        MerkleDatabase(self.source, self.root).mark_reachable(marked)
+        self.assertEqual(len(marked), count)
+
+        destination = LMDBNoLockDatabase(
+            os.path.join(self.dir, 'destination.lmdb'), 'n', raw=True)
+        try:
+            self.assertEqual(
+                self.root,
+                import_snapshot(snapshot, destination, batch_size=100))
+            self.assertEqual(count, len(destination))
+
+            trie = MerkleDatabase(destination, self.root)
+            self.assertEqual(self.items, dict(trie))
+
+            with self.assertRaises(KeyError):
+                trie.set_merkle_root(self.old_root)
+        finally:
+            destination.close()
+
+    def test_import_corrupt_chunk(self):
+        """Tests that a snapshot whose contents have been altered is
+        rejected.
+        """
+        _, snapshot = self.export()
+        data = bytearray(snapshot.getvalue())
+        data[100] ^= 0xff
+
+        with self.assertRaises(SnapshotError):
+            import_snapshot(io.BytesIO(bytes(data)), DictDatabase())
+
+    def test_import_truncated(self):
+        """Tests that a snapshot missing its later chunks is rejected.
+        """
+        _, snapshot = self.export()
+        data = snapshot.getvalue()
+
+        with self.assertRaises(SnapshotError):
+            import_snapshot(
+                io.BytesIO(data[:len(data) // 2]), DictDatabase())
+
+    def test_import_incomplete(self):
+        """Tests that a well formed snapshot which does not hold every node
+        under its root is rejected.
+        """
+        # A snapshot holding only the root node
+        payload = struct.pack('>I', len(self.source.get(self.root))) + \
+            self.source.get(self.root)
+        compressed = zlib.compress(payload)
+        snapshot = io.BytesIO(
+            MAGIC + self.root.encode() +
+            struct.pack('>III', len(compressed), 1, zlib.crc32(compressed)) +
+            compressed +
+            struct.pack('>III', 0, 1, 0))
+
+        with self.assertRaises(SnapshotError):
+            import_snapshot(snapshot, DictDatabase())